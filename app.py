@@ -1,312 +1,292 @@
 import streamlit as st
 import asyncio
-import json
-import random
-import nest_asyncio
-import aiohttp
-import xml.etree.ElementTree as ET
-from googlesearch import search
-import requests
-from bs4 import BeautifulSoup
 import base64
-from datetime import datetime
+import importlib.util
 import os
-import sys
-from pathlib import Path
 import time
-import re
-import subprocess
-import tempfile
-from urllib.parse import urlparse
-import logging
-
-# Add Crawl4AI imports
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode, DefaultMarkdownGenerator
-from crawl4ai.async_crawler_strategy import AsyncHTTPCrawlerStrategy
-from crawl4ai.async_configs import HTTPCrawlerConfig
-from crawl4ai.content_filter_strategy import PruningContentFilter
+import nest_asyncio
+
+from conversion import DEFAULT_CONVERSION_CACHE, DEFAULT_CONVERSION_WORKERS
+from crawler import (DEFAULT_CACHE_DIR, DEFAULT_FOLLOW_CONFIG, DEFAULT_HTTP_CONFIG, USER_AGENTS, LinkFollower,
+                     SitemapSource, finished_job_output, get_urls_from_google, is_valid_url, prepare_crawl, run_crawl)
 
 # Apply nest_asyncio for compatibility
 nest_asyncio.apply()
 
-# Configure Streamlit page
-st.set_page_config(
-    page_title="Web Crawler App",
-    page_icon="🕷️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Custom CSS
-st.markdown("""
-    <style>
-    .main {
-        padding: 1rem;
-        color: #ffffff;
-    }
-    .stButton>button {
-        width: 100%;
-        margin-top: 0.5rem;
-    }
-    .success-message {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        background-color: rgba(76, 175, 80, 0.2);
-        color: #8affa2;
-        margin: 1rem 0;
-        border: 1px solid rgba(76, 175, 80, 0.4);
-    }
-    .error-message {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        background-color: rgba(240, 70, 70, 0.2);
-        color: #ff9090;
-        margin: 1rem 0;
-        border: 1px solid rgba(240, 70, 70, 0.4);
-    }
-    .download-button {
-        display: inline-block;
-        padding: 0.5rem 1rem;
-        background-color: #4CAF50;
-        color: white;
-        text-decoration: none;
-        border-radius: 4px;
-        text-align: center;
-        margin: 0.5rem 0;
-    }
-    .download-button:hover {
-        background-color: #45a049;
-    }
-    .stExpander {
-        border: 1px solid #2d3035;
-        border-radius: 0.5rem;
-        margin-bottom: 0.5rem;
-    }
-    .url-card {
-        background-color: #1e1e1e;
-        border: 1px solid #2d3035;
-        border-radius: 0.5rem;
-        padding: 1rem;
-        margin-bottom: 0.5rem;
-        transition: all 0.3s ease;
-        color: #e0e0e0;
-    }
-    .url-active {
-        background-color: #2c3e50;
-        border-left: 3px solid #3498db;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);
-    }
-    .results-container {
-        max-height: 600px;
-        overflow-y: auto;
-        padding-right: 1rem;
-    }
-    .markdown-nav {
-        border-left: 3px solid #4CAF50;
-        padding-left: 1rem;
-        margin: 1rem 0;
-        color: #a0a0a0;
-    }
-    .markdown-content img {
-        max-width: 100%;
-        height: auto;
-    }
-    .st-emotion-cache-16txtl3 h1 {
-        margin-bottom: 0.5rem;
-    }
-    .settings-card {
-        background-color: #1e1e1e;
-        border-radius: 0.5rem;
-        padding: 1rem;
-        margin-bottom: 1rem;
-        border: 1px solid #2d3035;
-    }
-    .progress-card {
-        background-color: #1e1e1e;
-        border-radius: 0.8rem;
-        padding: 1.2rem;
-        margin-bottom: 1.5rem;
-        border-left: 5px solid #4CAF50;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);
-    }
-    .progress-card h3 {
-        margin-top: 0;
-        color: #8affa2;
-    }
-    .float-container {
-        position: fixed;
-        bottom: 30px;
-        right: 30px;
-        z-index: 1000;
-        background-color: rgba(30, 30, 30, 0.95);
-        padding: 15px 20px;
-        border-radius: 15px;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.3);
-        border: 1px solid #4CAF50;
-        max-width: 300px;
-        animation: pulse 2s infinite;
-        color: #e0e0e0;
-    }
-    @keyframes pulse {
-        0% { box-shadow: 0 0 0 0 rgba(76, 175, 80, 0.4); }
-        70% { box-shadow: 0 0 0 10px rgba(76, 175, 80, 0); }
-        100% { box-shadow: 0 0 0 0 rgba(76, 175, 80, 0); }
-    }
-    .current-url {
-        background-color: #2c3e50;
-        border-left: 3px solid #3498db;
-        padding: 10px;
-        margin-bottom: 10px;
-        border-radius: 5px;
-    }
-    .progress-heading {
-        color: #8affa2;
-        font-weight: 600;
-        margin-bottom: 1rem;
-    }
-    .url-processing {
-        animation: processing-pulse 1.5s infinite alternate;
-        background-color: rgba(52, 152, 219, 0.2);
-        border-left: 4px solid #3498db;
-    }
-    @keyframes processing-pulse {
-        0% { background-color: rgba(52, 152, 219, 0.2); }
-        100% { background-color: rgba(52, 152, 219, 0.4); }
-    }
-    .url-success {
-        background-color: rgba(76, 175, 80, 0.2);
-        border-left: 4px solid #4CAF50;
-    }
-    .url-error {
-        background-color: rgba(231, 76, 60, 0.2);
-        border-left: 4px solid #e74c3c;
-    }
-    .url-count {
-        background-color: #4CAF50;
-        color: white;
-        border-radius: 50%;
-        width: 24px;
-        height: 24px;
-        display: inline-flex;
-        align-items: center;
-        justify-content: center;
-        margin-right: 8px;
-        font-size: 12px;
-    }
-    .url-status-icon {
-        margin-right: 8px;
-        font-weight: bold;
-    }
-    code {
-        background-color: #2d3035;
-        color: #e0e0e0;
-        padding: 2px 5px;
-        border-radius: 3px;
-    }
-    .stAlert {
-        background-color: #1e1e1e;
-        color: #e0e0e0;
-    }
-    /* Additional dark theme improvements */
-    .stApp {
-        background-color: #121212;
-    }
-    .css-10trblm {
-        color: #ffffff;
-    }
-    .css-16idsys p {
-        color: #e0e0e0;
-    }
-    .css-5rimss {
-        color: #e0e0e0;
-    }
-    .stTextInput > div > div > input {
-        background-color: #2d3035;
-        color: #e0e0e0;
-    }
-    .stTextArea > div > div > textarea {
-        background-color: #2d3035;
-        color: #e0e0e0;
-    }
-    .stSlider > div > div {
-        background-color: #4e4e4e;
-    }
-    .stTabs [data-baseweb="tab"] {
-        color: #e0e0e0;
-    }
-    .stTabs [data-baseweb="tab-highlight"] {
-        background-color: #4CAF50;
-    }
-    .stTabs [data-baseweb="tab-list"] {
-        background-color: #1e1e1e;
-        border-radius: 8px;
-    }
-    .stMarkdown a {
-        color: #4CAF50;
-    }
-    .stSelectbox > div > div {
-        background-color: #2d3035;
-        color: #e0e0e0;
-    }
-    .stRadio label {
-        color: #e0e0e0;
-    }
-    .stCheckbox label {
-        color: #e0e0e0;
-    }
-    h1, h2, h3, h4, h5, h6 {
-        color: #e0e0e0;
-    }
-    p {
-        color: #c0c0c0;
-    }
-    .content-area {
-        background-color: #1e1e1e;
-        border-radius: 8px;
-        padding: 15px;
-        border: 1px solid #2d3035;
-    }
-    .st-ae {
-        color: #e0e0e0;
-    }
-    </style>
-""", unsafe_allow_html=True)
-
-# List of realistic user agents to rotate
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15"
-]
-
-# Ensure the environment is set up correctly
+# The progress UI only redraws when URL statuses changed: after this many
+# changes, once no new change arrives for UI_IDLE_SECONDS, or when changes
+# have been pending for UI_MAX_STALENESS; never more often than UI_MIN_INTERVAL
+UI_REDRAW_EVERY = 25
+UI_IDLE_SECONDS = 0.25
+UI_MAX_STALENESS = 1.0
+UI_MIN_INTERVAL = 0.25
+
+# Larger result files are left on disk instead of offered as a browser download
+MAX_DOWNLOAD_BYTES = 200 * 1024 * 1024
+
+# Modules the crawler needs; check_environment only looks them up, it doesn't import them
+REQUIRED_MODULES = ["requests", "bs4", "lxml", "aiohttp", "googlesearch", "nest_asyncio"]
+
+
+def setup_page():
+    """Page config and custom CSS; must come before any other Streamlit call."""
+    # Configure Streamlit page
+    st.set_page_config(
+        page_title="Web Crawler App",
+        page_icon="🕷️",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
 
+    # Custom CSS
+    st.markdown("""
+        <style>
+        .main {
+            padding: 1rem;
+            color: #ffffff;
+        }
+        .stButton>button {
+            width: 100%;
+            margin-top: 0.5rem;
+        }
+        .success-message {
+            padding: 1rem;
+            border-radius: 0.5rem;
+            background-color: rgba(76, 175, 80, 0.2);
+            color: #8affa2;
+            margin: 1rem 0;
+            border: 1px solid rgba(76, 175, 80, 0.4);
+        }
+        .error-message {
+            padding: 1rem;
+            border-radius: 0.5rem;
+            background-color: rgba(240, 70, 70, 0.2);
+            color: #ff9090;
+            margin: 1rem 0;
+            border: 1px solid rgba(240, 70, 70, 0.4);
+        }
+        .download-button {
+            display: inline-block;
+            padding: 0.5rem 1rem;
+            background-color: #4CAF50;
+            color: white;
+            text-decoration: none;
+            border-radius: 4px;
+            text-align: center;
+            margin: 0.5rem 0;
+        }
+        .download-button:hover {
+            background-color: #45a049;
+        }
+        .stExpander {
+            border: 1px solid #2d3035;
+            border-radius: 0.5rem;
+            margin-bottom: 0.5rem;
+        }
+        .url-card {
+            background-color: #1e1e1e;
+            border: 1px solid #2d3035;
+            border-radius: 0.5rem;
+            padding: 1rem;
+            margin-bottom: 0.5rem;
+            transition: all 0.3s ease;
+            color: #e0e0e0;
+        }
+        .url-active {
+            background-color: #2c3e50;
+            border-left: 3px solid #3498db;
+            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);
+        }
+        .results-container {
+            max-height: 600px;
+            overflow-y: auto;
+            padding-right: 1rem;
+        }
+        .markdown-nav {
+            border-left: 3px solid #4CAF50;
+            padding-left: 1rem;
+            margin: 1rem 0;
+            color: #a0a0a0;
+        }
+        .markdown-content img {
+            max-width: 100%;
+            height: auto;
+        }
+        .st-emotion-cache-16txtl3 h1 {
+            margin-bottom: 0.5rem;
+        }
+        .settings-card {
+            background-color: #1e1e1e;
+            border-radius: 0.5rem;
+            padding: 1rem;
+            margin-bottom: 1rem;
+            border: 1px solid #2d3035;
+        }
+        .progress-card {
+            background-color: #1e1e1e;
+            border-radius: 0.8rem;
+            padding: 1.2rem;
+            margin-bottom: 1.5rem;
+            border-left: 5px solid #4CAF50;
+            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.3);
+        }
+        .progress-card h3 {
+            margin-top: 0;
+            color: #8affa2;
+        }
+        .float-container {
+            position: fixed;
+            bottom: 30px;
+            right: 30px;
+            z-index: 1000;
+            background-color: rgba(30, 30, 30, 0.95);
+            padding: 15px 20px;
+            border-radius: 15px;
+            box-shadow: 0 4px 12px rgba(0, 0, 0, 0.3);
+            border: 1px solid #4CAF50;
+            max-width: 300px;
+            animation: pulse 2s infinite;
+            color: #e0e0e0;
+        }
+        @keyframes pulse {
+            0% { box-shadow: 0 0 0 0 rgba(76, 175, 80, 0.4); }
+            70% { box-shadow: 0 0 0 10px rgba(76, 175, 80, 0); }
+            100% { box-shadow: 0 0 0 0 rgba(76, 175, 80, 0); }
+        }
+        .current-url {
+            background-color: #2c3e50;
+            border-left: 3px solid #3498db;
+            padding: 10px;
+            margin-bottom: 10px;
+            border-radius: 5px;
+        }
+        .progress-heading {
+            color: #8affa2;
+            font-weight: 600;
+            margin-bottom: 1rem;
+        }
+        .url-processing {
+            animation: processing-pulse 1.5s infinite alternate;
+            background-color: rgba(52, 152, 219, 0.2);
+            border-left: 4px solid #3498db;
+        }
+        @keyframes processing-pulse {
+            0% { background-color: rgba(52, 152, 219, 0.2); }
+            100% { background-color: rgba(52, 152, 219, 0.4); }
+        }
+        .url-success {
+            background-color: rgba(76, 175, 80, 0.2);
+            border-left: 4px solid #4CAF50;
+        }
+        .url-error {
+            background-color: rgba(231, 76, 60, 0.2);
+            border-left: 4px solid #e74c3c;
+        }
+        .url-count {
+            background-color: #4CAF50;
+            color: white;
+            border-radius: 50%;
+            width: 24px;
+            height: 24px;
+            display: inline-flex;
+            align-items: center;
+            justify-content: center;
+            margin-right: 8px;
+            font-size: 12px;
+        }
+        .url-status-icon {
+            margin-right: 8px;
+            font-weight: bold;
+        }
+        code {
+            background-color: #2d3035;
+            color: #e0e0e0;
+            padding: 2px 5px;
+            border-radius: 3px;
+        }
+        .stAlert {
+            background-color: #1e1e1e;
+            color: #e0e0e0;
+        }
+        /* Additional dark theme improvements */
+        .stApp {
+            background-color: #121212;
+        }
+        .css-10trblm {
+            color: #ffffff;
+        }
+        .css-16idsys p {
+            color: #e0e0e0;
+        }
+        .css-5rimss {
+            color: #e0e0e0;
+        }
+        .stTextInput > div > div > input {
+            background-color: #2d3035;
+            color: #e0e0e0;
+        }
+        .stTextArea > div > div > textarea {
+            background-color: #2d3035;
+            color: #e0e0e0;
+        }
+        .stSlider > div > div {
+            background-color: #4e4e4e;
+        }
+        .stTabs [data-baseweb="tab"] {
+            color: #e0e0e0;
+        }
+        .stTabs [data-baseweb="tab-highlight"] {
+            background-color: #4CAF50;
+        }
+        .stTabs [data-baseweb="tab-list"] {
+            background-color: #1e1e1e;
+            border-radius: 8px;
+        }
+        .stMarkdown a {
+            color: #4CAF50;
+        }
+        .stSelectbox > div > div {
+            background-color: #2d3035;
+            color: #e0e0e0;
+        }
+        .stRadio label {
+            color: #e0e0e0;
+        }
+        .stCheckbox label {
+            color: #e0e0e0;
+        }
+        h1, h2, h3, h4, h5, h6 {
+            color: #e0e0e0;
+        }
+        p {
+            color: #c0c0c0;
+        }
+        .content-area {
+            background-color: #1e1e1e;
+            border-radius: 8px;
+            padding: 15px;
+            border: 1px solid #2d3035;
+        }
+        .st-ae {
+            color: #e0e0e0;
+        }
+        </style>
+    """, unsafe_allow_html=True)
 
-def check_environment():
-    try:
-        import requests
-        import bs4
 
-        # Check if Crawl4AI is installed
-        try:
-            from crawl4ai import AsyncWebCrawler
-            st.sidebar.success("✅ Crawl4AI is installed")
-        except ImportError:
-            st.error(f"""
-            ⚠️ Crawl4AI not found
+@st.cache_resource(show_spinner=False)
+def find_missing_modules():
+    """Required modules (and crawl4ai) that aren't installed; checked once per server, not per rerun."""
+    return [name for name in REQUIRED_MODULES + ["crawl4ai"] if importlib.util.find_spec(name) is None]
 
-            Please install Crawl4AI:
-            ```bash
-            pip install crawl4ai
-            ```
-            """)
-            st.stop()
 
-    except ImportError as e:
+def check_environment():
+    """Ensure the environment is set up correctly."""
+    missing = find_missing_modules()
+    required_missing = [name for name in missing if name != "crawl4ai"]
+    if required_missing:
         st.error(f"""
-        ⚠️ Required dependencies not found: {e}
+        ⚠️ Required dependencies not found: {", ".join(required_missing)}
 
         Please run the setup script:
         ```bash
@@ -317,296 +297,18 @@ def check_environment():
         """)
         st.stop()
 
+    # Check if Crawl4AI is installed
+    if "crawl4ai" in missing:
+        st.error("""
+        ⚠️ Crawl4AI not found
 
-def get_urls_from_google(query, num_results=10):
-    """Get URLs from Google search results."""
-    return [result for result in search(query, num_results=num_results, advanced=False)]
-
-
-def is_valid_url(url):
-    """Check if URL starts with a valid scheme."""
-    return url.startswith(("http://", "https://", "file://", "raw:"))
-
-
-def extract_metadata(soup):
-    """Extract metadata from HTML soup."""
-    metadata = {}
-
-    # Extract title
-    title_tag = soup.find('title')
-    if title_tag:
-        metadata['title'] = title_tag.text.strip()
-    else:
-        metadata['title'] = "No title"
-
-    # Extract description
-    description_tag = soup.find('meta', attrs={'name': 'description'}) or soup.find(
-        'meta', attrs={'property': 'og:description'})
-    if description_tag and description_tag.get('content'):
-        metadata['description'] = description_tag.get('content').strip()
-    else:
-        metadata['description'] = "No description available"
-
-    return metadata
-
-
-def extract_code_from_pre(code_html):
-    """Extract formatted code from HTML pre/code tags with language detection."""
-    soup = BeautifulSoup(code_html, 'html.parser')
-
-    # Try to find the language from class attributes
-    language = ""
-    code_tag = soup.find('code')
-    pre_tag = soup.find('pre')
-
-    # Check code tag classes first
-    if code_tag and code_tag.has_attr('class'):
-        for cls in code_tag.get('class', []):
-            if cls.startswith(('language-', 'lang-', 'brush:', 'syntax-')):
-                parts = cls.split('-') if '-' in cls else cls.split(':')
-                if len(parts) > 1:
-                    language = parts[1].strip()
-                    break
-
-    # If no language found, check pre tag
-    if not language and pre_tag and pre_tag.has_attr('class'):
-        for cls in pre_tag.get('class', []):
-            if cls.startswith(('language-', 'lang-', 'brush:', 'syntax-')):
-                parts = cls.split('-') if '-' in cls else cls.split(':')
-                if len(parts) > 1:
-                    language = parts[1].strip()
-                    break
-
-    # Extract the code text, preferring the code tag if it exists
-    if code_tag:
-        code_text = code_tag.get_text()
-    elif pre_tag:
-        code_text = pre_tag.get_text()
-    else:
-        code_text = soup.get_text()
-
-    # Clean up the code text
-    code_text = code_text.strip()
-
-    return language, code_text
-
-
-def clean_html(html_content):
-    """Clean HTML content using BeautifulSoup."""
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    # Remove unwanted elements but preserve code blocks
-    unwanted_elements = [
-        'script', 'style', 'nav', 'footer', 'iframe', 'noscript',
-        'header', 'aside', 'sidebar', 'menu', 'advertisement', 'ad',
-        'banner', 'cookie', 'popup', 'modal', 'social-media'
-    ]
-
-    # Remove elements by tag name
-    for tag in ['script', 'style', 'nav', 'footer', 'iframe', 'noscript', 'header', 'aside']:
-        for element in soup.find_all(tag):
-            if not element.find(['pre', 'code']):  # Don't remove if contains code
-                element.decompose()
-
-    # Remove elements by class or id containing specific terms
-    for term in ['nav', 'menu', 'sidebar', 'footer', 'header', 'banner', 'ad', 'cookie', 'popup', 'social']:
-        # Check for classes containing the term
-        for element in soup.find_all(class_=lambda x: x and term in x.lower()):
-            if not element.find(['pre', 'code']):
-                element.decompose()
-
-        # Check for ids containing the term
-        for element in soup.find_all(id=lambda x: x and term in x.lower()):
-            if not element.find(['pre', 'code']):
-                element.decompose()
-
-    return str(soup)
-
-
-async def process_with_crawl4ai(html_content, url, extraction_config=None):
-    """Process HTML content using Crawl4AI's markdown generator."""
-    if extraction_config is None:
-        extraction_config = {
-            "prioritize_code_blocks": True,
-            "content_type": "Technical Documentation",
-            "extract_full_page": True,
-            "custom_selectors": []
-        }
-
-    try:
-        # Configure markdown generator with the same settings as Google Colab
-        markdown_generator = DefaultMarkdownGenerator(
-            # Use PruningContentFilter with threshold=0.2 to match Google Colab
-            content_filter=PruningContentFilter(
-                threshold=0.2,  # Same threshold as Google Colab
-                threshold_type="fixed"
-            ),
-            options={
-                "ignore_links": False,      # Keep links for better context
-                "body_width": 0,            # No line wrapping
-                "skip_internal_links": True,  # Skip navigation links
-                "include_sup_sub": True,    # Better handling of superscript/subscript
-                "escape_html": False,       # Don't escape HTML entities
-                "mark_code": True           # Better code block handling
-            }
-        )
-
-        # Generate markdown directly from raw HTML
-        markdown_result = markdown_generator.generate_markdown(
-            cleaned_html=html_content,  # Pass the raw HTML directly
-            html=html_content,          # Pass the raw HTML directly
-            url=url
-        )
-
-        # Try to use fit_markdown if it's available, otherwise use raw_markdown
-        if hasattr(markdown_result, 'fit_markdown') and markdown_result.fit_markdown:
-            markdown_content = markdown_result.fit_markdown
-        else:
-            markdown_content = markdown_result.raw_markdown
-
-        # Clean up line number markers from the markdown
-        cleaned_markdown = re.sub(
-            r'\[\]\(#__codelineno-\d+-\d+\)', '', markdown_content)
-
-        # Only remove null bytes which could break file writing
-        cleaned_markdown = cleaned_markdown.replace('\x00', '')
-
-        return cleaned_markdown
-
-    except Exception as e:
-        return f"Error generating markdown with Crawl4AI: {str(e)}"
-
-
-async def fetch_url(url, timeout=30, use_crawl4ai=True, use_requests=True, extraction_config=None):
-    """
-    Fetch URL content using the best method for the situation.
-
-    This hybrid approach:
-    1. First tries to fetch content with requests (bypasses proxy auth)
-    2. Processes the content with Crawl4AI for high-quality markdown extraction
-    3. Falls back to aiohttp if requests fails
-    """
-    try:
-        html_content = None
-        status_code = None
-        headers = {}
-
-        # First attempt: Use requests to bypass proxy auth
-        if use_requests:
-            try:
-                html_content, content_type = fetch_with_requests(url, timeout)
-                status_code = 200  # Assume 200 as we don't get actual status code
-                headers = {'Content-Type': content_type}
-            except Exception as e:
-                logging.warning(f"Requests fetch failed: {str(e)}")
-                html_content = None
-
-        # Second attempt: Use aiohttp if requests fails
-        if not html_content:
-            headers = {
-                'User-Agent': random.choice(USER_AGENTS),
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Cache-Control': 'max-age=0'
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=timeout) as response:
-                    html_content = await response.text()
-                    status_code = response.status
-                    headers = dict(response.headers)
-
-        # Process the HTML content to extract markdown
-        if html_content:
-            # Process with Crawl4AI
-            markdown_content = await process_with_crawl4ai(html_content, url, extraction_config)
-
-            return {
-                'success': True,
-                'status_code': status_code,
-                'url': url,
-                'html': html_content,
-                'markdown': markdown_content,
-                'headers': headers
-            }
-        else:
-            return {
-                'success': False,
-                'url': url,
-                'error_message': "Failed to fetch HTML content"
-            }
-    except Exception as e:
-        return {
-            'success': False,
-            'url': url,
-            'error_message': str(e)
-        }
-
-
-# NEW FUNCTION: Process a crawl result with both the original and Crawl4AI approaches
-def process_result(result, extraction_config=None, crawl_method="unknown"):
-    """Process a crawl result and return formatted output for Streamlit."""
-    # Set default extraction config if not provided
-    if extraction_config is None:
-        extraction_config = {
-            "prioritize_code_blocks": True,
-            "content_type": "Technical Documentation",
-            "extract_full_page": True,
-            "custom_selectors": []
-        }
-
-    output = []
-    # Add crawler metadata as comments
-    output.append(f"<!-- URL: {result.get('url', 'unknown')} -->\n")
-    output.append(f"<!-- Crawl Method: {crawl_method} -->\n")
-    output.append(
-        f"<!-- Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} -->\n")
-
-    # Also add metadata as visible text
-    output.append(f"# {result.get('url', 'unknown')}\n")
-    output.append(f"*Crawled using: {crawl_method}*\n")
-    output.append(f"*Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n")
-
-    if 'status_code' in result:
-        output.append(f"Status Code: {result.get('status_code', 'N/A')}\n")
-
-    if not result.get('success', False):
-        display_output = "\n".join(
-            output) + f"\n❌ Error: {result.get('error_message', 'Unknown error')}"
-        file_output = "\n".join(
-            output) + f"\n❌ Error: {result.get('error_message', 'Unknown error')}\n\n---\n"
-        return display_output, file_output
-
-    # Process HTML content
-    soup = BeautifulSoup(result.get('html', ''), 'html.parser')
-    metadata = extract_metadata(soup)
-
-    # Add metadata to output
-    output.append(f"## {metadata['title']}\n")
-    description = metadata.get('description')
-    if description:
-        preview_desc = description if len(
-            description) <= 150 else description[:150] + "..."
-        output.append(f"_{preview_desc}_\n")
-
-    # Get the markdown content that was already processed by Crawl4AI
-    markdown_content = result.get("markdown", "")
-
-    # Only remove null bytes which could break file writing
-    if markdown_content:
-        markdown_content = markdown_content.replace('\x00', '')
-
-    # Truncate markdown for display
-    display_markdown = markdown_content[:2000] + \
-        "..." if len(markdown_content) > 2000 else markdown_content
-
-    display_output = "\n".join(
-        output) + f"\n### Content Preview\n{display_markdown}"
-    file_output = "\n".join(output) + f"\n{markdown_content}\n\n---\n"
-
-    return display_output, file_output
+        Please install Crawl4AI:
+        ```bash
+        pip install crawl4ai
+        ```
+        """)
+        st.stop()
+    st.sidebar.success("✅ Crawl4AI is installed")
 
 
 def get_download_link(content, filename):
@@ -615,193 +317,21 @@ def get_download_link(content, filename):
     return f'<a href="data:text/markdown;base64,{b64}" download="{filename}" class="download-button">Download Markdown File</a>'
 
 
-async def fetch_sitemap(url):
-    """Fetch and parse sitemap XML to extract all URLs."""
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            xml_text = await response.text()
-            root = ET.fromstring(xml_text)
-            ns = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-            return [elem.text for elem in root.findall("ns:url/ns:loc", ns)]
-
-
-# Helper function to process a single URL
-async def process_single_url(url, index, total_urls, progress_data, semaphore, wait_time, extraction_config, crawl_method="hybrid"):
-    """Process a single URL with progress tracking and status updates."""
-    async with semaphore:
-        # Update status to "processing"
-        progress_data["current_urls"].append(url)
-        progress_data["url_statuses"][index] = "processing"
-
-        # Add delay between requests if this isn't the first concurrent batch
-        if index >= progress_data["concurrency"]:
-            await asyncio.sleep(wait_time)
-
-        try:
-            # Process the URL based on the selected crawl method
-            if crawl_method == "hybrid":
-                # Use requests + Crawl4AI approach (best for bypassing auth)
-                result = await fetch_url(
-                    url,
-                    timeout=progress_data.get("timeout", 30),
-                    use_crawl4ai=True,
-                    use_requests=True,
-                    extraction_config=extraction_config
-                )
-            elif crawl_method == "requests_only":
-                # Use only requests (no Crawl4AI processing)
-                try:
-                    html_content, content_type = fetch_with_requests(
-                        url, timeout=progress_data.get("timeout", 30))
-                    # Convert HTML to Markdown using Crawl4AI's processor
-                    markdown_content = await process_with_crawl4ai(html_content, url, extraction_config)
-
-                    result = {
-                        'success': True,
-                        'status_code': 200,  # Assume 200 as we don't get the actual status code
-                        'url': url,
-                        'html': html_content,
-                        'markdown': markdown_content,
-                        'error_message': ''
-                    }
-                except Exception as e:
-                    result = {
-                        'success': False,
-                        'url': url,
-                        'error_message': str(e)
-                    }
-            elif crawl_method == "crawl4ai_http":
-                # Use Crawl4AI's HTTP strategy (similar to requests)
-                http_config = HTTPCrawlerConfig(
-                    method="GET",
-                    verify_ssl=True,
-                    follow_redirects=True,
-                    headers={
-                        "User-Agent": random.choice(USER_AGENTS)
-                    }
-                )
-                http_strategy = AsyncHTTPCrawlerStrategy(
-                    browser_config=http_config
-                )
-
-                async with AsyncWebCrawler(crawler_strategy=http_strategy) as crawler:
-                    # Create configuration that matches the successful Google Colab settings
-                    crawl_result = await crawler.arun(
-                        url=url,
-                        config=CrawlerRunConfig(
-                            # Core settings
-                            cache_mode=CacheMode.BYPASS,
-                            # Performance optimizations
-                            stream=False,
-                            simulate_user=True,
-                            override_navigator=True,
-                            remove_overlay_elements=True,
-                            magic=True,
-                            # Timing
-                            delay_before_return_html=random.uniform(1.0, 3.0),
-                            wait_until="networkidle",
-                            page_timeout=60000,
-                            # Markdown generator with the same settings as Google Colab
-                            markdown_generator=DefaultMarkdownGenerator(
-                                content_filter=PruningContentFilter(
-                                    threshold=0.2,  # Same threshold as Google Colab
-                                    threshold_type="fixed"
-                                ),
-                                options={
-                                    "ignore_links": False,
-                                    "body_width": 0,
-                                    "skip_internal_links": True,
-                                    "include_sup_sub": True,
-                                    "escape_html": False,
-                                    "mark_code": True
-                                }
-                            )
-                        )
-                    )
-
-                    result = {
-                        'success': crawl_result.success,
-                        'status_code': crawl_result.status_code,
-                        'url': crawl_result.url,
-                        'html': crawl_result.html,
-                        'markdown': crawl_result.markdown.fit_markdown if crawl_result.success and hasattr(crawl_result.markdown, 'fit_markdown') and crawl_result.markdown.fit_markdown else crawl_result.markdown.raw_markdown if crawl_result.success else "",
-                        'error_message': crawl_result.error_message
-                    }
-            elif crawl_method == "crawl4ai_raw_html":
-                # Use Crawl4AI's raw HTML processing (fetch with requests, process with Crawl4AI)
-                try:
-                    html_content, content_type = fetch_with_requests(
-                        url, timeout=progress_data.get("timeout", 30))
-                    # Process with the unmodified HTML directly via Crawl4AI
-                    markdown_content = await process_with_crawl4ai(html_content, url, extraction_config)
-
-                    result = {
-                        'success': True,
-                        'status_code': 200,  # We don't have the actual status code, so assume 200
-                        'url': url,
-                        'html': html_content,
-                        'markdown': markdown_content,
-                        'error_message': ''
-                    }
-                except Exception as e:
-                    result = {
-                        'success': False,
-                        'url': url,
-                        'error_message': str(e)
-                    }
-            else:
-                # Default to hybrid approach
-                result = await fetch_url(
-                    url,
-                    timeout=progress_data.get("timeout", 30),
-                    extraction_config=extraction_config
-                )
-
-            if result["success"]:
-                progress_data["successful_crawls"] += 1
-                display_output, file_output = process_result(
-                    result, extraction_config, crawl_method)
-                progress_data["results"].append(file_output)
-                progress_data["current_content"] = display_output
-                progress_data["url_statuses"][index] = "success"
-            else:
-                progress_data["failed_crawls"] += 1
-                error_message = result.get("error_message", "Unknown error")
-                progress_data["url_statuses"][index] = "error"
-                progress_data["results"].append(
-                    f"\n## Error processing {url}\n\n{error_message}\n")
-                progress_data["current_content"] = f"❌ Error processing {url}: {error_message}"
-
-        except Exception as e:
-            progress_data["failed_crawls"] += 1
-            progress_data["url_statuses"][index] = "error"
-            error_message = str(e)
-            progress_data["results"].append(
-                f"\n## Error processing {url}\n\n{error_message}\n")
-            progress_data["current_content"] = f"❌ Error processing {url}: {error_message}"
-
-        # Remove from current URLs being processed
-        if url in progress_data["current_urls"]:
-            progress_data["current_urls"].remove(url)
-
-        # Update progress
-        progress_data["processed_count"] += 1
-        progress_data["progress"] = progress_data["processed_count"] / total_urls
-
-
-async def crawl_list_of_urls(urls, combined_markdown_output="", wait_time=3, extraction_config=None, concurrency_limit=5, crawl_method="hybrid"):
-    """Crawl a list of URLs concurrently using asyncio and semaphores."""
-    # Set default extraction config if not provided
-    if extraction_config is None:
-        extraction_config = {
-            "prioritize_code_blocks": True,
-            "content_type": "Technical Documentation",
-            "extract_full_page": True,
-            "custom_selectors": []
-        }
+async def crawl_list_of_urls(urls, combined_markdown_output="", wait_time=None, extraction_config=None, concurrency_limit=5, crawl_method="hybrid", http_config=None, crawl4ai_profile="thorough", conversion_workers=DEFAULT_CONVERSION_WORKERS, output_config=None, conversion_cache_path="", job_id="", processes=1):
+    """Crawl URLs while showing live progress, a content preview and a download button.
 
-    if not urls:
-        return []
+    The crawl itself is prepare_crawl() + run_crawl() from crawler.py (see
+    there for what ``urls`` may be and how ``job_id`` makes a crawl
+    resumable); this wraps it in the Streamlit progress UI. The path of the
+    output file is returned.
+    """
+    if isinstance(urls, (list, tuple)) and not urls:
+        return None
+    if job_id:
+        output_path = finished_job_output(job_id)
+        if output_path:
+            st.info(f"✅ Job {job_id} has already finished; its results are at {output_path}")
+            return output_path
 
     # Create progress tracking area at top of results
     st.markdown("<h2 class='progress-heading'>Crawling Progress</h2>",
@@ -819,22 +349,15 @@ async def crawl_list_of_urls(urls, combined_markdown_output="", wait_time=3, ext
     # Main results
     results_container = st.container()
 
-    total_urls = len(urls)
-
-    # Initialize progress tracking data structure
-    progress_data = {
-        "progress": 0.0,
-        "processed_count": 0,
-        "successful_crawls": 0,
-        "failed_crawls": 0,
-        "current_urls": [],  # URLs currently being processed
-        # Status for each URL: pending, processing, success, error
-        "url_statuses": ["pending"] * total_urls,
-        "results": [],  # Store results for all URLs
-        "current_content": "",  # Content currently being displayed
-        "concurrency": concurrency_limit,  # Concurrency limit
-        "timeout": 30  # Request timeout
-    }
+    progress_data = prepare_crawl(
+        urls, wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=concurrency_limit,
+        crawl_method=crawl_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile,
+        conversion_workers=conversion_workers, output_config=output_config,
+        conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes)
+    if progress_data["journal"] is not None and progress_data["journal"].resumed:
+        st.info(f"♻️ Resuming job {job_id}: {progress_data['processed_count']} URLs already done")
+    progress_data["events"] = asyncio.Queue()
+    frontier = progress_data["frontier"]
 
     # Initialize the progress bar
     progress_bar = progress_area.progress(0.0)
@@ -857,112 +380,141 @@ async def crawl_list_of_urls(urls, combined_markdown_output="", wait_time=3, ext
             st.markdown(
                 '<div class="content-area" id="content-display-area"></div>', unsafe_allow_html=True)
 
-    # Initialize URL list display
-    url_list_html = "<div style='max-height: 400px; overflow-y: auto; background-color: #1e1e1e; border-radius: 8px; padding: 10px;'>"
-    for i, url in enumerate(urls):
-        url_list_html += f"""<div id='url-{i}' class='url-card'>
-            <span class='url-count'>{i+1}</span>
-            <span class='url-status-icon' style="color: #a0a0a0;">⏳</span>
-            <span style="word-break: break-all;">{url}</span>
-        </div>"""
-    url_list_html += "</div>"
-    url_status_area.markdown(url_list_html, unsafe_allow_html=True)
-
-    # Create a semaphore to limit concurrency
-    semaphore = asyncio.Semaphore(concurrency_limit)
-
-    # Create task list
-    tasks = []
-    for i, url in enumerate(urls):
-        task = asyncio.create_task(process_single_url(
-            url, i, total_urls, progress_data, semaphore, wait_time, extraction_config, crawl_method))
-        tasks.append(task)
-
-    # Update UI loop
-    async def update_ui():
-        while progress_data["progress"] < 1.0:
-            # Update progress bar
-            progress_bar.progress(progress_data["progress"])
-
-            # Update status text
-            current_urls_html = ""
-            if progress_data["current_urls"]:
-                for cur_url in progress_data["current_urls"]:
-                    current_urls_html += f"<div class='current-url'>{cur_url}</div>"
-
-            status_html = f"""
-            <div class='progress-card'>
-                <h3>Processing URLs: {progress_data["processed_count"]} of {total_urls} ({progress_data["progress"]*100:.1f}%)</h3>
-                <p>Currently processing {len(progress_data["current_urls"])} URLs (max: {concurrency_limit})</p>
-                {current_urls_html}
-                <div style='display: flex; gap: 20px; margin-top: 10px;'>
-                    <div style="color: #8affa2;">✅ Success: {progress_data["successful_crawls"]}</div>
-                    <div style="color: #ff9090;">❌ Failed: {progress_data["failed_crawls"]}</div>
-                </div>
+    url_status_area.markdown(
+        "<div class='url-card'>⏳ Waiting for the first URL...</div>", unsafe_allow_html=True)
+
+    def render_progress():
+        """Redraw the progress widgets; cost depends on the window, not the crawl size."""
+        progress_bar.progress(progress_data["progress"])
+        total_label = f'{progress_data["total_urls"]}{"" if progress_data["discovery_done"] else "+"}'
+
+        # Update status text
+        current_urls_html = "".join(
+            f"<div class='current-url'>{cur_url}</div>" for cur_url in progress_data["current_urls"])
+
+        status_html = f"""
+        <div class='progress-card'>
+            <h3>Processing URLs: {progress_data["processed_count"]} of {total_label} ({progress_data["progress"]*100:.1f}%)</h3>
+            <p>Currently processing {len(progress_data["current_urls"])} URLs (max: {concurrency_limit})</p>
+            {current_urls_html}
+            <div style='display: flex; gap: 20px; margin-top: 10px;'>
+                <div style="color: #8affa2;">✅ Success: {progress_data["successful_crawls"]}</div>
+                <div style="color: #ff9090;">❌ Failed: {progress_data["failed_crawls"]}</div>
             </div>
-            """
-            status_text.markdown(status_html, unsafe_allow_html=True)
-
-            # Update floating status
-            float_html = f"""
-            <div class='float-container'>
-                <div><b>Processing URLs: {progress_data["processed_count"]}/{total_urls}</b></div>
-                <div>Running {len(progress_data["current_urls"])}/{concurrency_limit} concurrent tasks</div>
-                <div style="display: flex; justify-content: space-between; margin-top: 10px;">
-                    <div style="color: #8affa2;">✅ Success: {progress_data["successful_crawls"]}</div>
-                    <div style="color: #ff9090;">❌ Failed: {progress_data["failed_crawls"]}</div>
-                </div>
+        </div>
+        """
+        status_text.markdown(status_html, unsafe_allow_html=True)
+
+        # Update floating status
+        float_html = f"""
+        <div class='float-container'>
+            <div><b>Processing URLs: {progress_data["processed_count"]}/{total_label}</b></div>
+            <div>Running {len(progress_data["current_urls"])}/{concurrency_limit} concurrent tasks</div>
+            <div style="display: flex; justify-content: space-between; margin-top: 10px;">
+                <div style="color: #8affa2;">✅ Success: {progress_data["successful_crawls"]}</div>
+                <div style="color: #ff9090;">❌ Failed: {progress_data["failed_crawls"]}</div>
             </div>
-            """
-            float_container.markdown(float_html, unsafe_allow_html=True)
-
-            # Update URL statuses
-            url_list_html = "<div style='max-height: 400px; overflow-y: auto; background-color: #1e1e1e; border-radius: 8px; padding: 10px;'>"
-            for i, url in enumerate(urls):
-                status = progress_data["url_statuses"][i]
-
-                if status == "pending":
-                    status_icon = f'<span class="url-status-icon" style="color: #a0a0a0;">⏳</span>'
-                    class_name = "url-card"
-                elif status == "processing":
-                    status_icon = f'<span class="url-status-icon" style="color: #3498db;">🔄</span>'
-                    class_name = "url-card url-processing"
-                elif status == "success":
-                    status_icon = f'<span class="url-status-icon" style="color: #8affa2;">✅</span>'
-                    class_name = "url-card url-success"
-                else:  # error
-                    status_icon = f'<span class="url-status-icon" style="color: #ff9090;">❌</span>'
-                    class_name = "url-card url-error"
-
-                url_list_html += f"""<div id='url-{i}' class='{class_name}'>
-                    <span class='url-count'>{i+1}</span>
-                    {status_icon}
-                    <span style="word-break: break-all;">{url}</span>
-                </div>"""
-            url_list_html += "</div>"
-            url_status_area.markdown(url_list_html, unsafe_allow_html=True)
-
-            # Update content area
-            if progress_data["current_content"]:
-                content_area.markdown(
-                    progress_data["current_content"], unsafe_allow_html=True)
-
-            await asyncio.sleep(0.5)  # Update UI every 0.5 seconds
-
-    # Run UI updater in parallel with tasks
+        </div>
+        """
+        float_container.markdown(float_html, unsafe_allow_html=True)
+
+        # Update URL statuses (only the most recent URLs are kept)
+        url_list_html = "<div style='max-height: 400px; overflow-y: auto; background-color: #1e1e1e; border-radius: 8px; padding: 10px;'>"
+        earlier = progress_data["processed_count"] + len(progress_data["current_urls"]) - len(progress_data["recent_urls"])
+        if earlier > 0:
+            url_list_html += f"<div class='url-card'>… {earlier} earlier URLs (see counters above)</div>"
+        for entry in sorted(progress_data["recent_urls"], key=lambda e: e["index"]):
+            status = entry["status"]
+
+            if status == "processing":
+                status_icon = f'<span class="url-status-icon" style="color: #3498db;">🔄</span>'
+                class_name = "url-card url-processing"
+            elif status == "retrying":
+                status_icon = '<span class="url-status-icon" style="color: #f0ad4e;">🔁</span>'
+                class_name = "url-card url-processing"
+            elif status == "skipped":
+                status_icon = '<span class="url-status-icon" style="color: #999999;">🚫</span>'
+                class_name = "url-card"
+            elif status == "success":
+                status_icon = f'<span class="url-status-icon" style="color: #8affa2;">✅</span>'
+                class_name = "url-card url-success"
+            else:  # error
+                status_icon = f'<span class="url-status-icon" style="color: #ff9090;">❌</span>'
+                class_name = "url-card url-error"
+
+            url_list_html += f"""<div id='url-{entry["index"]}' class='{class_name}'>
+                <span class='url-count'>{entry["index"]+1}</span>
+                {status_icon}
+                <span style="word-break: break-all;">{entry["url"]}</span>
+            </div>"""
+        queued = frontier.qsize()
+        if queued:
+            url_list_html += f"<div class='url-card'>⏳ {queued} more queued</div>"
+        if frontier.delayed():
+            url_list_html += f"<div class='url-card'>🔁 {frontier.delayed()} waiting to retry</div>"
+        url_list_html += "</div>"
+        url_status_area.markdown(url_list_html, unsafe_allow_html=True)
+
+    # Update UI loop: driven by status changes instead of a fixed timer
+    async def update_ui():
+        events = progress_data["events"]
+        pending = 0
+        last_draw = time.monotonic()
+        shown_content = ""
+        while True:
+            try:
+                entry = await asyncio.wait_for(events.get(), timeout=UI_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                entry = False  # Quiet period: flush whatever is pending
+            if entry is None:
+                return
+            if entry:
+                pending += 1
+            since_draw = time.monotonic() - last_draw
+            if not pending or since_draw < UI_MIN_INTERVAL:
+                continue
+            if entry is False or pending >= UI_REDRAW_EVERY or since_draw >= UI_MAX_STALENESS:
+                render_progress()
+                # Only resend the preview when a newer page has replaced it
+                if progress_data["current_content"] is not shown_content:
+                    shown_content = progress_data["current_content"]
+                    content_area.markdown(shown_content, unsafe_allow_html=True)
+                pending = 0
+                last_draw = time.monotonic()
+
+    # Run UI updater in parallel with the crawl
     ui_task = asyncio.create_task(update_ui())
-
-    # Wait for all URL processing tasks to complete
-    await asyncio.gather(*tasks)
-
-    # Set progress to 100%
-    progress_data["progress"] = 1.0
+    try:
+        output_path = await run_crawl(progress_data)
+    finally:
+        # Stop the UI updater
+        progress_data["events"].put_nowait(None)
+        await ui_task
+
+    total_urls = progress_data["total_urls"]
+    connection_stats = progress_data["connection_stats"]
     progress_bar.progress(1.0)
-
-    # Cancel the UI updater
-    ui_task.cancel()
+    if progress_data.get("discovery_error"):
+        st.error(f"⚠️ URL discovery stopped early: {progress_data['discovery_error']}")
 
     # Final UI update
+    cache_stats = connection_stats["cache"]
+    cache_html = f"<p>🗄️ HTTP cache: {cache_stats['hits']} hits, {cache_stats['revalidated']} revalidated, {cache_stats['misses']} misses ({cache_stats['bytes'] / (1024 * 1024):.1f} MB in {cache_stats['entries']} entries)</p>" \
+        if cache_stats else ""
+    if progress_data["retries"] or progress_data["circuit_breaker"].trips:
+        cache_html += f"<p>🔁 Retries: {progress_data['retries']}, circuit breaker trips: {progress_data['circuit_breaker'].trips}</p>"
+    if progress_data["robots_skipped"]:
+        cache_html += f"<p>🤖 {progress_data['robots_skipped']} URLs skipped (disallowed by robots.txt)</p>"
+    if progress_data["content_skipped"]:
+        cache_html += f"<p>📎 {progress_data['content_skipped']} URLs skipped (not HTML or too large)</p>"
+    if progress_data["link_follower"] is not None:
+        follower = progress_data["link_follower"]
+        cache_html += f"<p>🔗 {follower.links_found} links found, {follower.queued} unique in-scope URLs queued</p>"
+    if connection_stats["host_pauses"]:
+        cache_html += f"<p>⏸️ Hosts paused {connection_stats['host_pauses']} times after 429/503 responses</p>"
+    if connection_stats.get("conversion_cache"):
+        reused = connection_stats["conversion_cache"]["hits"]
+        cache_html += f"<p>♻️ Markdown reused for {reused} of {reused + connection_stats['conversion_cache']['misses']} converted pages</p>"
     status_html = f"""
     <div class='progress-card'>
         <h3>✅ Crawling Complete!</h3>
@@ -971,6 +523,8 @@ async def crawl_list_of_urls(urls, combined_markdown_output="", wait_time=3, ext
             <div style="color: #8affa2;">✅ Success: {progress_data["successful_crawls"]}</div>
             <div style="color: #ff9090;">❌ Failed: {progress_data["failed_crawls"]}</div>
         </div>
+        <p>🔌 Connections opened: {connection_stats["connections_opened"]} for {connection_stats["requests_sent"]} requests (reuse ratio {connection_stats["reuse_ratio"]*100:.1f}%)</p>
+        {cache_html}
     </div>
     """
     status_text.markdown(status_html, unsafe_allow_html=True)
@@ -978,26 +532,8 @@ async def crawl_list_of_urls(urls, combined_markdown_output="", wait_time=3, ext
     # Remove floating status
     float_container.empty()
 
-    # Combine all content with proper formatting
-    combined_content = "\n".join(progress_data["results"])
-
-    # Add metadata at the top of the file
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    metadata = f"""# Web Crawler Results
-Generated on: {timestamp}
-Crawl method: {crawl_method}
-
-Total URLs processed: {total_urls}
-- ✅ Successful: {progress_data["successful_crawls"]}
-- ❌ Failed: {progress_data["failed_crawls"]}
-
----
-
-"""
-    final_content = metadata + combined_content
-
-    # Add download button at the top via placeholder
-    filename = f"crawl_results_{crawl_method}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+    timestamp = progress_data["finished_at"]
+    output_size = os.path.getsize(output_path)
 
     download_html = f'''
     <div style="background-color: #1e1e1e; padding: 15px; border-radius: 8px; margin-bottom: 20px; border: 1px solid #4CAF50;">
@@ -1005,32 +541,43 @@ Total URLs processed: {total_urls}
         <p style="color: #e0e0e0; margin-bottom: 10px;">
             Crawling completed at: {timestamp}<br>
             Method: {crawl_method}<br>
-            Total URLs: {total_urls}, <span style="color: #8affa2;">Successful: {progress_data["successful_crawls"]}</span>, <span style="color: #ff9090;">Failed: {progress_data["failed_crawls"]}</span>
+            Total URLs: {total_urls}, <span style="color: #8affa2;">Successful: {progress_data["successful_crawls"]}</span>, <span style="color: #ff9090;">Failed: {progress_data["failed_crawls"]}</span><br>
+            Saved to: <code>{output_path}</code> ({output_size / (1024 * 1024):.1f} MB)
         </p>
     </div>
     '''
     download_placeholder.markdown(download_html, unsafe_allow_html=True)
 
-    download_placeholder.download_button(
-        label="📥 Download as Markdown",
-        data=final_content,
-        file_name=filename,
-        mime="text/markdown",
-        help="Download the complete crawl results as a Markdown file"
-    )
+    if output_size <= MAX_DOWNLOAD_BYTES:
+        mime = {"md": "text/markdown", "jsonl": "application/jsonl", "zip": "application/zip"}[
+            output_path.rsplit(".", 1)[-1]]
+        # Hand Streamlit the file rather than an in-memory copy of the whole crawl
+        with open(output_path, "rb") as output_file:
+            download_placeholder.download_button(
+                label=f"📥 Download results ({os.path.basename(output_path)})",
+                data=output_file,
+                file_name=os.path.basename(output_path),
+                mime=mime,
+                help="Download the complete crawl results"
+            )
+    else:
+        st.info(f"📁 Results are too large to download through the browser; find them at {output_path}")
 
-    return final_content
+    return output_path
 
 
-async def crawl_sitemap(sitemap_url, extraction_config=None, concurrency_limit=5, crawl_method="hybrid"):
-    """Crawl all URLs found in the sitemap and write full markdown content to a file."""
-    with st.spinner('🔍 Fetching sitemap...'):
-        urls = await fetch_sitemap(sitemap_url)
-        st.success(f"📋 Found {len(urls)} URLs in sitemap")
-    await crawl_list_of_urls(urls, extraction_config=extraction_config, concurrency_limit=concurrency_limit, crawl_method=crawl_method)
+async def crawl_sitemap(sitemap_url, extraction_config=None, concurrency_limit=5, crawl_method="hybrid", http_config=None, crawl4ai_profile="thorough", conversion_workers=DEFAULT_CONVERSION_WORKERS, output_config=None, conversion_cache_path="", wait_time=None, job_id="", processes=1):
+    """Crawl all URLs found in the sitemap and write full markdown content to a file.
+
+    The sitemap (including nested sitemap indexes and .gz files) is streamed,
+    so crawling starts with the first URL found rather than after parsing.
+    Each page's lastmod, priority and changefreq are kept in its result.
+    """
+    st.info("📋 Streaming URLs from sitemap; crawling starts as they are found")
+    await crawl_list_of_urls(SitemapSource(sitemap_url), wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=concurrency_limit, crawl_method=crawl_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile, conversion_workers=conversion_workers, output_config=output_config, conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes)
 
 
-async def crawl_using_query(query, extraction_config=None, concurrency_limit=5, num_results=10, crawl_method="hybrid"):
+async def crawl_using_query(query, extraction_config=None, concurrency_limit=5, num_results=10, crawl_method="hybrid", http_config=None, crawl4ai_profile="thorough", conversion_workers=DEFAULT_CONVERSION_WORKERS, output_config=None, conversion_cache_path="", wait_time=None, job_id="", processes=1):
     """Perform a Google search using the provided query and crawl the resulting URLs."""
     with st.spinner('🔍 Searching Google...'):
         urls = get_urls_from_google(query, num_results=num_results)
@@ -1038,7 +585,18 @@ async def crawl_using_query(query, extraction_config=None, concurrency_limit=5,
             st.success(f"🎯 Found {len(urls)} search results")
         else:
             st.warning("No search results found")
-    await crawl_list_of_urls(urls, extraction_config=extraction_config, concurrency_limit=concurrency_limit, crawl_method=crawl_method)
+    await crawl_list_of_urls(urls, wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=concurrency_limit, crawl_method=crawl_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile, conversion_workers=conversion_workers, output_config=output_config, conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes)
+
+
+async def crawl_site(start_url, follow_config=None, extraction_config=None, concurrency_limit=5, crawl_method="hybrid", http_config=None, crawl4ai_profile="thorough", conversion_workers=DEFAULT_CONVERSION_WORKERS, output_config=None, conversion_cache_path="", wait_time=None, job_id="", processes=1):
+    """Crawl ``start_url`` and the pages it links to, breadth first.
+
+    ``follow_config`` limits depth, page count, domains and path prefix
+    (see DEFAULT_FOLLOW_CONFIG and LinkFollower).
+    """
+    follower = LinkFollower([start_url], follow_config)
+    st.info(f"🔗 Following links up to {follower.max_depth} levels deep on {', '.join(follower.domains)}")
+    return await crawl_list_of_urls(follower, wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=concurrency_limit, crawl_method=crawl_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile, conversion_workers=conversion_workers, output_config=output_config, conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes)
 
 
 def markdown_to_html(markdown_content):
@@ -1103,39 +661,8 @@ def markdown_to_html(markdown_content):
         return f"<html><body>Error converting to HTML: {str(e)}</body></html>"
 
 
-def fetch_with_requests(url, timeout=30):
-    """Fetch URL using the requests library."""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status()
-
-        # Handle encoding issues
-        if response.encoding is None or response.encoding == 'ISO-8859-1':
-            # If encoding is not detected or set to ISO-8859-1 (requests' default fallback),
-            # use apparent_encoding which is more reliable
-            response.encoding = response.apparent_encoding
-
-        # Clean HTML content before returning
-        html_content = response.text
-
-        # Remove null bytes and other problematic characters
-        html_content = html_content.replace('\x00', '')
-
-        # Return cleaned HTML
-        return html_content, response.headers.get('Content-Type', '')
-    except requests.RequestException as e:
-        logging.error(f"Error fetching {url}: {e}")
-        raise
-
-
 def main():
+    setup_page()
     check_environment()
 
     # App header with logo
@@ -1159,7 +686,7 @@ def main():
             # Input type selection with radio buttons
             input_type = st.radio(
                 "Input type:",
-                ["🌐 Webpage URL", "📑 Sitemap URL", "🔍 Search Query"],
+                ["🌐 Webpage URL", "🔗 Follow links", "📑 Sitemap URL", "🔍 Search Query"],
                 horizontal=True,
                 help="Select the type of input you're providing"
             )
@@ -1184,8 +711,8 @@ def main():
             with col2:
                 wait_time = st.slider(
                     "Wait time (seconds)",
-                    0, 10, 3,
-                    help="Add delay between requests to avoid rate limiting"
+                    0.0, 10.0, 1 / DEFAULT_HTTP_CONFIG["host_rps"], step=0.1,
+                    help="Average gap between requests to the same host (0 = no limit); up to \"Burst per host\" requests may still go back to back. Other hosts are crawled meanwhile"
                 )
             with col3:
                 max_results = st.slider(
@@ -1194,6 +721,25 @@ def main():
                     help="Maximum number of results to fetch from search"
                 )
 
+            # Limits for "Follow links"
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                follow_depth = st.slider(
+                    "Link depth",
+                    0, 10, DEFAULT_FOLLOW_CONFIG["max_depth"],
+                    help="How many links away from the start page to follow (Follow links only)"
+                )
+            with col2:
+                follow_max_pages = st.number_input(
+                    "Max pages", min_value=0, value=DEFAULT_FOLLOW_CONFIG["max_pages"], step=100,
+                    help="Stop queuing new pages after this many (0 = no limit)"
+                )
+            with col3:
+                follow_path_prefix = st.text_input(
+                    "Stay under path", placeholder="/docs/",
+                    help="Only follow links whose path starts with this; the start page's host and its subdomains are always the limit"
+                )
+
             # Submit button
             submit_button = st.form_submit_button(
                 label="🚀 Start Crawling",
@@ -1217,6 +763,9 @@ def main():
             with col2:
                 respect_robots = st.checkbox("Respect robots.txt", value=True,
                                              help="Follow robots.txt rules when crawling")
+                follow_robots_sitemaps = st.checkbox(
+                    "Also crawl sitemaps listed in robots.txt", value=False, disabled=not respect_robots,
+                    help="After the given URLs, crawl every URL in the Sitemap: entries of their hosts' robots.txt")
 
             # Content type radio selector
             prioritize_content_type = st.radio(
@@ -1242,6 +791,73 @@ def main():
                     help="Maximum time to wait for a response"
                 )
 
+            col1, col2 = st.columns(2)
+            with col1:
+                max_connections_per_host = st.slider(
+                    "Connections per host",
+                    1, 50, DEFAULT_HTTP_CONFIG["max_connections_per_host"],
+                    help="Keep-alive connections kept open to any single host"
+                )
+            with col2:
+                dns_cache_ttl = st.slider(
+                    "DNS cache TTL (seconds)",
+                    0, 3600, DEFAULT_HTTP_CONFIG["dns_cache_ttl"],
+                    help="How long resolved host addresses are reused"
+                )
+
+            col1, col2 = st.columns(2)
+            with col1:
+                use_http_cache = st.checkbox(
+                    "Use HTTP cache", value=False,
+                    help="Keep pages on disk and revalidate them with ETag/Last-Modified on later runs"
+                )
+            with col2:
+                cache_max_mb = st.number_input(
+                    "Cache size limit (MB)", min_value=16, value=DEFAULT_HTTP_CONFIG["cache_max_mb"], step=64,
+                    disabled=not use_http_cache
+                )
+            if use_http_cache:
+                cache_dir = st.text_input("Cache directory", value=DEFAULT_CACHE_DIR)
+
+            reuse_conversions = st.checkbox(
+                "Reuse markdown for unchanged pages", value=True,
+                help=f"Skip conversion when identical HTML was converted before (stored in {DEFAULT_CONVERSION_CACHE})"
+            )
+
+            col1, col2 = st.columns(2)
+            with col1:
+                max_body_mb = st.number_input(
+                    "Largest page (MB)", min_value=0, value=DEFAULT_HTTP_CONFIG["max_body_mb"], step=5,
+                    help="Downloads past this size are abandoned and the URL skipped (0 = no limit)"
+                )
+            with col2:
+                keep_text_files = st.checkbox(
+                    "Keep plain text and JSON", value=DEFAULT_HTTP_CONFIG["non_html"] == "text",
+                    help="Save text, Markdown, JSON and CSV files as they are; other non-HTML files (PDFs, images, archives) are always skipped"
+                )
+                head_probe = st.checkbox(
+                    "Check with HEAD first", value=DEFAULT_HTTP_CONFIG["head_probe"],
+                    help="Ask for each URL's type and size before downloading it; saves bandwidth on sites full of large files"
+                )
+
+            host_burst = st.slider(
+                "Burst per host",
+                1, 20, DEFAULT_HTTP_CONFIG["host_burst"],
+                help="Requests a host may receive back to back before the wait time applies"
+            )
+
+            conversion_workers_setting = st.slider(
+                "Markdown conversion processes",
+                0, os.cpu_count() or 1, DEFAULT_CONVERSION_WORKERS,
+                help="Worker processes converting HTML to markdown alongside downloads (0 converts on the main thread)"
+            )
+
+            processes_setting = st.slider(
+                "Crawler processes",
+                1, max(2, os.cpu_count() or 1), 1,
+                help="Split the crawl by host over this many processes, each fetching and converting its share; helps crawls of many hosts once one core is busy"
+            )
+
             # Advanced settings
             with st.expander("Advanced Settings", expanded=False):
                 # First row
@@ -1264,6 +880,13 @@ def main():
                     selected_agent = st.selectbox(
                         "Select User Agent", USER_AGENTS)
 
+                crawl4ai_profile_option = st.radio(
+                    "Crawl4AI HTTP profile:",
+                    ["Thorough (simulate user)", "Fast"],
+                    horizontal=True,
+                    help="Fast skips user simulation and the random 1-3s delay; use it when the site serves plain HTML"
+                )
+
                 # Custom CSS selectors for advanced users
                 # Custom CSS selectors for advanced users
                 custom_selectors = st.text_area(
@@ -1272,6 +895,31 @@ def main():
                     help="For advanced users: target specific page elements"
                 )
 
+                # Output settings
+                col1, col2 = st.columns(2)
+                with col1:
+                    output_format_option = st.radio(
+                        "Result format:",
+                        ["Markdown", "JSONL"],
+                        horizontal=True,
+                        help="JSONL writes one JSON record per page"
+                    )
+                with col2:
+                    shard_size_setting = st.number_input(
+                        "Pages per output file", min_value=0, value=0, step=1000,
+                        help="Split large crawls into several files (downloaded as a zip); 0 keeps one file"
+                    )
+                output_directory = st.text_input(
+                    "Output directory",
+                    placeholder="Leave empty to use a temporary directory",
+                    help="Results are written here page by page while crawling"
+                )
+                job_id_setting = st.text_input(
+                    "Job ID",
+                    placeholder="Leave empty for a one-off crawl",
+                    help="Name the crawl to make it resumable: after a reload or crash, start it again with the same ID to continue where it stopped"
+                )
+
                 # Proxy settings
                 use_proxy = st.checkbox("Use proxy", value=False,
                                         help="Use a proxy server (useful for bypassing rate limits)")
@@ -1319,6 +967,45 @@ def main():
         "custom_selectors": [s.strip() for s in custom_selectors.split(',')] if 'custom_selectors' in locals() and custom_selectors else []
     }
 
+    http_config = {
+        "max_connections_per_host": max_connections_per_host if 'max_connections_per_host' in locals() else DEFAULT_HTTP_CONFIG["max_connections_per_host"],
+        "dns_cache_ttl": dns_cache_ttl if 'dns_cache_ttl' in locals() else DEFAULT_HTTP_CONFIG["dns_cache_ttl"],
+        "cache_dir": cache_dir if 'use_http_cache' in locals() and use_http_cache and cache_dir else "",
+        "cache_max_mb": int(cache_max_mb) if 'cache_max_mb' in locals() else DEFAULT_HTTP_CONFIG["cache_max_mb"],
+        "host_burst": host_burst if 'host_burst' in locals() else DEFAULT_HTTP_CONFIG["host_burst"],
+        "max_retries": retry_count if 'retry_count' in locals() else DEFAULT_HTTP_CONFIG["max_retries"],
+        "respect_robots": respect_robots if 'respect_robots' in locals() else DEFAULT_HTTP_CONFIG["respect_robots"],
+        "robots_sitemaps": follow_robots_sitemaps if 'follow_robots_sitemaps' in locals() else False,
+        "max_body_mb": max_body_mb if 'max_body_mb' in locals() else DEFAULT_HTTP_CONFIG["max_body_mb"],
+        "head_probe": head_probe if 'head_probe' in locals() else DEFAULT_HTTP_CONFIG["head_probe"],
+        "non_html": ("text" if keep_text_files else "skip") if 'keep_text_files' in locals() else DEFAULT_HTTP_CONFIG["non_html"]
+    }
+
+    conversion_workers = conversion_workers_setting if 'conversion_workers_setting' in locals(
+    ) else DEFAULT_CONVERSION_WORKERS
+
+    output_config = {
+        "format": "jsonl" if 'output_format_option' in locals() and output_format_option == "JSONL" else "markdown",
+        "directory": output_directory if 'output_directory' in locals() else "",
+        "shard_size": int(shard_size_setting) if 'shard_size_setting' in locals() else 0
+    }
+
+    job_id = job_id_setting.strip() if 'job_id_setting' in locals() else ""
+
+    processes = processes_setting if 'processes_setting' in locals() else 1
+
+    follow_config = {
+        "max_depth": follow_depth if 'follow_depth' in locals() else DEFAULT_FOLLOW_CONFIG["max_depth"],
+        "max_pages": int(follow_max_pages) if 'follow_max_pages' in locals() else DEFAULT_FOLLOW_CONFIG["max_pages"],
+        "path_prefix": follow_path_prefix.strip() if 'follow_path_prefix' in locals() else ""
+    }
+
+    conversion_cache_path = DEFAULT_CONVERSION_CACHE if 'reuse_conversions' not in locals(
+    ) or reuse_conversions else ""
+
+    crawl4ai_profile = "fast" if 'crawl4ai_profile_option' in locals(
+    ) and crawl4ai_profile_option == "Fast" else "thorough"
+
     # Use concurrency setting from either the form or the settings tab
     actual_concurrency = concurrency_limit if 'submit_button' in locals(
     ) and submit_button else concurrency_setting if 'concurrency_setting' in locals() else 5
@@ -1337,18 +1024,22 @@ def main():
     # Process the input if form is submitted
     if 'submit_button' in locals() and submit_button:
         if input_text:
-            if input_type == "📑 Sitemap URL" or input_text.lower().endswith(".xml"):
+            if input_type == "🔗 Follow links":
+                st.info("🔄 Crawling site...")
+                asyncio.run(crawl_site(
+                    input_text, follow_config=follow_config, wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=actual_concurrency, crawl_method=actual_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile, conversion_workers=conversion_workers, output_config=output_config, conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes))
+            elif input_type == "📑 Sitemap URL" or input_text.lower().endswith(".xml"):
                 st.info("🔄 Processing sitemap...")
                 asyncio.run(crawl_sitemap(
-                    input_text, extraction_config=extraction_config, concurrency_limit=actual_concurrency, crawl_method=actual_method))
+                    input_text, wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=actual_concurrency, crawl_method=actual_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile, conversion_workers=conversion_workers, output_config=output_config, conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes))
             elif input_type == "🌐 Webpage URL" or is_valid_url(input_text):
                 st.info("🔄 Processing URL...")
                 asyncio.run(crawl_list_of_urls(
-                    [input_text], wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=actual_concurrency, crawl_method=actual_method))
+                    [input_text], wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=actual_concurrency, crawl_method=actual_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile, conversion_workers=conversion_workers, output_config=output_config, conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes))
             else:
                 st.info("🔄 Processing search query...")
                 asyncio.run(crawl_using_query(
-                    input_text, extraction_config=extraction_config, concurrency_limit=actual_concurrency, num_results=max_results, crawl_method=actual_method))
+                    input_text, wait_time=wait_time, extraction_config=extraction_config, concurrency_limit=actual_concurrency, num_results=max_results, crawl_method=actual_method, http_config=http_config, crawl4ai_profile=crawl4ai_profile, conversion_workers=conversion_workers, output_config=output_config, conversion_cache_path=conversion_cache_path, job_id=job_id, processes=processes))
         else:
             st.warning("⚠️ Please enter a URL or search query.")
 
@@ -0,0 +1,86 @@
+"""Check clean_html against the old multi-pass implementation and time both.
+
+Every page in the corpus is cleaned by both implementations on identical
+parse trees; the serialized outputs must match byte for byte. Timings cover
+the pruning stage only: parsing and ``str(soup)`` are shared by both and
+unchanged.
+
+    python benchmarks/bench_clean.py --size-kb 1024
+    python benchmarks/bench_clean.py --corpus saved_pages/ --url https://docs.python.org/3/
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+from bench_parse import synthetic_page  # noqa: E402
+
+
+def legacy_prune_soup(soup):
+    """clean_html's pruning as it was before prune_soup (one scan per rule)."""
+    for tag in ['script', 'style', 'nav', 'footer', 'iframe', 'noscript', 'header', 'aside']:
+        for element in soup.find_all(tag):
+            if not element.find(['pre', 'code']):
+                element.decompose()
+
+    for term in ['nav', 'menu', 'sidebar', 'footer', 'header', 'banner', 'ad', 'cookie', 'popup', 'social']:
+        for element in soup.find_all(class_=lambda x: x and term in x.lower()):
+            if not element.find(['pre', 'code']):
+                element.decompose()
+        for element in soup.find_all(id=lambda x: x and term in x.lower()):
+            if not element.find(['pre', 'code']):
+                element.decompose()
+
+    return soup
+
+
+def load_corpus(args):
+    pages = {f"synthetic-{args.size_kb}kb": synthetic_page(args.size_kb)}
+    if args.corpus:
+        for path in sorted(glob.glob(os.path.join(args.corpus, "*.htm*"))):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages[os.path.basename(path)] = f.read()
+    for url in args.url:
+        pages[url] = requests.get(url, timeout=30).text
+    return pages
+
+
+def timed(fn, html, repeat):
+    total = 0.0
+    for _ in range(repeat):
+        soup = crawler.parse_html(html)
+        start = time.perf_counter()
+        fn(soup)
+        total += time.perf_counter() - start
+    return str(soup), total / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--corpus", help="Directory of saved .html pages")
+    parser.add_argument("--url", action="append", default=[],
+                        help="Live page to add to the corpus (repeatable)")
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'page':<48}  {'KB':>6}  {'old ms':>8}  {'new ms':>8}  {'speedup':>7}  same")
+    for name, html in load_corpus(args).items():
+        old, old_ms = timed(legacy_prune_soup, html, args.repeat)
+        new, new_ms = timed(crawler.prune_soup, html, args.repeat)
+        same = old == new == crawler.clean_html(crawler.parse_html(html))
+        mismatches += not same
+        print(f"{name[:48]:<48}  {len(html) / 1024:>6.0f}  {old_ms:>8.1f}  {new_ms:>8.1f}  "
+              f"{old_ms / new_ms:>6.1f}x  {'yes' if same else 'NO'}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
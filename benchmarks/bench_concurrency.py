@@ -0,0 +1,101 @@
+"""Measure pages/sec of the requests-based crawl methods at several concurrency levels.
+
+Starts a local HTTP server that answers every request after a fixed delay,
+then drives ``process_single_url`` exactly like ``run_crawl`` does.
+With a non-blocking fetch path throughput should grow roughly linearly with
+the concurrency limit until the server or CPU saturates.
+
+    python benchmarks/bench_concurrency.py --pages 60 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+from conversion import DEFAULT_CONVERSION_WORKERS  # noqa: E402
+
+PAGE = b"""<!DOCTYPE html><html><head><title>Bench page</title>
+<meta name="description" content="Synthetic page"></head>
+<body><main><h1>Bench page</h1><p>Hello from the benchmark server.</p>
+<pre><code class="language-python">print("hello")</code></pre></main></body></html>"""
+
+
+def start_server(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = -1  # send headers and body in one segment
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_level(base_url, pages, concurrency, crawl_method, profile, conversion_workers):
+    urls = [f"{base_url}/page/{i}" for i in range(pages)]
+    progress_data = crawler.create_progress_data(
+        concurrency, crawl_method, crawl4ai_profile=profile,
+        conversion_workers=conversion_workers, total_urls=pages)
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[
+            crawler.process_single_url(url, i, pages, progress_data, semaphore,
+                                   None, crawl_method)
+            for i, url in enumerate(urls)
+        ])
+    finally:
+        stats = await crawler.close_progress_data(progress_data)
+        progress_data["result_sink"].close()
+    elapsed = time.perf_counter() - start
+    return pages / elapsed, progress_data["failed_crawls"], stats["reuse_ratio"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Server delay per response in seconds")
+    parser.add_argument("--levels", default="1,2,5,10,20",
+                        help="Comma-separated concurrency limits")
+    parser.add_argument("--method", default="requests_only",
+                        choices=["hybrid", "requests_only", "crawl4ai_http",
+                                 "crawl4ai_raw_html"])
+    parser.add_argument("--profile", default="fast", choices=["thorough", "fast"],
+                        help="Run profile for crawl4ai_http")
+    parser.add_argument("--conversion-workers", type=int, default=DEFAULT_CONVERSION_WORKERS,
+                        help="Markdown conversion processes (0 = in-process)")
+    args = parser.parse_args()
+
+    server = start_server(args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        print(f"{'concurrency':>11}  {'pages/sec':>9}  {'failed':>6}  {'reuse':>6}")
+        for level in [int(x) for x in args.levels.split(",")]:
+            rate, failed, reuse = asyncio.run(
+                run_level(base_url, args.pages, level, args.method, args.profile,
+                          args.conversion_workers))
+            print(f"{level:>11}  {rate:>9.1f}  {failed:>6}  {reuse:>6.0%}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Measure markdown conversion throughput in-process and on the process pool.
+
+Converts a batch of synthetic documentation pages through
+``process_with_crawl4ai`` with 0 (event loop) and N worker processes.
+
+    python benchmarks/bench_conversion.py --pages 32 --sections 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+from conversion import create_conversion_pool  # noqa: E402
+
+
+def docs_page(sections):
+    parts = ["<html><head><title>Docs</title></head><body><nav><a href='/'>Home</a></nav><main>"]
+    for i in range(sections):
+        parts.append(
+            f"<h2>Section {i}</h2><p>This section explains feature {i} in detail, "
+            f"with enough prose to survive content pruning and keep the filter busy.</p>"
+            f"<pre><code class='language-python'>def feature_{i}(x):\n    return x * {i}\n</code></pre>")
+    parts.append("</main><footer>Footer</footer></body></html>")
+    return "".join(parts)
+
+
+async def run(pages, html, workers):
+    pool = create_conversion_pool(workers)
+    try:
+        if pool is not None:
+            # Warm the workers so process start-up isn't measured
+            await asyncio.gather(*[crawler.process_with_crawl4ai(html, "http://warm", conversion_pool=pool)
+                                   for _ in range(workers)])
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            crawler.process_with_crawl4ai(html, f"http://bench/{i}", conversion_pool=pool)
+            for i in range(pages)
+        ])
+        return pages / (time.perf_counter() - start)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=32)
+    parser.add_argument("--sections", type=int, default=200,
+                        help="Sections per synthetic page (controls page size)")
+    parser.add_argument("--levels", default=f"0,1,2,{os.cpu_count() or 1}",
+                        help="Comma-separated worker counts (0 = in-process)")
+    args = parser.parse_args()
+
+    html = docs_page(args.sections)
+    print(f"page size: {len(html) / 1024:.0f} KB")
+    print(f"{'workers':>7}  {'pages/sec':>9}")
+    for workers in [int(x) for x in args.levels.split(",")]:
+        rate = asyncio.run(run(args.pages, html, workers))
+        print(f"{workers:>7}  {rate:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
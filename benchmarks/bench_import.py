@@ -0,0 +1,91 @@
+"""Measure cold-start import time and Streamlit rerun overhead.
+
+Each module is imported in a fresh interpreter with ``python -X importtime``;
+the report shows the median total and the heaviest direct imports. The
+crawl engines and optional backends (aiohttp, googlesearch, bs4, crawl4ai)
+must only be imported when a crawl needs them, so the script exits with
+status 1 if importing a module pulls one of them in. Reruns are timed with
+Streamlit's AppTest, which executes app.py the way the server does on every
+widget interaction.
+
+    python benchmarks/bench_import.py --runs 5 --reruns 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only; importing crawler, cli or app must not pull these in
+LAZY_MODULES = ["aiohttp", "googlesearch", "bs4", "crawl4ai"]
+
+
+def import_profile(module):
+    """Import ``module`` in a fresh interpreter; return (total µs, {direct import: µs}, lazy modules loaded)."""
+    check = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", check],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    total, children = 0, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == module and depth == 0:
+            total = int(cumulative)
+        elif depth == 1:
+            children[name.strip()] = int(cumulative)
+    loaded = [name for name in proc.stdout.strip().split(",") if name]
+    return total, children, loaded
+
+
+def time_reruns(reruns):
+    """Seconds for the first AppTest run of app.py and the median of the following reruns."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - start
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+    return first, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", default="crawler,cli,app",
+                        help="Comma-separated modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest direct imports to list")
+    parser.add_argument("--reruns", type=int, default=10,
+                        help="Streamlit reruns of app.py to time (0 = skip)")
+    args = parser.parse_args()
+
+    eager = 0
+    print(f"{'module':<10}  {'median ms':>9}  {'min ms':>7}  heaviest direct imports (ms)")
+    for module in args.modules.split(","):
+        profiles = [import_profile(module) for _ in range(args.runs)]
+        totals = [total / 1000 for total, _, _ in profiles]
+        children, loaded = profiles[-1][1], profiles[-1][2]
+        heaviest = sorted(children.items(), key=lambda item: -item[1])[:args.top]
+        print(f"{module:<10}  {statistics.median(totals):>9.0f}  {min(totals):>7.0f}  "
+              + ", ".join(f"{name} {us / 1000:.0f}" for name, us in heaviest))
+        if loaded:
+            eager += 1
+            print(f"{'':<10}  loaded eagerly: {', '.join(loaded)}")
+
+    if args.reruns > 0:
+        first, rerun = time_reruns(args.reruns)
+        print(f"app.py first run {first * 1000:.0f} ms, rerun median {rerun * 1000:.0f} ms")
+    sys.exit(1 if eager else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare parse time and peak memory of the per-page HTML parsing steps.
+
+"before" is the old path: a full html.parser BeautifulSoup tree built just
+to read the title and description. "after" is the head-only scan used by
+process_result today, plus the shared lxml parse used for cleaning.
+
+    python benchmarks/bench_parse.py --size-kb 1024
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+
+
+def synthetic_page(size_kb):
+    head = ("<html><head><meta charset='utf-8'><title>Synthetic docs page</title>"
+            "<meta name='description' content='Benchmark page'></head><body>"
+            "<nav class='main-nav'><a href='/'>Home</a></nav><main>")
+    block = ("<section><h2>Heading</h2><p>Some <b>documentation</b> text with a "
+             "<a href='/x'>link</a>.</p><pre><code class='language-python'>"
+             "print('hello')</code></pre><div class='sidebar-box'>aside</div></section>")
+    repeat = max(1, size_kb * 1024 // len(block))
+    return head + block * repeat + "</main><footer>Footer</footer></body></html>"
+
+
+def measure(fn, repeat):
+    # Time and memory are measured separately; tracemalloc skews timings
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    html = synthetic_page(args.size_kb)
+    cases = [
+        ("metadata: full html.parser soup (before)",
+         lambda: crawler.extract_metadata(BeautifulSoup(html, 'html.parser'))),
+        ("metadata: head-only scan (after)",
+         lambda: crawler.extract_metadata(html)),
+        ("clean_html: html.parser parse (before)",
+         lambda: crawler.clean_html(BeautifulSoup(html, 'html.parser'))),
+        ("clean_html: shared lxml parse (after)",
+         lambda: crawler.clean_html(crawler.parse_html(html))),
+    ]
+    print(f"page size: {len(html) / 1024:.0f} KB")
+    print(f"{'step':<42}  {'ms/page':>9}  {'peak MB':>8}")
+    for name, fn in cases:
+        ms, peak = measure(fn, args.repeat)
+        print(f"{name:<42}  {ms:>9.2f}  {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Time robots.txt decisions for a large URL list.
+
+Compares RobotsRules (prefix dict + one compiled alternation) with the
+standard library's urllib.robotparser on the same rules. The two can
+disagree: robotparser applies the first matching rule rather than the most
+specific one.
+
+    python benchmarks/bench_robots.py --urls 100000 --rules 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import urllib.robotparser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+
+
+def robots_txt(rules):
+    lines = ["User-agent: *"]
+    for i in range(rules // 2):
+        lines.append(f"Disallow: /section{i}/private")
+        lines.append(f"Allow: /section{i}/private/public")
+    lines.append("Disallow: /*.pdf$")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=100000)
+    parser.add_argument("--rules", type=int, default=200)
+    args = parser.parse_args()
+
+    text = robots_txt(args.rules)
+    sections = args.rules // 2 + 10
+    urls = [f"https://docs.example.com/section{random.randrange(sections)}/"
+            f"{random.choice(['private/public/', 'private/', 'guide/'])}page{i}"
+            f"{random.choice(['.html', '.pdf'])}"
+            for i in range(args.urls)]
+
+    start = time.perf_counter()
+    rules = crawler.RobotsRules.parse(text)
+    compiled = [rules.allowed(url) for url in urls]
+    ours = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stdlib = urllib.robotparser.RobotFileParser()
+    stdlib.parse(text.splitlines())
+    reference = [stdlib.can_fetch("*", url) for url in urls]
+    theirs = time.perf_counter() - start
+
+    print(f"{args.urls} URLs, {args.rules} rules")
+    print(f"{'RobotsRules':<22}  {ours:>7.3f}s  {args.urls / ours:>10.0f} URLs/s  {sum(compiled)} allowed")
+    print(f"{'urllib.robotparser':<22}  {theirs:>7.3f}s  {args.urls / theirs:>10.0f} URLs/s  {sum(reference)} allowed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare memory and speed of the link-following seen-set with a plain set.
+
+Canonicalises N synthetic links (a third of them duplicates with tracking
+parameters or fragments) and adds them to a SeenSet and to a Python set of
+URL strings. The SeenSet's memory is fixed by its capacity; the set grows
+with every URL.
+
+    python benchmarks/bench_seen.py --urls 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+
+
+def links(count):
+    for i in range(count):
+        page = random.randrange(count * 2 // 3)
+        yield random.choice([
+            f"https://docs.example.com/guide/section-{page % 500}/page-{page}",
+            f"https://docs.example.com/guide/section-{page % 500}/page-{page}/?utm_source=nav",
+            f"https://Docs.Example.com/guide/section-{page % 500}/page-{page}#intro",
+        ])
+
+
+def fill(factory, add, urls):
+    seen = factory()
+    return sum(add(seen, crawler.canonicalize_url(url)) for url in urls)
+
+
+def measure(name, factory, add, urls):
+    # Time and memory are measured separately; tracemalloc skews timings
+    start = time.perf_counter()
+    new = fill(factory, add, urls)
+    elapsed = time.perf_counter() - start
+    # The seen-set is created under tracemalloc so its up-front allocation counts
+    tracemalloc.start()
+    fill(factory, add, urls)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28}  {len(urls) / elapsed:>10.0f}  {peak / (1024 * 1024):>8.1f}  {new:>9}")
+
+
+def add_to_set(seen, url):
+    if url in seen:
+        return False
+    seen.add(url)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=1000000)
+    parser.add_argument("--capacity", type=int, default=crawler.DEFAULT_FOLLOW_CONFIG["seen_capacity"])
+    parser.add_argument("--error-rate", type=float, default=crawler.DEFAULT_FOLLOW_CONFIG["seen_error_rate"])
+    args = parser.parse_args()
+
+    urls = list(links(args.urls))
+    print(f"{args.urls} links")
+    print(f"{'seen-set':<28}  {'links/s':>10}  {'peak MB':>8}  {'new URLs':>9}")
+    measure("SeenSet (Bloom filter)", lambda: crawler.SeenSet(args.capacity, args.error_rate),
+            crawler.SeenSet.add, urls)
+    measure("set of URL strings", set, add_to_set, urls)
+
+
+if __name__ == "__main__":
+    main()
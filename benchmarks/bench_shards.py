@@ -0,0 +1,95 @@
+"""Measure how a sharded crawl scales with the number of worker processes.
+
+A separate process serves synthetic documentation pages on ``--hosts``
+local ports; each port counts as its own host, so the URLs spread over the
+shards (a crawl of a single host stays on one process). Every level runs a
+full prepare_crawl/run_crawl with markdown conversion, which is CPU-bound,
+so pages/sec should grow close to linearly until the processes outnumber
+the cores.
+
+    python benchmarks/bench_shards.py --pages 200 --size-kb 32 --levels 1,2,4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawler  # noqa: E402
+from bench_parse import synthetic_page  # noqa: E402
+
+
+def serve(hosts, size_kb, ports, stop):
+    page = synthetic_page(size_kb).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = -1  # send headers and body in one segment
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, *args):
+            pass
+
+    for _ in range(hosts):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ports.put(server.server_address[1])
+    stop.wait()
+
+
+async def run_level(urls, processes, concurrency, crawl_method):
+    progress_data = crawler.prepare_crawl(
+        urls, concurrency_limit=concurrency, crawl_method=crawl_method, conversion_workers=0,
+        http_config={"host_rps": 0, "respect_robots": False}, output_config={"format": "jsonl"},
+        processes=processes)
+    start = time.perf_counter()
+    output_path = await crawler.run_crawl(progress_data)
+    elapsed = time.perf_counter() - start
+    os.remove(output_path)
+    return len(urls) / elapsed, progress_data["failed_crawls"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=32, help="Size of each page")
+    parser.add_argument("--hosts", type=int, default=32, help="Local ports serving the pages")
+    parser.add_argument("--levels", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)),
+                        help="Comma-separated process counts")
+    parser.add_argument("--concurrency", type=int, default=32, help="URLs in flight across all processes")
+    parser.add_argument("--method", default="requests_only", choices=["hybrid", "requests_only", "crawl4ai_raw_html"])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    ports, stop = context.Queue(), context.Event()
+    server = context.Process(target=serve, args=(args.hosts, args.size_kb, ports, stop), daemon=True)
+    server.start()
+    bases = [f"http://127.0.0.1:{ports.get()}" for _ in range(args.hosts)]
+    urls = [f"{bases[i % args.hosts]}/page/{i}" for i in range(args.pages)]
+    try:
+        print(f"{os.cpu_count()} CPUs, {args.pages} pages of {args.size_kb} KB on {args.hosts} hosts")
+        print(f"{'processes':>9}  {'pages/sec':>9}  {'speedup':>7}  {'failed':>6}")
+        baseline = None
+        for level in [int(x) for x in args.levels.split(",")]:
+            rate, failed = asyncio.run(run_level(urls, level, args.concurrency, args.method))
+            baseline = baseline or rate
+            print(f"{level:>9}  {rate:>9.1f}  {rate / baseline:>6.2f}x  {failed:>6}")
+    finally:
+        stop.set()
+        server.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Reproducible crawl benchmarks against a local synthetic web server.
+
+A separate process serves generated documentation pages (prose plus a
+share of code blocks) on ``--hosts`` local ports, with optional latency,
+jitter and a fixed share of 500 errors, and a sitemap index over all of
+them. Which pages fail and how long each one takes depends only on
+``--seed``. Every crawl method is run at every concurrency level through
+prepare_crawl/run_crawl, each case in a fresh process. With ``--source
+sitemap`` the crawl reads its URLs from a sitemap index instead of a list;
+``--sitemap-urls`` separately times streaming a large one. The report covers
+pages/sec, p50/p95/p99 latency per URL (dispatch to final status), CPU
+seconds, and the peak RSS of the crawler and of its conversion workers.
+
+``--json`` saves the results together with the commit, Python and
+crawl4ai versions. ``--compare`` checks a run against such a file and exits
+with status 1 if any case lost more than ``--tolerance`` of its pages/sec.
+
+    python benchmarks/bench_suite.py --methods requests_only,hybrid --levels 1,4,16 --json before.json
+    python benchmarks/bench_suite.py --methods requests_only,hybrid --levels 1,4,16 --compare before.json
+    python benchmarks/bench_suite.py --source sitemap --sitemap-urls 200000 --pages 500
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import crawler  # noqa: E402
+from conversion import DEFAULT_CONVERSION_WORKERS  # noqa: E402
+
+METHODS = ["hybrid", "requests_only", "crawl4ai_http", "crawl4ai_raw_html"]
+
+CODE_SNIPPETS = [
+    ("python", "def handler(event):\n    for item in event['items']:\n        yield item.upper()\n"),
+    ("javascript", "export async function load(url) {\n  const r = await fetch(url);\n  return r.json();\n}\n"),
+    ("bash", "pip install -r requirements.txt\npython -m cli --urls urls.txt --format jsonl\n"),
+    ("json", '{\n  "name": "example",\n  "version": "1.2.3",\n  "private": true\n}\n'),
+]
+
+
+def docs_page(number, size_kb, code_ratio, seed):
+    """A documentation page of about ``size_kb`` KB; ``code_ratio`` of its sections are code blocks."""
+    rng = random.Random(f"{seed}-{number}")
+    parts = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Guide page {number}</title>"
+             f"<meta name='description' content='Synthetic documentation page {number}'></head><body>"
+             "<nav class='sidebar'><a href='/'>Home</a> <a href='/page/0'>Start</a></nav><main>"
+             f"<h1>Guide page {number}</h1>"]
+    size, target = 0, size_kb * 1024
+    while size < target:
+        if rng.random() < code_ratio:
+            language, code = rng.choice(CODE_SNIPPETS)
+            section = (f"<pre><code class='language-{language}'>{code * rng.randint(1, 4)}</code></pre>")
+        else:
+            words = " ".join(rng.choice(["crawler", "request", "page", "markdown", "session", "token", "queue",
+                                         "host", "limit", "parse"]) for _ in range(rng.randint(40, 120)))
+            section = (f"<h2>Section {size}</h2><p>{words} <a href='/page/{rng.randrange(1000)}'>see also</a>"
+                       f" <code>inline_{rng.randrange(100)}()</code>.</p>")
+        parts.append(section)
+        size += len(section)
+    parts.append("</main><footer>Generated for benchmarks</footer></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def page_fails(number, error_rate, seed):
+    return zlib.crc32(f"{seed}-{number}".encode()) % 10000 < error_rate * 10000
+
+
+def serve(config, ports, stop):
+    """Serve pages and sitemaps on ``config["hosts"]`` ports until ``stop`` is set."""
+    pages = {}  # Generated once per distinct page; bodies are reused across requests
+
+    def sitemap_index(total):
+        entries = "".join(f"<sitemap><loc>{base_urls[0]}/sitemap-{total}-{n}.xml.gz</loc></sitemap>"
+                          for n in range(-(-total // config["sitemap_chunk"])))
+        return ("<?xml version='1.0' encoding='UTF-8'?>"
+                f"<sitemapindex xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>{entries}</sitemapindex>").encode()
+
+    def sitemap_chunk(total, number):
+        first = number * config["sitemap_chunk"]
+        last = min(first + config["sitemap_chunk"], total)
+        entries = "".join(f"<url><loc>{base_urls[i % len(base_urls)]}/page/{i}</loc></url>" for i in range(first, last))
+        body = ("<?xml version='1.0' encoding='UTF-8'?>"
+                f"<urlset xmlns='http://www.sitemaps.org/schemas/sitemap/0.9'>{entries}</urlset>").encode()
+        return gzip.compress(body, 1)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = -1  # send headers and body in one segment
+
+        def reply(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path.startswith("/page/") and path[6:].isdigit():
+                number = int(path[6:])
+                rng = random.Random(f"{config['seed']}-latency-{number}")
+                time.sleep(max(0.0, config["latency"] + rng.uniform(-config["jitter"], config["jitter"])))
+                if page_fails(number, config["error_rate"], config["seed"]):
+                    self.reply(500, "text/plain", b"Synthetic server error")
+                    return
+                if number not in pages:
+                    pages[number] = docs_page(number, config["size_kb"], config["code_ratio"], config["seed"])
+                self.reply(200, "text/html; charset=utf-8", pages[number])
+            elif path == "/sitemap.xml":
+                self.reply(200, "application/xml", sitemap_index(config["pages"]))
+            elif path == "/large-sitemap.xml":
+                self.reply(200, "application/xml", sitemap_index(config["sitemap_urls"]))
+            elif path.startswith("/sitemap-") and path.endswith(".xml.gz"):
+                total, number = path[9:-7].split("-")
+                self.reply(200, "application/gzip", sitemap_chunk(int(total), int(number)))
+            else:
+                self.reply(404, "text/plain", b"Not found")
+
+        def log_message(self, *args):
+            pass
+
+    base_urls = []
+    for _ in range(config["hosts"]):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_urls.append(f"http://127.0.0.1:{server.server_address[1]}")
+    ports.put(base_urls)
+    stop.wait()
+
+
+class LatencyRecorder:
+    """Stands in for the progress queue: times each URL from "processing" to its final status."""
+
+    def __init__(self):
+        self.started = {}
+        self.latencies = []
+
+    def put_nowait(self, url_entry):
+        if url_entry["status"] == "processing":
+            self.started.setdefault(url_entry["index"], time.perf_counter())
+        elif url_entry["status"] != "retrying" and url_entry["index"] in self.started:
+            self.latencies.append(time.perf_counter() - self.started.pop(url_entry["index"]))
+
+
+def percentiles(values):
+    if len(values) < 2:
+        value = values[0] * 1000 if values else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50_ms": cuts[49] * 1000, "p95_ms": cuts[94] * 1000, "p99_ms": cuts[98] * 1000}
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+async def crawl_case(case, base_urls):
+    if case["source"] == "sitemap":
+        urls = crawler.iter_sitemap_urls(f"{base_urls[0]}/sitemap.xml")
+    else:
+        urls = [f"{base_urls[i % len(base_urls)]}/page/{i}" for i in range(case["pages"])]
+    output_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    progress_data = crawler.prepare_crawl(
+        urls, concurrency_limit=case["concurrency"], crawl_method=case["method"], crawl4ai_profile=case["profile"],
+        conversion_workers=case["conversion_workers"], output_config={"format": "jsonl", "directory": output_dir},
+        http_config={"host_rps": 0, "respect_robots": False, "max_retries": case["retries"]})
+    recorder = LatencyRecorder()
+    progress_data["events"] = recorder
+    cpu_start, start = cpu_seconds(), time.perf_counter()
+    try:
+        await crawler.run_crawl(progress_data)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+    # Conversion workers only count towards RUSAGE_CHILDREN once reaped
+    for child in multiprocessing.active_children():
+        child.join(timeout=10)
+    return {
+        "pages": progress_data["processed_count"],
+        "successful": progress_data["successful_crawls"],
+        "failed": progress_data["failed_crawls"],
+        "retries": progress_data["retries"],
+        "seconds": elapsed,
+        "pages_per_sec": progress_data["processed_count"] / elapsed,
+        **percentiles(recorder.latencies),
+        "cpu_seconds": cpu_seconds() - cpu_start,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def run_case(case, base_urls, results, verbose=False):
+    """Run one case in this (fresh) process and put its metrics or error on ``results``."""
+    if not verbose:
+        # Keep the crawlers' logs and crawl4ai's console output out of the table
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+    try:
+        results.put(asyncio.run(crawl_case(case, base_urls)))
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def time_sitemap(base_url):
+    """Stream the large sitemap index; returns (URLs, seconds)."""
+    async def count():
+        return sum([1 async for _ in crawler.iter_sitemap_urls(f"{base_url}/large-sitemap.xml")])
+
+    start = time.perf_counter()
+    total = asyncio.run(count())
+    return total, time.perf_counter() - start
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        from importlib.metadata import version
+        crawl4ai_version = version("crawl4ai")
+    except Exception:
+        crawl4ai_version = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "crawl4ai": crawl4ai_version,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+
+def compare(results, baseline, tolerance):
+    """Print pages/sec and p95 changes against ``baseline``; returns the number of regressions."""
+    before = {(r["method"], r["concurrency"]): r for r in baseline["results"] if "pages_per_sec" in r}
+    if baseline["settings"] != results["settings"]:
+        print("warning: the baseline was run with different settings")
+    regressions = 0
+    print(f"\n{'method':<18} {'conc':>4}  {'pages/sec':>17}  {'p95 ms':>17}")
+    for result in results["results"]:
+        old = before.get((result["method"], result["concurrency"]))
+        if old is None or "pages_per_sec" not in result:
+            continue
+        change = result["pages_per_sec"] / old["pages_per_sec"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{result['method']:<18} {result['concurrency']:>4}  "
+              f"{old['pages_per_sec']:>6.1f} -> {result['pages_per_sec']:>6.1f}  "
+              f"{old['p95_ms'] or 0:>6.0f} -> {result['p95_ms'] or 0:>6.0f}  {change:+.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--methods", default=",".join(METHODS), help="Comma-separated crawl methods")
+    parser.add_argument("--levels", default="1,4,16", help="Comma-separated concurrency limits")
+    parser.add_argument("--pages", type=int, default=100, help="Pages per case")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the median run is reported")
+    parser.add_argument("--source", default="list", choices=["list", "sitemap"],
+                        help="Hand the crawl a URL list or the server's sitemap index")
+    server = parser.add_argument_group("synthetic server")
+    server.add_argument("--hosts", type=int, default=4, help="Local ports serving the pages")
+    server.add_argument("--size-kb", type=int, default=32, help="Size of each page")
+    server.add_argument("--code-ratio", type=float, default=0.3, help="Share of page sections that are code blocks")
+    server.add_argument("--latency", type=float, default=0.05, help="Seconds before each page is answered")
+    server.add_argument("--jitter", type=float, default=0.02, help="Random +/- seconds added to the latency")
+    server.add_argument("--error-rate", type=float, default=0.0, help="Share of pages answered with a 500")
+    server.add_argument("--sitemap-urls", type=int, default=0,
+                        help="Also time streaming a sitemap index of this many URLs (0 = skip)")
+    server.add_argument("--sitemap-chunk", type=int, default=10000, help="URLs per child sitemap")
+    server.add_argument("--seed", type=int, default=1, help="Decides page content, latency and failures")
+    crawl = parser.add_argument_group("crawler")
+    crawl.add_argument("--profile", default="fast", choices=["thorough", "fast"], help="Run profile for crawl4ai_http")
+    crawl.add_argument("--conversion-workers", type=int, default=DEFAULT_CONVERSION_WORKERS,
+                       help="Markdown conversion processes (0 = in-process)")
+    crawl.add_argument("--retries", type=int, default=0, help="Extra attempts for failed pages")
+    report = parser.add_argument_group("report")
+    report.add_argument("--verbose", action="store_true", help="Show the crawlers' log output")
+    report.add_argument("--json", metavar="FILE", help="Write the results as JSON")
+    report.add_argument("--compare", metavar="FILE", help="Compare with the JSON of an earlier run")
+    report.add_argument("--tolerance", type=float, default=0.10,
+                        help="Loss of pages/sec that counts as a regression (--compare)")
+    args = parser.parse_args()
+
+    settings = {key: getattr(args, key) for key in (
+        "pages", "source", "hosts", "size_kb", "code_ratio", "latency", "jitter", "error_rate", "seed", "profile",
+        "conversion_workers", "retries")}
+    config = dict(settings, sitemap_urls=args.sitemap_urls, sitemap_chunk=args.sitemap_chunk)
+    context = multiprocessing.get_context("spawn")
+    ports, stop = context.Queue(), context.Event()
+    server_process = context.Process(target=serve, args=(config, ports, stop), daemon=True)
+    server_process.start()
+    base_urls = ports.get()
+    results = {"environment": environment(), "settings": settings, "results": []}
+    try:
+        print(f"{os.cpu_count()} CPUs, {args.pages} pages of {args.size_kb} KB on {args.hosts} hosts, "
+              f"latency {args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms, {args.error_rate:.0%} errors")
+        if args.sitemap_urls:
+            total, seconds = time_sitemap(base_urls[0])
+            results["sitemap"] = {"urls": total, "seconds": seconds, "urls_per_sec": total / seconds}
+            print(f"sitemap: {total} URLs in {seconds:.2f} s ({total / seconds:,.0f} URLs/sec)")
+        print(f"{'method':<18} {'conc':>4}  {'pages/sec':>9}  {'p50 ms':>7}  {'p95 ms':>7}  {'p99 ms':>7}  "
+              f"{'cpu s':>6}  {'rss MB':>6}  {'failed':>6}")
+        for method in args.methods.split(","):
+            for level in [int(x) for x in args.levels.split(",")]:
+                case = dict(settings, method=method, concurrency=level)
+                runs = []
+                for _ in range(args.repeat):
+                    channel = context.Queue()
+                    worker = context.Process(target=run_case, args=(case, base_urls, channel, args.verbose))
+                    worker.start()
+                    runs.append(channel.get())
+                    worker.join()
+                failed_runs = [run for run in runs if "error" in run]
+                if failed_runs:
+                    outcome = failed_runs[0]
+                    print(f"{method:<18} {level:>4}  error: {outcome['error']}")
+                else:
+                    outcome = sorted(runs, key=lambda run: run["pages_per_sec"])[len(runs) // 2]
+                    print(f"{method:<18} {level:>4}  {outcome['pages_per_sec']:>9.1f}  "
+                          + "  ".join(f"{outcome[key] or 0:>7.0f}" for key in ("p50_ms", "p95_ms", "p99_ms"))
+                          + f"  {outcome['cpu_seconds']:>6.1f}  {outcome['peak_rss_mb']:>6.0f}  {outcome['failed']:>6}")
+                results["results"].append({"method": method, "concurrency": level, **outcome})
+    finally:
+        stop.set()
+        server_process.join(timeout=5)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            sys.exit(1 if compare(results, json.load(f), args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
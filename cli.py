@@ -0,0 +1,267 @@
+"""Run crawls from the command line, without Streamlit.
+
+Uses the same engine as the web UI (crawler.py) and writes results to disk
+the same way. Progress is printed to stdout as JSON lines: one "url" event
+per finished URL, a "progress" summary every few seconds and a final
+"done" event with the output path; log messages go to stderr.
+
+    python -m cli --urls urls.txt --format jsonl --output-dir results/
+    python -m cli --sitemap https://docs.example.com/sitemap.xml --job-id docs-nightly
+    python -m cli --query "python asyncio tutorial" --results 20
+    python -m cli --follow https://docs.example.com/guide/ --depth 2 --path-prefix /guide/
+    python -m cli --sitemap https://docs.example.com/sitemap.xml --queue /shared/queue.sqlite --seed-only
+    python -m cli --queue /shared/queue.sqlite --output-dir results/$(hostname)/
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from contextlib import nullcontext
+
+from conversion import DEFAULT_CONVERSION_CACHE, DEFAULT_CONVERSION_WORKERS
+from crawler import (DEFAULT_FOLLOW_CONFIG, DEFAULT_HTTP_CONFIG, DEFAULT_JOBS_DB, DEFAULT_QUEUE_CONFIG, CrawlMetrics,
+                     LinkFollower, SitemapSource, WorkQueue, finished_job_output, get_urls_from_google,
+                     iter_sitemap_urls, prepare_crawl, run_crawl, serve_metrics)
+
+
+def emit(event, **fields):
+    """Print one JSON progress line."""
+    print(json.dumps({"event": event, **fields}, default=str), flush=True)
+
+
+class JsonStatusPrinter:
+    """Stands in for the UI's event queue: prints URL status changes as they happen."""
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+
+    def put_nowait(self, url_entry):
+        if not self.quiet and url_entry["status"] != "processing":
+            emit("url", index=url_entry["index"], url=url_entry["url"], status=url_entry["status"])
+
+
+def read_url_file(path):
+    """Yield the URLs in ``path`` ("-" = stdin), skipping blank lines and # comments."""
+    with (nullcontext(sys.stdin) if path == "-" else open(path, encoding="utf-8")) as lines:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def summary(progress_data):
+    return {
+        "processed": progress_data["processed_count"],
+        "total": progress_data["total_urls"],
+        "discovery_done": progress_data["discovery_done"],
+        "successful": progress_data["successful_crawls"],
+        "failed": progress_data["failed_crawls"],
+        "robots_skipped": progress_data["robots_skipped"],
+        "content_skipped": progress_data["content_skipped"],
+        "retries": progress_data["retries"],
+        "in_flight": len(progress_data["current_urls"]),
+        "queued": progress_data["frontier"].qsize(),
+    }
+
+
+async def report_progress(progress_data, interval):
+    started = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        emit("progress", elapsed=round(time.monotonic() - started, 1), **summary(progress_data))
+
+
+async def run(urls, args):
+    http_config = {
+        "max_retries": args.retries,
+        "respect_robots": not args.no_robots,
+        "robots_sitemaps": args.robots_sitemaps,
+        "cache_dir": args.cache_dir,
+        "max_body_mb": args.max_body_mb,
+        "head_probe": args.head_probe,
+        "non_html": args.non_html,
+    }
+    output_config = {"format": args.format, "directory": args.output_dir, "shard_size": args.shard_size}
+    metrics = CrawlMetrics(args.trace, args.metrics_file) \
+        if args.trace or args.metrics_file or args.metrics_port else None
+    metrics_server = serve_metrics(metrics, args.metrics_port) if args.metrics_port else None
+    progress_data = prepare_crawl(
+        urls, wait_time=args.wait, concurrency_limit=args.concurrency, crawl_method=args.method,
+        http_config=http_config, crawl4ai_profile=args.profile, conversion_workers=args.conversion_workers,
+        output_config=output_config, conversion_cache_path="" if args.no_markdown_reuse else DEFAULT_CONVERSION_CACHE,
+        job_id=args.job_id, processes=args.processes, metrics=metrics, jobs_db=args.jobs_db)
+    progress_data["timeout"] = args.timeout
+    progress_data["events"] = JsonStatusPrinter(args.quiet)
+    if progress_data["journal"] is not None and progress_data["journal"].resumed:
+        emit("resumed", job_id=args.job_id, processed=progress_data["processed_count"])
+
+    started = time.monotonic()
+    reporter = asyncio.create_task(report_progress(progress_data, args.progress_interval)) \
+        if args.progress_interval > 0 else None
+    try:
+        output_path = await run_crawl(progress_data)
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+    extra = {"queue": await urls.counts()} if isinstance(urls, WorkQueue) else {}
+    if metrics is not None:
+        extra["stages"] = metrics.summary()
+        extra["charsets"] = metrics.charsets
+    emit("done", output=output_path, elapsed=round(time.monotonic() - started, 1),
+         discovery_error=progress_data.get("discovery_error"), **summary(progress_data),
+         connections=progress_data["connection_stats"], **extra)
+    failed_outright = progress_data["failed_crawls"] and not progress_data["successful_crawls"]
+    return 1 if progress_data.get("discovery_error") or failed_outright else 0
+
+
+async def seed_queue(queue, urls):
+    """Add ``urls`` to the work queue and seal it; False if reading them failed."""
+    try:
+        added = await queue.seed(urls)
+    except Exception as e:
+        logging.warning(f"Seeding the work queue stopped early: {e}")
+        emit("seeded", queue=queue.name, error=str(e))
+        return False
+    emit("seeded", queue=queue.name, added=added, **await queue.counts())
+    return True
+
+
+async def run_queue(urls, args):
+    """Seed the work queue from ``urls`` (if given) while crawling it, unless --seed-only."""
+    queue = WorkQueue(args.queue, args.queue_name, queue_config={"lease_seconds": args.lease_seconds})
+    try:
+        if args.seed_only:
+            return 0 if await seed_queue(queue, urls) else 1
+        seeding = asyncio.create_task(seed_queue(queue, urls)) if urls is not None else None
+        status = await run(queue, args)
+        if seeding is not None and not await seeding:
+            status = 1
+        return status
+    finally:
+        queue.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m cli", description="Crawl web pages to markdown or JSONL without the web UI.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--urls", metavar="FILE", help='File with one URL per line ("-" reads stdin)')
+    source.add_argument("--sitemap", metavar="URL", help="Sitemap or sitemap index to crawl (.xml or .xml.gz)")
+    source.add_argument("--query", help="Google search whose results are crawled")
+    source.add_argument("--follow", metavar="URL", help="Start page of a link-following crawl")
+
+    crawl = parser.add_argument_group("crawling")
+    crawl.add_argument("--method", default="hybrid",
+                       choices=["hybrid", "requests_only", "crawl4ai_http", "crawl4ai_raw_html"])
+    crawl.add_argument("--profile", default="thorough", choices=["thorough", "fast"],
+                       help="Run profile for crawl4ai_http")
+    crawl.add_argument("--concurrency", type=int, default=5, help="URLs processed at once")
+    crawl.add_argument("--wait", type=float, default=None,
+                       help=f"Average seconds between requests to one host, after a burst of up to "
+                            f"{DEFAULT_HTTP_CONFIG['host_burst']} (default {1 / DEFAULT_HTTP_CONFIG['host_rps']:g})")
+    crawl.add_argument("--timeout", type=float, default=30, help="Request timeout in seconds")
+    crawl.add_argument("--retries", type=int, default=DEFAULT_HTTP_CONFIG["max_retries"],
+                       help="Extra attempts for transient failures")
+    crawl.add_argument("--no-robots", action="store_true", help="Ignore robots.txt")
+    crawl.add_argument("--robots-sitemaps", action="store_true",
+                       help="Also crawl the sitemaps listed in robots.txt")
+    crawl.add_argument("--cache-dir", default="", help="On-disk HTTP cache (default: none)")
+    crawl.add_argument("--max-body-mb", type=float, default=DEFAULT_HTTP_CONFIG["max_body_mb"],
+                       help="Skip responses larger than this (0 = no limit)")
+    crawl.add_argument("--head-probe", action="store_true",
+                       help="Check type and size with a HEAD request before each download")
+    crawl.add_argument("--non-html", default=DEFAULT_HTTP_CONFIG["non_html"], choices=["text", "skip"],
+                       help="Plain text, JSON and CSV: keep as text or skip like other non-HTML files")
+    crawl.add_argument("--conversion-workers", type=int, default=DEFAULT_CONVERSION_WORKERS,
+                       help="Markdown conversion processes (0 = in-process)")
+    crawl.add_argument("--processes", type=int, default=1,
+                       help="Shard the crawl by host over this many processes (ignores --conversion-workers)")
+    crawl.add_argument("--no-markdown-reuse", action="store_true",
+                       help="Convert every page even if identical HTML was converted before")
+    crawl.add_argument("--results", type=int, default=10, help="Search results to crawl (--query)")
+    crawl.add_argument("--depth", type=int, default=DEFAULT_FOLLOW_CONFIG["max_depth"],
+                       help="Links to follow away from the start page (--follow)")
+    crawl.add_argument("--max-pages", type=int, default=DEFAULT_FOLLOW_CONFIG["max_pages"],
+                       help="Pages to queue at most, 0 = no limit (--follow)")
+    crawl.add_argument("--path-prefix", default="", help="Only follow links under this path (--follow)")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--format", default="markdown", choices=["markdown", "jsonl"])
+    output.add_argument("--output-dir", default="", help="Where results go (default: a new temporary directory)")
+    output.add_argument("--shard-size", type=int, default=0, help="Pages per output file, 0 = one file")
+    output.add_argument("--job-id", default="",
+                        help="Make the crawl resumable; rerun with the same ID to continue where it stopped")
+    output.add_argument("--jobs-db", metavar="DB", default=DEFAULT_JOBS_DB,
+                        help="SQLite file that journals the --job-id crawls (default %(default)s)")
+    output.add_argument("--progress-interval", type=float, default=5,
+                        help="Seconds between progress lines, 0 = none")
+    output.add_argument("--quiet", action="store_true", help="No per-URL lines")
+
+    timing = parser.add_argument_group(
+        "stage timing", "Time DNS, connect, TTFB, download, decoding, conversion and writing for every URL; "
+                        'the "done" line then summarises them.')
+    timing.add_argument("--trace", metavar="FILE", default="", help="Append one JSON line of timings per URL")
+    timing.add_argument("--metrics-file", metavar="FILE", default="",
+                        help="Keep Prometheus-format histograms in this file (e.g. for node_exporter)")
+    timing.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve the histograms at http://127.0.0.1:PORT/metrics during the crawl")
+
+    shared = parser.add_argument_group(
+        "work queue", "Several instances, on one machine or many, can crawl one queue file on shared storage. "
+                      "With a URL source the queue is seeded from it as well.")
+    shared.add_argument("--queue", metavar="DB", default="", help="SQLite work queue to seed and crawl")
+    shared.add_argument("--queue-name", default="default", help="Queue within the file")
+    shared.add_argument("--lease-seconds", type=float, default=DEFAULT_QUEUE_CONFIG["lease_seconds"],
+                        help="How long a crashed instance's URLs stay reserved before others take them")
+    shared.add_argument("--seed-only", action="store_true", help="Only add the URL source to the queue")
+    args = parser.parse_args(argv)
+    if not args.queue and not (args.urls or args.sitemap or args.query or args.follow):
+        parser.error("one of the arguments --urls --sitemap --query --follow is required")
+    if args.queue and (args.follow or args.job_id):
+        parser.error("--queue can't be combined with --follow or --job-id")
+    if args.seed_only and not (args.queue and (args.urls or args.sitemap or args.query)):
+        parser.error("--seed-only needs --queue and one of --urls --sitemap --query")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s", stream=sys.stderr)
+
+    if args.job_id:
+        output_path = finished_job_output(args.job_id, args.jobs_db)
+        if output_path:
+            emit("done", output=output_path, job_id=args.job_id, already_finished=True)
+            return 0
+
+    urls = None
+    if args.urls:
+        urls = read_url_file(args.urls)
+    elif args.sitemap:
+        # The work queue only stores URLs; a direct crawl keeps lastmod/priority in the results
+        urls = iter_sitemap_urls(args.sitemap) if args.queue else SitemapSource(args.sitemap)
+    elif args.query:
+        urls = get_urls_from_google(args.query, num_results=args.results)
+        emit("search", query=args.query, results=len(urls))
+        if not urls:
+            return 1
+    elif args.follow:
+        urls = LinkFollower([args.follow], {
+            "max_depth": args.depth, "max_pages": args.max_pages, "path_prefix": args.path_prefix})
+
+    try:
+        if args.queue:
+            return asyncio.run(run_queue(urls, args))
+        return asyncio.run(run(urls, args))
+    except KeyboardInterrupt:
+        if args.job_id:
+            logging.warning(f"Interrupted; run again with --job-id {args.job_id} to resume")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
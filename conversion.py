@@ -0,0 +1,237 @@
+"""HTML to markdown conversion shared by the app and its worker processes.
+
+This module deliberately avoids importing Streamlit so ProcessPoolExecutor
+workers can load it without side effects.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib.metadata import PackageNotFoundError, version
+
+# Default number of markdown conversion processes (0 converts in-process)
+DEFAULT_CONVERSION_WORKERS = min(4, os.cpu_count() or 1)
+
+# Markdown generator settings; any change here also changes
+# generator_fingerprint(), so cached conversions are not reused across it
+PRUNING_FILTER_OPTIONS = {
+    "threshold": 0.2,  # Same threshold as Google Colab
+    "threshold_type": "fixed"
+}
+MARKDOWN_OPTIONS = {
+    "ignore_links": False,      # Keep links for better context
+    "body_width": 0,            # No line wrapping
+    "skip_internal_links": True,  # Skip navigation links
+    "include_sup_sub": True,    # Better handling of superscript/subscript
+    "escape_html": False,       # Don't escape HTML entities
+    "mark_code": True           # Better code block handling
+}
+
+# Suggested location for the persistent conversion cache
+DEFAULT_CONVERSION_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "web-crawler", "markdown.sqlite3")
+
+# Generator built once per worker process by init_worker()
+_worker_generator = None
+
+
+def create_markdown_generator():
+    """Create the markdown generator used by every crawl method."""
+    # Imported on first use: Crawl4AI takes longer to import than everything else
+    from crawl4ai import DefaultMarkdownGenerator
+    from crawl4ai.content_filter_strategy import PruningContentFilter
+
+    # Configure markdown generator with the same settings as Google Colab
+    return DefaultMarkdownGenerator(
+        # Use PruningContentFilter with threshold=0.2 to match Google Colab
+        content_filter=PruningContentFilter(**PRUNING_FILTER_OPTIONS),
+        options=dict(MARKDOWN_OPTIONS)
+    )
+
+
+def generator_fingerprint(extraction_config=None):
+    """Hash of everything besides the HTML that shapes the markdown output.
+
+    Covers the generator and filter settings, the crawl4ai version and the
+    extraction config. The page URL is deliberately left out: the output
+    does not depend on it, so identical pages under several URLs share one
+    cache entry.
+    """
+    try:
+        crawl4ai_version = version("crawl4ai")
+    except PackageNotFoundError:
+        crawl4ai_version = "unknown"
+    settings = {
+        "filter": PRUNING_FILTER_OPTIONS,
+        "markdown": MARKDOWN_OPTIONS,
+        "crawl4ai": crawl4ai_version,
+        "extraction": extraction_config or {}
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ConversionCache:
+    """Content-addressed store of markdown conversions in SQLite.
+
+    Keys are sha256(HTML) combined with generator_fingerprint(), so an
+    unchanged page is never converted twice, whatever URL it came from and
+    across runs. Lookups and stores happen in the main process; the worker
+    processes only ever see cache misses.
+
+    From the event loop use ``lookup()`` and ``store()``. Lookups run on a
+    reader thread; stores are queued and committed in batches by a writer
+    thread with its own connection. So a cache file locked by another
+    crawl never stalls downloads; a batch that can't be written is dropped
+    with a warning, which only costs its reuse.
+    """
+
+    def __init__(self, path):
+        path = os.path.expanduser(path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversions ("
+            "key TEXT PRIMARY KEY, markdown TEXT NOT NULL, created_at REAL NOT NULL)")
+        # Writes have a connection of their own, so lookups never wait behind a locked write
+        self._write_lock = threading.Lock()
+        self._write_db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._write_db.execute("PRAGMA synchronous=NORMAL")
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversion-cache")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversion-cache-write")
+        self._pending = {}  # key -> markdown queued for the writer
+        self._pending_lock = threading.Lock()
+        self._flush_queued = False
+        self._fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, html_bytes, extraction_config=None):
+        """Cache key for UTF-8 ``html_bytes`` converted under ``extraction_config``."""
+        config_key = json.dumps(extraction_config or {}, sort_keys=True, default=str)
+        if config_key not in self._fingerprints:
+            self._fingerprints[config_key] = generator_fingerprint(extraction_config)
+        return hashlib.sha256(html_bytes).hexdigest() + ":" + self._fingerprints[config_key]
+
+    def get(self, key):
+        """Return the cached markdown for ``key``, or None."""
+        with self._pending_lock:
+            markdown = self._pending.get(key)
+        if markdown is None:
+            with self._lock:
+                row = self._db.execute("SELECT markdown FROM conversions WHERE key = ?", (key,)).fetchone()
+            markdown = row[0] if row is not None else None
+        if markdown is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return markdown
+
+    def put(self, key, markdown):
+        """Remember the markdown produced for ``key``."""
+        self._write({key: markdown})
+
+    def _write(self, entries):
+        now = time.time()
+        with self._write_lock:
+            self._write_db.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_db.executemany(
+                    "INSERT OR REPLACE INTO conversions (key, markdown, created_at) VALUES (?, ?, ?)",
+                    [(key, markdown, now) for key, markdown in entries.items()])
+                self._write_db.execute("COMMIT")
+            except BaseException:
+                self._write_db.execute("ROLLBACK")
+                raise
+
+    async def lookup(self, key):
+        """get() on the reader thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._reader, self.get, key)
+
+    def store(self, key, markdown):
+        """Queue ``markdown`` for the writer thread; returns at once."""
+        with self._pending_lock:
+            self._pending[key] = markdown
+            if self._flush_queued:
+                return
+            self._flush_queued = True
+        self._writer.submit(self._flush)
+
+    def _flush(self):
+        # Everything queued while the previous batch was being written goes in one transaction
+        with self._pending_lock:
+            entries = dict(self._pending)
+            self._flush_queued = False
+        try:
+            self._write(entries)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not store {len(entries)} conversions in the markdown cache: {e}")
+        with self._pending_lock:
+            for key in entries:
+                if self._pending.get(key) is entries[key]:
+                    del self._pending[key]
+
+    def stats(self):
+        """Hit and miss counts for this process."""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """Write what is still queued, then close."""
+        self._reader.shutdown()
+        self._writer.shutdown()
+        with self._lock:
+            self._db.close()
+        with self._write_lock:
+            self._write_db.close()
+
+
+def html_to_markdown(markdown_generator, html_content, url):
+    """Convert HTML to cleaned markdown with the given generator."""
+    # Generate markdown directly from raw HTML
+    markdown_result = markdown_generator.generate_markdown(
+        cleaned_html=html_content,  # Pass the raw HTML directly
+        html=html_content,          # Pass the raw HTML directly
+        url=url
+    )
+
+    # Try to use fit_markdown if it's available, otherwise use raw_markdown
+    if hasattr(markdown_result, 'fit_markdown') and markdown_result.fit_markdown:
+        markdown_content = markdown_result.fit_markdown
+    else:
+        markdown_content = markdown_result.raw_markdown
+
+    # Clean up line number markers from the markdown
+    cleaned_markdown = re.sub(
+        r'\[\]\(#__codelineno-\d+-\d+\)', '', markdown_content)
+
+    # Only remove null bytes which could break file writing
+    return cleaned_markdown.replace('\x00', '')
+
+
+def init_worker():
+    """Process pool initializer: build the markdown generator once."""
+    global _worker_generator
+    _worker_generator = create_markdown_generator()
+
+
+def convert_in_worker(html_bytes, url):
+    """Process pool task: UTF-8 HTML bytes in, markdown out."""
+    if _worker_generator is None:
+        init_worker()
+    return html_to_markdown(_worker_generator, html_bytes.decode('utf-8', errors='replace'), url)
+
+
+def create_conversion_pool(workers=DEFAULT_CONVERSION_WORKERS):
+    """Create the process pool for markdown conversion, or None for in-process."""
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
@@ -0,0 +1,4063 @@
+"""Crawl engine: fetching, politeness, scheduling and result output.
+
+Nothing here imports Streamlit, so crawls can run headless (see cli.py) as
+well as behind the web UI in app.py.
+"""
+import asyncio
+import bisect
+import codecs
+import contextvars
+import json
+import random
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
+import hashlib
+import shutil
+import signal
+import socket
+import zipfile
+import zlib
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import heapq
+import itertools
+import multiprocessing
+import os
+from pathlib import Path
+import queue
+import time
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, closing, contextmanager, nullcontext
+from urllib.parse import urljoin, urlparse, urlsplit
+from collections import OrderedDict, deque
+import logging
+import math
+import lxml.etree
+import lxml.html
+
+
+from conversion import (DEFAULT_CONVERSION_WORKERS, ConversionCache, convert_in_worker, create_conversion_pool,
+                        create_markdown_generator, html_to_markdown)
+
+# List of realistic user agents to rotate
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15"
+]
+
+# Elements clean_html removes (unless they contain code): tags by name, and any
+# tag whose class or id contains one of the terms
+PRUNE_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'iframe', 'noscript', 'header', 'aside'])
+PRUNE_TERMS = ['nav', 'menu', 'sidebar', 'footer', 'header', 'banner', 'ad', 'cookie', 'popup', 'social']
+_PRUNE_TERM_RE = re.compile('|'.join(re.escape(term) for term in PRUNE_TERMS))
+CODE_TAGS = frozenset(['pre', 'code'])
+
+# Number of recently started URLs kept for the progress list
+RECENT_URLS_SHOWN = 50
+
+# Where and how crawl results are written (see ResultSink)
+DEFAULT_OUTPUT_CONFIG = {
+    "format": "markdown",  # "markdown" or "jsonl"
+    "directory": "",       # Empty = a fresh temporary directory per crawl
+    "shard_size": 0,       # Pages per file; 0 keeps everything in one file
+    "fsync_every": 50      # Pages written between fsyncs
+}
+
+# Resumable crawl jobs (see CrawlJournal): where they are stored and how
+# often their progress is committed
+DEFAULT_JOBS_DB = str(Path.home() / ".cache" / "web-crawler" / "jobs.sqlite")
+JOURNAL_BATCH_SIZE = 100
+JOURNAL_BATCH_SECONDS = 2.0
+
+# Crawls fed from a WorkQueue shared by several crawler instances
+DEFAULT_QUEUE_CONFIG = {
+    "lease_seconds": 300,  # How long leased URLs stay reserved; renewed while their worker runs
+    "batch_size": 20,      # URLs leased at a time
+    "max_attempts": 3,     # Leases a URL may lose to dead workers before it counts as an error
+    "poll_seconds": 5      # Pause between checks while other workers hold the remaining URLs
+}
+
+# Per-URL stage timings (see CrawlMetrics): histogram bucket bounds in seconds,
+# and how often the Prometheus file is rewritten during a crawl
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_WRITE_SECONDS = 5.0
+
+# Connection pooling defaults for the crawl-scoped HTTP client
+DEFAULT_HTTP_CONFIG = {
+    "max_connections": 100,          # Total open connections across all hosts
+    "max_connections_per_host": 10,  # Open connections to any single host
+    "max_hosts": 50,                 # Per-host pools kept alive by requests
+    "dns_cache_ttl": 300,            # Seconds to cache DNS answers (aiohttp)
+    "keepalive_timeout": 30,         # Seconds an idle connection stays open
+    "cache_dir": "",                 # On-disk HTTP cache; empty disables it
+    "cache_max_mb": 512,             # Least recently used entries go beyond this
+    "host_rps": 2.0,                 # Sustained requests per second to one host (0 = no limit)
+    "host_burst": 5,                 # Requests a host may receive back to back
+    "retry_after_default": 30,       # Pause (s) after 429/503 without a Retry-After
+    "retry_after_max": 600,          # Longest pause (s) a Retry-After may ask for
+    "max_retries": 2,                # Extra attempts for a URL that failed transiently
+    "retry_backoff": 1.0,            # First retry delay (s); doubles per attempt, jittered
+    "retry_backoff_max": 60,         # Longest delay (s) between attempts
+    "breaker_threshold": 5,          # Consecutive transient failures that open a host's circuit
+    "breaker_cooldown": 30,          # Seconds an open circuit fast-fails before probing again
+    "respect_robots": True,          # Drop URLs that robots.txt disallows
+    "robots_user_agent": "*",        # Product token whose robots.txt group applies
+    "robots_cache_dir": str(Path.home() / ".cache" / "web-crawler" / "robots"),  # Empty = per crawl only
+    "robots_ttl": 86400,             # Seconds a cached robots.txt stays valid across runs
+    "robots_sitemaps": False,        # Also crawl the sitemaps robots.txt lists
+    "max_body_mb": 20,               # Downloads are abandoned past this size (0 = no limit)
+    "head_probe": False,             # Send a HEAD first; skip non-HTML or oversized URLs without a GET
+    "non_html": "text"               # Plain text/JSON/CSV: "text" = keep as Markdown, "skip" = drop them
+}
+
+# Content types kept as text (besides text/*) when non_html is "text"; everything
+# else that isn't HTML or XML is skipped before its body is downloaded
+TEXT_CONTENT_TYPES = frozenset(["application/json", "application/x-ndjson", "application/javascript",
+                                "application/x-yaml", "application/yaml", "application/toml"])
+
+# Charset detection (see decode_body): bytes searched for a <meta charset> or
+# XML encoding declaration, and bytes the statistical detector looks at
+CHARSET_SNIFF_BYTES = 4096
+CHARSET_DETECT_BYTES = 65536
+CHARSET_SOURCES = ("header", "bom", "meta", "utf-8", "detected", "default")
+
+# Responses that make the crawler back off from the host that sent them
+RETRY_AFTER_STATUSES = (429, 503)
+
+# Status codes worth another attempt; other HTTP errors are final
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+# Exceptions that mean "try again later" rather than "this URL is broken"
+# (plus aiohttp's connection and payload errors, see is_retryable)
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError, ConnectionError,
+                        TimeoutError)
+
+# URLs buffered ahead of the workers so busy hosts don't hold up idle ones
+FRONTIER_MAX_BUFFERED = 1000
+
+# Sharded crawls (see ShardPool): URLs and results travel between processes in
+# batches of up to SHARD_BATCH_SIZE, sent at least every SHARD_FLUSH_SECONDS
+SHARD_BATCH_SIZE = 64
+SHARD_FLUSH_SECONDS = 0.05
+
+# Link-following crawls (see LinkFollower)
+DEFAULT_FOLLOW_CONFIG = {
+    "max_depth": 2,              # Links followed away from the start URL (0 = start page only)
+    "max_pages": 500,            # URLs queued in total; 0 = no limit
+    "domains": [],               # Hosts (with subdomains) to stay on; empty = the start URL's
+    "path_prefix": "",           # Only follow links whose path starts with this
+    "seen_capacity": 5_000_000,  # Distinct URLs the seen-set is sized for (~9 MB)
+    "seen_error_rate": 0.001,    # Chance a new URL is mistaken for a seen one, at capacity
+    "queue_in_memory": 100_000   # Pending URLs kept in memory; the rest wait in a temp file
+}
+
+# Query parameters that only record where a click came from (plus any utm_*)
+TRACKING_PARAMS = frozenset(["gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "igshid", "twclid",
+                             "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "oly_anon_id",
+                             "oly_enc_id", "vero_id", "wickedid", "s_cid"])
+
+# Links to files with these extensions are not followed
+SKIP_LINK_EXTENSIONS = frozenset(["pdf", "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "tar", "exe", "dmg", "msi",
+                                  "deb", "rpm", "apk", "iso", "jpg", "jpeg", "png", "gif", "webp", "svg", "ico",
+                                  "bmp", "tif", "tiff", "mp3", "mp4", "m4a", "wav", "ogg", "webm", "avi", "mov",
+                                  "mkv", "woff", "woff2", "ttf", "otf", "eot", "css", "js", "json", "xml", "rss",
+                                  "csv", "xls", "xlsx", "doc", "docx", "ppt", "pptx"])
+
+# Suggested location for the HTTP cache when it is enabled in the UI
+DEFAULT_CACHE_DIR = str(Path.home() / ".cache" / "web-crawler" / "http")
+
+def get_urls_from_google(query, num_results=10):
+    """Get URLs from Google search results."""
+    from googlesearch import search  # only search-query crawls need it
+
+    return [result for result in search(query, num_results=num_results, advanced=False)]
+
+
+def is_valid_url(url):
+    """Check if URL starts with a valid scheme."""
+    return url.startswith(("http://", "https://", "file://", "raw:"))
+
+
+class _HeadMetadataParser(HTMLParser):
+    """Streaming parser that collects <title> and meta descriptions from <head>."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.description = None
+        self.og_description = None
+        self.done = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title' and self.title is None:
+            self._title_parts = []
+        elif tag == 'meta':
+            attrs = dict(attrs)
+            content = attrs.get('content')
+            if attrs.get('name') == 'description' and self.description is None:
+                self.description = content
+            elif attrs.get('property') == 'og:description' and self.og_description is None:
+                self.og_description = content
+        elif tag == 'body':
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts)
+            self._title_parts = None
+        elif tag == 'head':
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+
+def scan_head_metadata(html_content, chunk_size=2048):
+    """Read title and description from the document head without a full parse.
+
+    The HTML is fed to a streaming parser in chunks and scanning stops at
+    ``</head>`` (or ``<body>``), so cost no longer grows with page size.
+    """
+    parser = _HeadMetadataParser()
+    try:
+        for start in range(0, len(html_content), chunk_size):
+            parser.feed(html_content[start:start + chunk_size])
+            if parser.done:
+                break
+        if parser.title is None and parser._title_parts:
+            # Unterminated <title>
+            parser.title = ''.join(parser._title_parts)
+    except Exception as e:
+        logging.warning(f"Head metadata scan failed: {e}")
+    return parser
+
+
+def parse_html(html_content):
+    """Parse HTML once with the fastest available tree builder.
+
+    The returned soup can be shared by extract_metadata, clean_html and
+    extract_code_from_pre instead of each re-parsing the page.
+    """
+    from bs4 import BeautifulSoup, FeatureNotFound
+
+    try:
+        return BeautifulSoup(html_content, 'lxml')
+    except FeatureNotFound:
+        return BeautifulSoup(html_content, 'html.parser')
+
+
+def extract_metadata(source):
+    """Extract metadata from HTML text or an already parsed soup.
+
+    Raw HTML goes through the head-only scan; a soup is searched directly.
+    """
+    metadata = {}
+
+    if isinstance(source, str):
+        head = scan_head_metadata(source)
+        title = head.title
+        description = head.description or head.og_description
+    else:
+        title_tag = source.find('title')
+        title = title_tag.text if title_tag else None
+        description_tag = source.find('meta', attrs={'name': 'description'}) or source.find(
+            'meta', attrs={'property': 'og:description'})
+        description = description_tag.get('content') if description_tag else None
+
+    # Extract title
+    if title is not None:
+        metadata['title'] = title.strip()
+    else:
+        metadata['title'] = "No title"
+
+    # Extract description
+    if description:
+        metadata['description'] = description.strip()
+    else:
+        metadata['description'] = "No description available"
+
+    return metadata
+
+
+def extract_code_from_pre(code_html):
+    """Extract formatted code from HTML pre/code tags with language detection.
+
+    Accepts an HTML string or an element from an already parsed soup.
+    """
+    soup = parse_html(code_html) if isinstance(code_html, str) else code_html
+
+    # Try to find the language from class attributes
+    language = ""
+    code_tag = soup if soup.name == 'code' else soup.find('code')
+    pre_tag = soup if soup.name == 'pre' else soup.find('pre')
+
+    # Check code tag classes first
+    if code_tag and code_tag.has_attr('class'):
+        for cls in code_tag.get('class', []):
+            if cls.startswith(('language-', 'lang-', 'brush:', 'syntax-')):
+                parts = cls.split('-') if '-' in cls else cls.split(':')
+                if len(parts) > 1:
+                    language = parts[1].strip()
+                    break
+
+    # If no language found, check pre tag
+    if not language and pre_tag and pre_tag.has_attr('class'):
+        for cls in pre_tag.get('class', []):
+            if cls.startswith(('language-', 'lang-', 'brush:', 'syntax-')):
+                parts = cls.split('-') if '-' in cls else cls.split(':')
+                if len(parts) > 1:
+                    language = parts[1].strip()
+                    break
+
+    # Extract the code text, preferring the code tag if it exists
+    if code_tag:
+        code_text = code_tag.get_text()
+    elif pre_tag:
+        code_text = pre_tag.get_text()
+    else:
+        code_text = soup.get_text()
+
+    # Clean up the code text
+    code_text = code_text.strip()
+
+    return language, code_text
+
+
+def _matches_prune_rules(element):
+    """Check an element against every tag, class and id pruning rule at once."""
+    if element.name in PRUNE_TAGS:
+        return True
+    classes = element.get('class')
+    if classes:
+        if isinstance(classes, list):
+            classes = ' '.join(classes)
+        if _PRUNE_TERM_RE.search(classes.lower()):
+            return True
+    element_id = element.get('id')
+    return bool(element_id) and _PRUNE_TERM_RE.search(element_id.lower()) is not None
+
+
+def prune_soup(soup):
+    """Remove boilerplate elements from a soup in a single traversal.
+
+    An element is removed when it matches a pruning rule and has no
+    <pre>/<code> descendant. "Contains code" is propagated bottom-up while
+    walking the elements in reverse document order, and only the outermost
+    matches are decomposed.
+    """
+    from bs4 import Tag
+
+    elements = [el for el in soup.descendants if isinstance(el, Tag)]
+    contains_code = set()
+    prunable = []
+    for element in reversed(elements):
+        has_code = id(element) in contains_code
+        if not has_code and _matches_prune_rules(element):
+            prunable.append(element)
+        if has_code or element.name in CODE_TAGS:
+            contains_code.add(id(element.parent))
+
+    # Document order, so an ancestor goes before (and takes) its descendants
+    for element in reversed(prunable):
+        if not element.decomposed:
+            element.decompose()
+    return soup
+
+
+def clean_html(html_content):
+    """Clean HTML content using BeautifulSoup.
+
+    Accepts an HTML string or a soup from parse_html(); a soup is cleaned in
+    place so the caller can keep using the same tree. Elements whose tag,
+    class or id marks them as navigation/boilerplate are removed unless they
+    contain code blocks.
+    """
+    soup = parse_html(html_content) if isinstance(html_content, str) else html_content
+    return str(prune_soup(soup))
+
+
+async def process_with_crawl4ai(html_content, url, extraction_config=None, conversion_pool=None, conversion_cache=None):
+    """Process HTML content using Crawl4AI's markdown generator.
+
+    The conversion is CPU-bound, so with a ``conversion_pool`` it runs in a
+    worker process and the event loop keeps serving downloads meanwhile.
+    With a ``conversion_cache``, HTML that has been converted before (under
+    any URL, in any run) is answered from the cache without converting. The
+    cache is read and written off the event loop (see ConversionCache), and
+    a locked or broken cache file only costs the reuse.
+    """
+    if extraction_config is None:
+        extraction_config = {
+            "prioritize_code_blocks": True,
+            "content_type": "Technical Documentation",
+            "extract_full_page": True,
+            "custom_selectors": []
+        }
+
+    try:
+        html_bytes = html_content.encode('utf-8', errors='replace')
+        cache_key = None
+        if conversion_cache is not None:
+            cache_key = conversion_cache.key(html_bytes, extraction_config)
+            try:
+                cached_markdown = await conversion_cache.lookup(cache_key)
+            except sqlite3.Error as e:
+                logging.warning(f"Markdown cache lookup failed for {url}: {e}")
+                cached_markdown = None
+            if cached_markdown is not None:
+                return cached_markdown
+
+        with stage("convert"):
+            if conversion_pool is not None:
+                loop = asyncio.get_running_loop()
+                markdown_content = await loop.run_in_executor(
+                    conversion_pool, convert_in_worker, html_bytes, url)
+            else:
+                markdown_content = html_to_markdown(create_markdown_generator(), html_content, url)
+
+        if cache_key is not None:
+            conversion_cache.store(cache_key, markdown_content)
+        return markdown_content
+
+    except Exception as e:
+        return f"Error generating markdown with Crawl4AI: {str(e)}"
+
+
+class SkippedContent(Exception):
+    """A response the crawler won't convert: not HTML, XML or text, or over the size limit."""
+
+
+def content_kind(content_type):
+    """Classify a Content-Type header as "html" (HTML, XML or none given), "text" or "other"."""
+    mime = (content_type or "").split(";", 1)[0].strip().lower()
+    if mime.startswith(("image/", "audio/", "video/", "font/")):
+        return "other"
+    if not mime or mime in ("text/html", "text/xml", "application/xml") or mime.endswith("+xml"):
+        return "html"
+    if mime.startswith("text/") or mime in TEXT_CONTENT_TYPES or mime.endswith("+json"):
+        return "text"
+    return "other"
+
+
+def check_content(content_type, content_length=None, max_bytes=0, accept_text=True):
+    """Raise SkippedContent unless a response with these headers is worth downloading.
+
+    ``accept_text`` lets plain text, JSON and the like through as well as
+    HTML and XML; ``max_bytes`` (0 = no limit) is checked against the
+    declared Content-Length. Returns the content_kind.
+    """
+    kind = content_kind(content_type)
+    if kind == "other" or (kind == "text" and not accept_text):
+        raise SkippedContent(f"Skipped: {content_type} is not HTML")
+    if max_bytes and str(content_length or "").isdigit() and int(content_length) > max_bytes:
+        raise SkippedContent(f"Skipped: {content_length} bytes is over the {max_bytes / 1048576:g} MB limit")
+    return kind
+
+
+def text_to_markdown(text, content_type):
+    """Markdown for a text body that isn't HTML: plain text and Markdown as they are, the rest fenced."""
+    mime = (content_type or "").split(";", 1)[0].strip().lower()
+    if mime in ("text/plain", "text/markdown", "text/x-markdown"):
+        return text
+    language = mime.rsplit("/", 1)[-1].rsplit("+", 1)[-1].removeprefix("x-")
+    return f"```{language}\n{text}\n```"
+
+
+async def convert_content(content, content_type, url, extraction_config=None, conversion_pool=None,
+                          conversion_cache=None):
+    """Markdown for a fetched body: HTML and XML go through Crawl4AI, other text through text_to_markdown."""
+    if content_kind(content_type) == "text":
+        return text_to_markdown(content, content_type)
+    return await process_with_crawl4ai(content, url, extraction_config, conversion_pool, conversion_cache)
+
+
+async def fetch_url(url, timeout=30, use_crawl4ai=True, use_requests=True, extraction_config=None, http_client=None, conversion_pool=None, conversion_cache=None):
+    """
+    Fetch URL content using the best method for the situation.
+
+    This hybrid approach:
+    1. First tries to fetch content with requests (bypasses proxy auth)
+    2. Processes the content with Crawl4AI for high-quality markdown extraction
+    3. Falls back to aiohttp if requests fails
+
+    Both fetches go through ``http_client`` when given, so connections and
+    DNS answers are reused across URLs; the requests fetch never blocks the
+    event loop. Responses that aren't HTML, XML or text, or that outgrow the
+    client's size limit, are skipped rather than retried with aiohttp.
+    """
+    try:
+        html_content = None
+        status_code = None
+        headers = {}
+
+        # First attempt: Use requests to bypass proxy auth
+        if use_requests:
+            try:
+                html_content, content_type = await fetch_with_requests_async(
+                    url, timeout, http_client=http_client)
+                status_code = 200  # Assume 200 as we don't get actual status code
+                headers = {'Content-Type': content_type}
+            except requests.HTTPError as e:
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code in RETRY_AFTER_STATUSES:
+                    # The host asked us to back off; don't hit it again via aiohttp
+                    return {
+                        'success': False,
+                        'status_code': status_code,
+                        'url': url,
+                        'error_message': str(e)
+                    }
+                logging.warning(f"Requests fetch failed: {str(e)}")
+                html_content = None
+            except SkippedContent as e:
+                return {
+                    'success': False,
+                    'url': url,
+                    'error_message': str(e),
+                    'exception': e
+                }
+            except Exception as e:
+                logging.warning(f"Requests fetch failed: {str(e)}")
+                html_content = None
+
+        # Second attempt: Use aiohttp if requests fails
+        if not html_content:
+            headers = {
+                'User-Agent': random.choice(USER_AGENTS),
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.5',
+                'Connection': 'keep-alive',
+                'Upgrade-Insecure-Requests': '1',
+                'Cache-Control': 'max-age=0'
+            }
+
+            if http_client is not None:
+                html_content, status_code, headers = await fetch_with_aiohttp(
+                    http_client.get_aiohttp_session(), url, headers, timeout,
+                    max_bytes=http_client.max_bytes, accept_text=http_client.accept_text)
+                http_client.note_status(url, status_code, headers)
+            else:
+                import aiohttp
+
+                async with aiohttp.ClientSession() as session:
+                    html_content, status_code, headers = await fetch_with_aiohttp(
+                        session, url, headers, timeout)
+            if status_code in RETRY_AFTER_STATUSES:
+                return {
+                    'success': False,
+                    'status_code': status_code,
+                    'url': url,
+                    'error_message': f"HTTP {status_code}: the server asked us to slow down"
+                }
+            if status_code is not None and status_code >= 400:
+                return {
+                    'success': False,
+                    'status_code': status_code,
+                    'url': url,
+                    'error_message': f"HTTP {status_code}"
+                }
+
+        # Process the HTML content to extract markdown
+        if html_content:
+            # Process with Crawl4AI (plain text skips it)
+            content_type = headers.get('Content-Type') or headers.get('content-type', '')
+            markdown_content = await convert_content(
+                html_content, content_type, url, extraction_config, conversion_pool, conversion_cache)
+
+            return {
+                'success': True,
+                'status_code': status_code,
+                'url': url,
+                'html': html_content if content_kind(content_type) == "html" else "",
+                'markdown': markdown_content,
+                'headers': headers
+            }
+        else:
+            return {
+                'success': False,
+                'url': url,
+                'error_message': "Failed to fetch HTML content"
+            }
+    except Exception as e:
+        return {
+            'success': False,
+            'url': url,
+            'error_message': str(e),
+            'exception': e
+        }
+
+
+async def fetch_with_aiohttp(session, url, headers, timeout=30, max_bytes=0, accept_text=True):
+    """GET ``url`` on an aiohttp session, returning (text, status, headers).
+
+    The body is streamed and abandoned with SkippedContent once it passes
+    ``max_bytes`` (0 = no limit); content types check_content rejects are
+    skipped before any of it is read. Error responses come back with an
+    empty body.
+    """
+    import aiohttp
+
+    with stage("fetch"):
+        started = time.perf_counter()
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            trace = _stage_trace.get()
+            if trace is not None:
+                trace.add("ttfb", time.perf_counter() - started)
+            if response.status >= 400:
+                return "", response.status, dict(response.headers)
+            check_content(response.headers.get("Content-Type", ""), response.headers.get("Content-Length"),
+                          max_bytes, accept_text)
+            with stage("download"):
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(65536):
+                    body += chunk
+                    if max_bytes and len(body) > max_bytes:
+                        raise SkippedContent(f"Skipped: body is over the {max_bytes / 1048576:g} MB limit")
+            with stage("decode"):
+                text, _, _ = decode_body(bytes(body), response.headers.get("Content-Type", ""))
+                return text, response.status, dict(response.headers)
+
+
+# NEW FUNCTION: Process a crawl result with both the original and Crawl4AI approaches
+def process_result(result, extraction_config=None, crawl_method="unknown"):
+    """Process a crawl result and return formatted output for Streamlit."""
+    # Set default extraction config if not provided
+    if extraction_config is None:
+        extraction_config = {
+            "prioritize_code_blocks": True,
+            "content_type": "Technical Documentation",
+            "extract_full_page": True,
+            "custom_selectors": []
+        }
+
+    output = []
+    # Add crawler metadata as comments
+    output.append(f"<!-- URL: {result.get('url', 'unknown')} -->\n")
+    output.append(f"<!-- Crawl Method: {crawl_method} -->\n")
+    output.append(
+        f"<!-- Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} -->\n")
+
+    # Also add metadata as visible text
+    output.append(f"# {result.get('url', 'unknown')}\n")
+    output.append(f"*Crawled using: {crawl_method}*\n")
+    output.append(f"*Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n")
+
+    if 'status_code' in result:
+        output.append(f"Status Code: {result.get('status_code', 'N/A')}\n")
+
+    if not result.get('success', False):
+        display_output = "\n".join(
+            output) + f"\n❌ Error: {result.get('error_message', 'Unknown error')}"
+        file_output = "\n".join(
+            output) + f"\n❌ Error: {result.get('error_message', 'Unknown error')}\n\n---\n"
+        return display_output, file_output
+
+    # Only the <head> is needed for metadata, so skip parsing the full page
+    with stage("metadata"):
+        metadata = extract_metadata(result.get('html') or '')
+
+    # Add metadata to output
+    output.append(f"## {metadata['title']}\n")
+    description = metadata.get('description')
+    if description:
+        preview_desc = description if len(
+            description) <= 150 else description[:150] + "..."
+        output.append(f"_{preview_desc}_\n")
+
+    # Get the markdown content that was already processed by Crawl4AI
+    markdown_content = result.get("markdown", "")
+
+    # Only remove null bytes which could break file writing
+    if markdown_content:
+        markdown_content = markdown_content.replace('\x00', '')
+
+    # Truncate markdown for display
+    display_markdown = markdown_content[:2000] + \
+        "..." if len(markdown_content) > 2000 else markdown_content
+
+    display_output = "\n".join(
+        output) + f"\n### Content Preview\n{display_markdown}"
+    file_output = "\n".join(output) + f"\n{markdown_content}\n\n---\n"
+
+    return display_output, file_output
+
+
+class ResultSink:
+    """Append crawl results to disk as soon as each page is processed.
+
+    Pages are written as markdown (the same layout as the old combined
+    download) or as JSONL records, optionally split into shards of
+    ``shard_size`` pages. Files are flushed and fsynced every
+    ``fsync_every`` pages rather than after each write. Nothing but the
+    open file handle is kept in memory.
+
+    ``state()`` describes how far the files have got (shard and byte
+    offset); a sink created with such a ``resume_state`` truncates the
+    output back to that point and appends from there (see CrawlJournal).
+    """
+
+    def __init__(self, crawl_method="hybrid", output_config=None, resume_state=None):
+        config = dict(DEFAULT_OUTPUT_CONFIG, **(output_config or {}))
+        self.crawl_method = crawl_method
+        self.format = "jsonl" if config["format"] == "jsonl" else "markdown"
+        self.shard_size = max(0, int(config["shard_size"] or 0))
+        self.fsync_every = max(1, int(config["fsync_every"]))
+        self.output_dir = config["directory"] or tempfile.mkdtemp(prefix="crawl_results_")
+        self.basename = f"crawl_results_{crawl_method}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.paths = []
+        self.count = 0
+        self.download_path = None
+        self._file = None
+        self._in_shard = 0
+        self._offset = 0  # Bytes written to the current shard
+        self._unsynced = 0
+        if resume_state:
+            self.format = resume_state["format"]
+            self.shard_size = resume_state["shard_size"]
+            self.output_dir = resume_state["output_dir"]
+            self.basename = resume_state["basename"]
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.extension = "jsonl" if self.format == "jsonl" else "md"
+        if resume_state:
+            self._resume(resume_state)
+
+    def _shard_path(self, number):
+        if self.shard_size:
+            name = f"{self.basename}_part{number:05d}.{self.extension}"
+        else:
+            name = f"{self.basename}.{self.extension}"
+        return os.path.join(self.output_dir, name)
+
+    def _resume(self, state):
+        # Shards past the checkpoint only hold pages that weren't recorded
+        # as done; those pages are crawled again
+        number = state["shards"] + 1
+        while self.shard_size and os.path.exists(self._shard_path(number)):
+            os.remove(self._shard_path(number))
+            number += 1
+        self.count = state["count"]
+        if not state["shards"]:
+            return
+        self.paths = [self._shard_path(number) for number in range(1, state["shards"] + 1)]
+        self._file = open(self.paths[-1], "ab")
+        self._file.truncate(state["offset"])
+        self._offset = state["offset"]
+        self._in_shard = state["in_shard"]
+
+    @classmethod
+    def roll_back(cls, state):
+        """Cut the files of a sink that was killed back to ``state``, dropping the pages written after it."""
+        sink = cls(resume_state=state)
+        if sink._file is not None:
+            sink.sync()
+            sink._file.close()
+        elif os.path.exists(sink._shard_path(1)):
+            os.remove(sink._shard_path(1))  # Nothing was written before ``state``
+
+    def state(self):
+        """JSON-serialisable position of the output, for resuming it later."""
+        return {"format": self.format, "shard_size": self.shard_size, "output_dir": self.output_dir,
+                "basename": self.basename, "shards": len(self.paths), "offset": self._offset,
+                "count": self.count, "in_shard": self._in_shard}
+
+    def sync(self):
+        """Flush and fsync the current shard."""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def _open_shard(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+        path = self._shard_path(len(self.paths) + 1)
+        self.paths.append(path)
+        self._file = open(path, "wb")
+        self._in_shard = 0
+        self._offset = 0
+
+    def write(self, file_output, record):
+        """Append one page: ``file_output`` for markdown, ``record`` for JSONL."""
+        if self._file is None or (self.shard_size and self._in_shard >= self.shard_size):
+            self._open_shard()
+        if self.format == "jsonl":
+            data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        else:
+            data = (file_output + "\n").encode("utf-8")
+        self._file.write(data)
+        self._offset += len(data)
+        self.count += 1
+        self._in_shard += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def close(self, header=""):
+        """Flush everything to disk and return the file to offer for download.
+
+        ``header`` (markdown only) is placed at the top of the first file;
+        it holds the final counts, which are only known now. Several shards
+        are bundled into a zip.
+        """
+        if self._file is None:
+            self._open_shard()
+        self.sync()
+        self._file.close()
+
+        if header and self.format == "markdown":
+            first = self.paths[0]
+            with open(first + ".tmp", "w", encoding="utf-8") as out, open(first, encoding="utf-8") as body:
+                out.write(header)
+                shutil.copyfileobj(body, out)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(first + ".tmp", first)
+
+        if len(self.paths) == 1:
+            self.download_path = self.paths[0]
+        else:
+            self.download_path = os.path.join(self.output_dir, f"{self.basename}.zip")
+            with zipfile.ZipFile(self.download_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+                for path in self.paths:
+                    bundle.write(path, os.path.basename(path))
+        return self.download_path
+
+
+def result_record(result, crawl_method="unknown"):
+    """Build the JSONL record for a crawl result."""
+    record = {
+        "url": result.get("url"),
+        "crawl_method": crawl_method,
+        "success": bool(result.get("success")),
+        "status_code": result.get("status_code"),
+        "crawled_at": datetime.now().isoformat(timespec="seconds")
+    }
+    if record["success"]:
+        metadata = extract_metadata(result.get("html") or "")
+        record["title"] = metadata["title"]
+        record["description"] = metadata["description"]
+        record["markdown"] = (result.get("markdown") or "").replace("\x00", "")
+    else:
+        record["error"] = result.get("error_message", "Unknown error")
+    return record
+
+
+class CrawlJournal:
+    """Persistent state of a named crawl job in SQLite (WAL), for resuming it.
+
+    Every URL handed to the frontier is recorded as "queued" with its
+    link depth; finished URLs move to "success", "error" or "skipped".
+    The ResultSink's position is stored alongside, so after a crash or a
+    Streamlit reload the job continues with the URLs still queued and the
+    output is truncated to exactly the pages recorded as finished.
+
+    Writes are buffered and committed in one transaction every
+    JOURNAL_BATCH_SIZE changes or JOURNAL_BATCH_SECONDS. Each checkpoint
+    fsyncs the result files first, so a URL is never marked finished before
+    its page is on disk; anything done after the last checkpoint is simply
+    crawled again.
+    """
+
+    def __init__(self, path, job_id):
+        path = os.path.expanduser(path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.job_id = job_id
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, crawl_method TEXT, sink TEXT, "
+            "discovery_done INTEGER NOT NULL DEFAULT 0, output_path TEXT, created_at REAL, updated_at REAL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls (job_id TEXT NOT NULL, url TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "depth INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, PRIMARY KEY (job_id, url))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS urls_by_status ON urls (job_id, status, seq)")
+        row = self._db.execute(
+            "SELECT sink, discovery_done, output_path FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        self.resumed = row is not None
+        self.sink_state = json.loads(row[0]) if row and row[0] else None
+        self.discovery_done = bool(row and row[1])
+        self.output_path = row[2] if row else None
+        self._seq = self._db.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM urls WHERE job_id = ?", (job_id,)).fetchone()[0]
+        self._queued = {}    # url -> (seq, depth) not yet committed
+        self._finished = {}  # url -> status not yet committed
+        self._last_commit = time.monotonic()
+
+    def start(self, crawl_method):
+        """Create the job row on first use."""
+        now = time.time()
+        self._db.execute("INSERT OR IGNORE INTO jobs (job_id, crawl_method, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                         (self.job_id, crawl_method, now, now))
+
+    def counts(self):
+        """Committed number of URLs per status."""
+        return dict(self._db.execute(
+            "SELECT status, COUNT(*) FROM urls WHERE job_id = ? GROUP BY status", (self.job_id,)))
+
+    def known(self, url):
+        """Whether ``url`` was already recorded for this job."""
+        if url in self._queued:
+            return True
+        return self._db.execute(
+            "SELECT 1 FROM urls WHERE job_id = ? AND url = ?", (self.job_id, url)).fetchone() is not None
+
+    def pending(self, batch=1000):
+        """Yield ``(url, depth)`` of committed URLs still queued, oldest first."""
+        seq = 0
+        while True:
+            rows = self._db.execute(
+                "SELECT seq, url, depth FROM urls WHERE job_id = ? AND status = 'queued' AND seq > ? "
+                "ORDER BY seq LIMIT ?", (self.job_id, seq, batch)).fetchall()
+            for seq, url, depth in rows:
+                yield url, depth
+            if len(rows) < batch:
+                return
+
+    def all_urls(self, batch=10000):
+        """Yield ``(url, depth, status)`` of every committed URL."""
+        seq = 0
+        while True:
+            rows = self._db.execute(
+                "SELECT seq, url, depth, status FROM urls WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (self.job_id, seq, batch)).fetchall()
+            for seq, url, depth, status in rows:
+                yield url, depth, status
+            if len(rows) < batch:
+                return
+
+    def queue(self, url, depth=0):
+        """Record ``url`` as queued (ignored if it is already known)."""
+        if url not in self._queued:
+            self._seq += 1
+            self._queued[url] = (self._seq, depth)
+
+    def finish(self, url, status, sink):
+        """Record the outcome of ``url``; checkpoints once enough changes are buffered."""
+        self._finished[url] = status
+        if (len(self._queued) + len(self._finished) >= JOURNAL_BATCH_SIZE
+                or time.monotonic() - self._last_commit >= JOURNAL_BATCH_SECONDS):
+            self.checkpoint(sink)
+
+    def checkpoint(self, sink):
+        """Commit buffered changes together with the sink's position."""
+        sink.sync()
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO urls (job_id, url, seq, depth, status) VALUES (?, ?, ?, ?, 'queued')",
+                [(self.job_id, url, seq, depth) for url, (seq, depth) in self._queued.items()])
+            self._db.executemany(
+                "UPDATE urls SET status = ? WHERE job_id = ? AND url = ?",
+                [(status, self.job_id, url) for url, status in self._finished.items()])
+            self._db.execute(
+                "UPDATE jobs SET sink = ?, discovery_done = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(sink.state()), int(self.discovery_done), time.time(), self.job_id))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._queued.clear()
+        self._finished.clear()
+        self._last_commit = time.monotonic()
+
+    def complete(self, output_path):
+        """Mark the job finished; running it again just returns ``output_path``."""
+        self.output_path = output_path
+        self._db.execute("UPDATE jobs SET output_path = ?, updated_at = ? WHERE job_id = ?",
+                         (output_path, time.time(), self.job_id))
+
+    def close(self):
+        self._db.close()
+
+
+class WorkQueue:
+    """Lease-based queue of URLs in SQLite, shared by several crawler instances.
+
+    One instance seeds the queue (``seed()``) and seals it; any number of
+    instances, on this machine or others that mount the same file, then
+    crawl it by passing the WorkQueue to prepare_crawl() as their URL
+    source. Iterating it leases ``batch_size`` URLs at a time for
+    ``lease_seconds``. Leases are renewed while the instance runs, and every
+    finished URL is acknowledged with its status (``ack()``). A lease that
+    expires because its worker died is taken over by the next instance
+    that asks for work. A URL that loses ``max_attempts`` leases this way
+    is recorded as an error rather than passed on forever.
+
+    Acknowledgements are committed like CrawlJournal checkpoints: every
+    JOURNAL_BATCH_SIZE URLs or JOURNAL_BATCH_SECONDS, after the result
+    files are fsynced, together with the ResultSink's position. So a URL is
+    never marked done before its page is on disk. A killed worker can leave
+    up to one batch of pages in its output that were not acknowledged yet;
+    those URLs are crawled again elsewhere. The next instance started on
+    the same host with the same output directory cuts the dead worker's
+    files back to its last acknowledgement (see ResultSink.roll_back), so
+    the outputs together hold every URL exactly once. The exception is a
+    worker that is alive but could not renew its leases for a whole
+    ``lease_seconds``: pages it finishes after losing a lease stay in its
+    output next to the new owner's, and are logged. Interrupting a worker
+    (Ctrl-C) commits its acknowledgements and hands its other leases back
+    at once.
+
+    The file uses SQLite's rollback journal rather than WAL, because WAL
+    does not work on network file systems. The shared storage must support
+    file locking. Lease expiry compares wall-clock times, so the machines'
+    clocks must agree to well within ``lease_seconds``. While crawling,
+    every statement runs on the queue's own thread: waiting for another
+    instance's write lock, or for a slow network mount, never stalls the
+    event loop.
+    """
+
+    def __init__(self, path, name="default", worker_id=None, queue_config=None):
+        config = dict(DEFAULT_QUEUE_CONFIG, **(queue_config or {}))
+        self.lease_seconds = config["lease_seconds"]
+        self.batch_size = config["batch_size"]
+        self.max_attempts = config["max_attempts"]
+        self.poll_seconds = config["poll_seconds"]
+        path = os.path.expanduser(path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.name = name
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{random.getrandbits(32):08x}"
+        self.frontier = None  # HostScheduler or ShardPool of the crawl (set by prepare_crawl)
+        self.sink = None      # ResultSink synced before acknowledgements commit (set by prepare_crawl)
+        self._db = sqlite3.connect(path, isolation_level=None, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS queues (name TEXT PRIMARY KEY, sealed INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS work (name TEXT NOT NULL, url TEXT NOT NULL, state TEXT NOT NULL, "
+            "status TEXT, owner TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (name, url))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS work_by_state ON work (name, state)")
+        # The output position of each running worker as of its last acknowledgement
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workers (name TEXT NOT NULL, worker_id TEXT NOT NULL, host TEXT, "
+            "output_dir TEXT, sink TEXT, updated_at REAL, PRIMARY KEY (name, worker_id))")
+        self._leased = set()  # URLs leased by this instance and not acknowledged yet
+        self._acks = {}       # url -> status not yet committed
+        self._last_commit = time.monotonic()
+        self._committing = None  # Task committing the last batch of acknowledgements
+        self._renewer = None
+        # One thread, so statements from the event loop's side never interleave
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="work-queue")
+
+    async def _run(self, fn, *args):
+        """Run a blocking database call on the queue's thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _transaction(self, statements):
+        """Run ``(sql, rows)`` pairs in one write transaction; returns the rows changed by each."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            changed = [self._db.executemany(sql, rows).rowcount for sql, rows in statements]
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return changed
+
+    def add(self, urls):
+        """Queue ``urls`` (URLs already in the queue are ignored); returns how many were new."""
+        return self._transaction([
+            ("INSERT OR IGNORE INTO queues (name, created_at) VALUES (?, ?)", [(self.name, time.time())]),
+            ("INSERT OR IGNORE INTO work (name, url, state) VALUES (?, ?, 'pending')",
+             [(self.name, url) for url in urls]),
+        ])[1]
+
+    def seal(self):
+        """Mark the queue complete: workers stop once every URL is done."""
+        self._transaction([
+            ("INSERT OR IGNORE INTO queues (name, created_at) VALUES (?, ?)", [(self.name, time.time())]),
+            ("UPDATE queues SET sealed = 1 WHERE name = ?", [(self.name,)]),
+        ])
+
+    async def seed(self, urls, batch=1000):
+        """Add ``urls`` (a list, iterator or async iterable) in batches, then seal the queue.
+
+        Returns the number of URLs added. The queue is sealed even if
+        reading ``urls`` fails part way; seeding again adds the rest.
+        """
+        added, pending = 0, []
+        try:
+            if hasattr(urls, "__aiter__"):
+                async for url in urls:
+                    pending.append(url)
+                    if len(pending) >= batch:
+                        added += await self._run(self.add, pending)
+                        pending = []
+            else:
+                for url in urls:
+                    pending.append(url)
+                    if len(pending) >= batch:
+                        added += await self._run(self.add, pending)
+                        pending = []
+            added += await self._run(self.add, pending)
+        finally:
+            await self._run(self.seal)
+        return added
+
+    def lease(self, limit):
+        """Lease up to ``limit`` URLs to this instance: expired leases first, then pending URLs.
+
+        Blocking; the caller adds the URLs to ``_leased``.
+        """
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            expired = self._db.execute(
+                "SELECT url, attempts FROM work WHERE name = ? AND state = 'leased' AND lease_expires < ? LIMIT ?",
+                (self.name, now, limit)).fetchall()
+            urls = [url for url, attempts in expired if attempts < self.max_attempts]
+            abandoned = [url for url, attempts in expired if attempts >= self.max_attempts]
+            if len(urls) < limit:
+                urls += [url for url, in self._db.execute(
+                    "SELECT url FROM work WHERE name = ? AND state = 'pending' ORDER BY rowid LIMIT ?",
+                    (self.name, limit - len(urls)))]
+            self._db.executemany(
+                "UPDATE work SET state = 'done', status = 'error', owner = NULL WHERE name = ? AND url = ?",
+                [(self.name, url) for url in abandoned])
+            self._db.executemany(
+                "UPDATE work SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE name = ? AND url = ?",
+                [(self.worker_id, now + self.lease_seconds, self.name, url) for url in urls])
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if len(expired) > len(abandoned):
+            logging.warning(f"Took over {len(expired) - len(abandoned)} URLs whose worker stopped renewing its lease")
+        if abandoned:
+            logging.warning(f"Gave up on {len(abandoned)} URLs after {self.max_attempts} expired leases")
+        return urls
+
+    def renew(self):
+        """Extend the leases this instance holds, and show that it is still running."""
+        now = time.time()
+        self._transaction([
+            ("UPDATE work SET lease_expires = ? WHERE name = ? AND owner = ? AND state = 'leased'",
+             [(now + self.lease_seconds, self.name, self.worker_id)]),
+            ("UPDATE workers SET updated_at = ? WHERE name = ? AND worker_id = ?", [(now, self.name, self.worker_id)]),
+        ])
+
+    def register(self, sink_state):
+        """Record this instance as running, first cutting back the output of dead ones that shared its directory.
+
+        A worker counts as dead once it hasn't renewed for ``lease_seconds``;
+        by then its leases have expired as well. Blocking.
+        """
+        now = time.time()
+        host = socket.gethostname()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            dead = self._db.execute(
+                "SELECT worker_id, sink FROM workers WHERE name = ? AND host = ? AND output_dir = ? AND updated_at < ?",
+                (self.name, host, sink_state["output_dir"], now - self.lease_seconds)).fetchall()
+            for worker_id, state in dead:
+                try:
+                    ResultSink.roll_back(json.loads(state))
+                except OSError as e:
+                    logging.warning(f"Could not cut back the output of stopped worker {worker_id}: {e}")
+            self._db.executemany("DELETE FROM workers WHERE name = ? AND worker_id = ?",
+                                 [(self.name, worker_id) for worker_id, _ in dead])
+            self._db.execute(
+                "INSERT OR REPLACE INTO workers (name, worker_id, host, output_dir, sink, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, self.worker_id, host, sink_state["output_dir"], json.dumps(sink_state), now))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if dead:
+            logging.warning(f"Removed the unacknowledged pages of {len(dead)} stopped workers from their output")
+
+    async def _renew_periodically(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._run(self.renew)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not renew work queue leases: {e}")
+
+    def ack(self, url, status):
+        """Record the outcome of a leased ``url``; commits in the background once enough are buffered."""
+        if url not in self._leased:
+            return  # Not from this queue
+        self._leased.discard(url)
+        self._acks[url] = status
+        if ((len(self._acks) >= JOURNAL_BATCH_SIZE
+                or time.monotonic() - self._last_commit >= JOURNAL_BATCH_SECONDS)
+                and (self._committing is None or self._committing.done())):
+            self._commit_acks()
+
+    def _commit_acks(self):
+        # The sink is synced here, on the loop that writes it; only the UPDATE moves to the thread.
+        # Every page written so far belongs to an acknowledged URL
+        self.sink.sync()
+        acks, self._acks = self._acks, {}
+        self._last_commit = time.monotonic()
+        self._committing = asyncio.ensure_future(self._commit(acks, self.sink.state()))
+        return self._committing
+
+    async def _commit(self, acks, sink_state):
+        try:
+            kept = (await self._run(self._transaction, [
+                ("UPDATE work SET state = 'done', status = ?, owner = NULL "
+                 "WHERE name = ? AND url = ? AND owner = ? AND state = 'leased'",
+                 [(status, self.name, url, self.worker_id) for url, status in acks.items()]),
+                ("UPDATE workers SET sink = ?, updated_at = ? WHERE name = ? AND worker_id = ?",
+                 [(json.dumps(sink_state), time.time(), self.name, self.worker_id)]),
+            ]))[0]
+        except sqlite3.Error as e:
+            logging.warning(f"Could not commit work queue acknowledgements, will retry: {e}")
+            for url, status in acks.items():
+                self._acks.setdefault(url, status)
+            return
+        if kept < len(acks):
+            logging.warning(f"{len(acks) - kept} URLs finished after their lease had passed to another "
+                            f"worker, so their pages may be in two outputs; raise lease_seconds if this "
+                            f"worker is just slow")
+
+    async def checkpoint(self):
+        """Commit buffered acknowledgements once the sink's files are on disk."""
+        if self._committing is not None:
+            await self._committing
+        if self._acks:
+            await self._commit_acks()
+        self._last_commit = time.monotonic()
+
+    async def release(self):
+        """Hand back the leases of URLs this instance didn't finish, so others can take them now.
+
+        Once every acknowledgement is committed the instance is also
+        unregistered: its output is complete and must not be cut back.
+        """
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        statements = []
+        if self._leased:
+            statements.append((
+                "UPDATE work SET state = 'pending', owner = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                "WHERE name = ? AND url = ? AND owner = ? AND state = 'leased'",
+                [(self.name, url, self.worker_id) for url in self._leased]))
+        if not self._acks:
+            statements.append(("DELETE FROM workers WHERE name = ? AND worker_id = ?", [(self.name, self.worker_id)]))
+        if statements:
+            await self._run(self._transaction, statements)
+            self._leased.clear()
+
+    def finished(self):
+        """Whether the queue is sealed and no URL is waiting or held by any worker."""
+        sealed = self._db.execute("SELECT sealed FROM queues WHERE name = ?", (self.name,)).fetchone()
+        if not sealed or not sealed[0] or self._leased:
+            return False
+        # This instance's own acknowledged URLs may not be committed yet
+        return self._db.execute(
+            "SELECT 1 FROM work WHERE name = ? AND state != 'done' AND (owner IS NULL OR owner != ?) LIMIT 1",
+            (self.name, self.worker_id)).fetchone() is None
+
+    async def counts(self):
+        """Committed number of URLs that are pending, leased, or done per status."""
+        return dict(await self._run(lambda: self._db.execute(
+            "SELECT COALESCE(status, state), COUNT(*) FROM work WHERE name = ? GROUP BY 1",
+            (self.name,)).fetchall()))
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._run(self.register, self.sink.state())
+        self._renewer = asyncio.create_task(self._renew_periodically())
+        try:
+            while True:
+                # Lease a batch only when the frontier runs low, so the other
+                # instances still find work near the end of the queue
+                while self.frontier is not None and self.frontier.qsize() >= self.batch_size:
+                    await self.frontier.wait()
+                urls = await self._run(self.lease, self.batch_size)
+                self._leased.update(urls)
+                for url in urls:
+                    yield url
+                if urls:
+                    continue
+                # Others may be waiting for the URLs finished here
+                await self.checkpoint()
+                if await self._run(self.finished):
+                    return
+                # Pages still in flight here or leased elsewhere, where a
+                # lease may yet expire: look again as our own pages finish
+                # and every poll_seconds
+                if self._leased and self.frontier is not None:
+                    try:
+                        await asyncio.wait_for(self.frontier.wait(), self.poll_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(self.poll_seconds)
+        finally:
+            if self._renewer is not None and not self._leased:
+                self._renewer.cancel()
+                self._renewer = None
+
+    def close(self):
+        self._executor.shutdown()
+        self._db.close()
+
+
+class StageTrace:
+    """Seconds spent in each stage while crawling one URL (one attempt)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.charset = None  # How decode_body picked the page's charset
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timing(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+
+# The StageTrace of the URL being crawled in this task (None = metrics are off).
+# Executor threads see it because fetches run in a copy of the task's context.
+_stage_trace = contextvars.ContextVar("stage_trace", default=None)
+_NO_STAGE = nullcontext()
+
+
+def stage(name):
+    """Time a block as stage ``name`` of the current URL; a no-op unless metrics are on."""
+    trace = _stage_trace.get()
+    return _NO_STAGE if trace is None else trace.timing(name)
+
+
+class CrawlMetrics:
+    """Histograms of per-URL stage timings, exported for Prometheus and as a JSONL trace.
+
+    Passed to prepare_crawl(), it times every URL attempt in these stages
+    (a stage can be missing, e.g. connect on a reused connection):
+
+    - fetch: getting the page (requests, the aiohttp fallback, or for
+      crawl4ai_http all of Crawl4AI's own fetching and scraping)
+    - connect: opening a new connection, DNS lookup included; dns: the
+      lookups alone (aiohttp only)
+    - ttfb: sending the request until the response headers, connect
+      included; download: reading the body; decode: charset detection
+      and decoding
+    - convert: markdown generation (process_with_crawl4ai), waiting for a
+      conversion worker included
+    - process: process_result, of which metadata is extract_metadata
+    - write: handing the page to the ResultSink
+    - total: the whole attempt
+
+    ``charsets`` counts how decode_body chose each page's charset.
+
+    Every finished attempt is written to ``trace_path`` as a JSON line
+    (when given) and counted in the histograms. ``prometheus_path`` is
+    rewritten in the Prometheus text format every METRICS_WRITE_SECONDS and
+    when the crawl ends, e.g. for node_exporter's textfile collector;
+    serve_metrics() offers the same text over HTTP. A shard process's
+    metrics ``forward`` their records to the parent instead.
+
+    Without a CrawlMetrics the timers reduce to one ContextVar lookup per
+    stage.
+    """
+
+    STAGES = ("fetch", "dns", "connect", "ttfb", "download", "decode", "convert", "process", "metadata", "write",
+              "total")
+
+    def __init__(self, trace_path="", prometheus_path="", forward=None):
+        self.prometheus_path = prometheus_path
+        self.forward = forward
+        # Per stage: observations per bucket (the last one is +Inf), sum and count;
+        # every key exists up front so serve_metrics() can read while the crawl writes
+        self.histograms = {name: [[0] * (len(STAGE_BUCKETS) + 1), 0.0, 0] for name in self.STAGES}
+        self.outcomes = {status: 0 for status in ("success", "error", "retrying")}
+        self.charsets = {source: 0 for source in CHARSET_SOURCES}  # decode_body decisions by step
+        self._trace_file = None
+        if trace_path:
+            trace_path = os.path.expanduser(trace_path)
+            if os.path.dirname(trace_path):
+                os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+            self._trace_file = open(trace_path, "a", encoding="utf-8")
+        self._last_write = time.monotonic()
+
+    def begin(self):
+        """Start timing a URL attempt in the current task."""
+        trace = StageTrace()
+        _stage_trace.set(trace)
+        return trace
+
+    def finish(self, trace, url, status, attempt=0):
+        """Record the attempt timed by ``trace`` with its outcome."""
+        _stage_trace.set(None)
+        trace.add("total", time.perf_counter() - trace.started)
+        record = {"time": round(time.time(), 3), "url": url, "status": status, "attempt": attempt,
+                  "stages": {name: round(seconds, 6) for name, seconds in trace.stages.items()}}
+        if trace.charset is not None:
+            record["charset"] = trace.charset
+        if self.forward is not None:
+            self.forward(record)
+        else:
+            self.observe(record)
+
+    def observe(self, record):
+        """Add a finished attempt's record to the histograms and the trace."""
+        self.outcomes[record["status"]] = self.outcomes.get(record["status"], 0) + 1
+        if "charset" in record:
+            self.charsets[record["charset"]["source"]] += 1
+        for name, seconds in record["stages"].items():
+            histogram = self.histograms.get(name)
+            if histogram is not None:
+                histogram[0][bisect.bisect_left(STAGE_BUCKETS, seconds)] += 1
+                histogram[1] += seconds
+                histogram[2] += 1
+        if self._trace_file is not None:
+            self._trace_file.write(json.dumps(record) + "\n")
+        if self.prometheus_path and time.monotonic() - self._last_write >= METRICS_WRITE_SECONDS:
+            self.write_prometheus()
+
+    def summary(self):
+        """Per stage: attempts timed, mean and approximate p50/p95 in ms (bucket upper bounds)."""
+        summary = {}
+        for name, (buckets, total, count) in self.histograms.items():
+            if not count:
+                continue
+            quantiles = {}
+            seen = 0
+            for bound, observed in zip(STAGE_BUCKETS + (math.inf,), buckets):
+                seen += observed
+                for q in (0.5, 0.95):
+                    if q not in quantiles and seen >= q * count:
+                        quantiles[q] = bound
+            summary[name] = {"count": count, "mean_ms": round(total / count * 1000, 2),
+                             "p50_ms": quantiles[0.5] * 1000, "p95_ms": quantiles[0.95] * 1000}
+        return summary
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = ["# HELP crawler_stage_seconds Time spent per URL attempt in each crawl stage.",
+                 "# TYPE crawler_stage_seconds histogram"]
+        for name, (buckets, total, count) in self.histograms.items():
+            cumulative = 0
+            for bound, observed in zip(STAGE_BUCKETS, buckets):
+                cumulative += observed
+                lines.append(f'crawler_stage_seconds_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'crawler_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'crawler_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'crawler_stage_seconds_count{{stage="{name}"}} {count}')
+        lines += ["# HELP crawler_url_attempts_total URL attempts by outcome.",
+                  "# TYPE crawler_url_attempts_total counter"]
+        lines += [f'crawler_url_attempts_total{{status="{status}"}} {count}'
+                  for status, count in list(self.outcomes.items())]
+        lines += ["# HELP crawler_charset_decisions_total Decoded pages by the step that chose their charset.",
+                  "# TYPE crawler_charset_decisions_total counter"]
+        lines += [f'crawler_charset_decisions_total{{source="{source}"}} {count}'
+                  for source, count in self.charsets.items()]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        """Replace ``prometheus_path`` atomically with the current metrics."""
+        path = os.path.expanduser(self.prometheus_path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+        self._last_write = time.monotonic()
+
+    def close(self):
+        """Write the final Prometheus file and close the trace."""
+        if self.prometheus_path:
+            self.write_prometheus()
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+def serve_metrics(metrics, port, host="127.0.0.1"):
+    """Serve ``metrics`` at http://host:port/metrics from a background thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def create_progress_data(concurrency_limit=5, crawl_method="hybrid", http_config=None, crawl4ai_profile="thorough",
+                         conversion_workers=DEFAULT_CONVERSION_WORKERS, output_config=None, total_urls=0,
+                         conversion_cache_path="", journal=None, result_sink=None, metrics=None):
+    """Create the shared state (counters and crawl-scoped resources) for one crawl.
+
+    With a resumed ``journal`` the counters start from the job's recorded
+    progress and results are appended to its existing output. A
+    ``result_sink`` replaces the ResultSink built from ``output_config``.
+    ``metrics`` is a CrawlMetrics that times every URL (None = no timing).
+    """
+    config = dict(DEFAULT_HTTP_CONFIG, **(http_config or {}))
+    done = journal.counts() if journal is not None else {}
+    rate_limiter = HostRateLimiter(config["host_rps"], config["host_burst"])
+    retry_policy = {key: config[key] for key in ("max_retries", "retry_backoff", "retry_backoff_max")}
+    http_client = CrawlHttpClient(http_config, max_workers=concurrency_limit, rate_limiter=rate_limiter)
+    return {
+        "progress": 0.0,
+        "processed_count": done.get("success", 0) + done.get("error", 0) + done.get("skipped", 0),
+        "successful_crawls": done.get("success", 0),
+        "failed_crawls": done.get("error", 0),
+        "current_urls": [],  # URLs currently being processed
+        # Most recently started URLs with their status: processing, success, error
+        "recent_urls": deque(maxlen=RECENT_URLS_SHOWN),
+        "total_urls": max(total_urls, sum(done.values())),  # Grows while an iterator is being read
+        "discovery_done": True,
+        "current_content": "",  # Content currently being displayed
+        # asyncio.Queue (or anything with put_nowait) receiving URL status changes
+        # for the progress UI or CLI (None = nobody is listening)
+        "events": None,
+        "concurrency": concurrency_limit,  # Concurrency limit
+        "timeout": 30,  # Request timeout
+        # Pages are appended to disk as they finish instead of kept in memory
+        "result_sink": result_sink or ResultSink(crawl_method, output_config,
+                                                 journal.sink_state if journal is not None else None),
+        # CrawlJournal recording progress for a resumable job (None = not resumable)
+        "journal": journal,
+        # Pooled HTTP client shared by every URL in this crawl
+        "http_client": http_client,
+        # Per-host token buckets and Retry-After pauses
+        "rate_limiter": rate_limiter,
+        # Retries of transient failures and per-host circuit breaking
+        "retry_policy": retry_policy,
+        "circuit_breaker": CircuitBreaker(config["breaker_threshold"], config["breaker_cooldown"]),
+        "retries": 0,
+        "frontier": None,  # HostScheduler that retries are queued on (set by prepare_crawl)
+        # robots.txt rules per host (None = robots.txt is ignored)
+        "robots": RobotsCache(http_client, rate_limiter, http_config) if config["respect_robots"] else None,
+        "robots_skipped": done.get("skipped", 0),
+        "content_skipped": 0,  # URLs that weren't HTML, XML or text, or were too big
+        # LinkFollower fed with every finished page (link-following crawls only)
+        "link_follower": None,
+        # WorkQueue the URLs are leased from and acknowledged to (shared queues only)
+        "work_queue": None,
+        # SitemapSource whose fields go into the results (sitemap crawls only)
+        "sitemap": None,
+        # CrawlMetrics collecting per-stage timings (None = not timed)
+        "metrics": metrics,
+        # AsyncWebCrawler instances reused across URLs (crawl4ai_http only)
+        "crawler_pool": Crawl4AIPool(concurrency_limit, crawl4ai_profile, use_cache=bool((http_config or {}).get("cache_dir")))
+        if crawl_method == "crawl4ai_http" else None,
+        # Worker processes for CPU-bound markdown conversion (None = in-process)
+        "conversion_pool": create_conversion_pool(conversion_workers) if crawl_method != "crawl4ai_http" else None,
+        # Markdown already produced for identical HTML (None = always convert)
+        "conversion_cache": ConversionCache(conversion_cache_path)
+        if conversion_cache_path and crawl_method != "crawl4ai_http" else None
+    }
+
+
+async def close_progress_data(progress_data):
+    """Release the crawl-scoped resources and return the connection stats."""
+    connection_stats = progress_data["http_client"].stats()
+    await progress_data["http_client"].close()
+    if progress_data["crawler_pool"] is not None:
+        await progress_data["crawler_pool"].close()
+    if progress_data["conversion_pool"] is not None:
+        progress_data["conversion_pool"].shutdown(wait=False, cancel_futures=True)
+    if progress_data["conversion_cache"] is not None:
+        connection_stats["conversion_cache"] = progress_data["conversion_cache"].stats()
+        # Waits for the last queued stores, which may wait for the file's lock
+        await asyncio.get_running_loop().run_in_executor(None, progress_data["conversion_cache"].close)
+    return connection_stats
+
+
+def publish_status(progress_data, url_entry):
+    """Tell the progress UI, if any, that ``url_entry`` changed status."""
+    if progress_data.get("events") is not None:
+        progress_data["events"].put_nowait(url_entry)
+
+
+def parse_retry_after(value, default=30, maximum=600):
+    """Seconds to wait according to a Retry-After header (delta or HTTP date)."""
+    if not value:
+        return default
+    value = value.strip()
+    if value.isdigit():
+        seconds = int(value)
+    else:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    return min(max(0, seconds), maximum)
+
+
+class HostRateLimiter:
+    """Token bucket per host, plus Retry-After pauses.
+
+    Each host earns ``rate`` tokens per second up to ``burst``; a request
+    spends one. ``pause()`` may be called from fetch threads, everything
+    else runs on the event loop.
+    """
+
+    def __init__(self, rate=2.0, burst=5):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._buckets = {}       # host -> (tokens, monotonic time of that count)
+        self._host_limits = {}   # host -> (rate, burst) tightened by robots.txt Crawl-delay
+        self._paused_until = {}  # host -> monotonic time
+        self.pauses = 0
+
+    @staticmethod
+    def host(url):
+        return urlparse(url).netloc.lower()
+
+    def limit_host(self, host, rate, burst=1):
+        """Lower ``host``'s rate (e.g. to honour a Crawl-delay); never raises it."""
+        current_rate, current_burst = self._host_limits.get(host, (self.rate, self.burst))
+        self._host_limits[host] = (min(current_rate, rate) if current_rate > 0 else rate,
+                                   max(1, min(current_burst, burst)))
+
+    def _tokens(self, host, now, rate, burst):
+        tokens, updated = self._buckets.get(host, (burst, now))
+        return min(burst, tokens + (now - updated) * rate)
+
+    def ready_at(self, host, now=None):
+        """Monotonic time at which ``host`` may receive its next request."""
+        now = time.monotonic() if now is None else now
+        start = max(now, self._paused_until.get(host, 0.0))
+        rate, burst = self._host_limits.get(host, (self.rate, self.burst))
+        if rate <= 0:
+            return start
+        tokens = self._tokens(host, now, rate, burst)
+        return max(start, now + (1 - tokens) / rate if tokens < 1 else now)
+
+    def take(self, host, now=None):
+        """Spend one of ``host``'s tokens."""
+        now = time.monotonic() if now is None else now
+        rate, burst = self._host_limits.get(host, (self.rate, self.burst))
+        if rate > 0:
+            self._buckets[host] = (self._tokens(host, now, rate, burst) - 1, now)
+
+    def pause(self, url, seconds):
+        """Send nothing to ``url``'s host for ``seconds`` (Retry-After)."""
+        host = self.host(url)
+        until = time.monotonic() + seconds
+        if until > self._paused_until.get(host, 0.0):
+            self._paused_until[host] = until
+            self.pauses += 1
+            logging.warning(f"Pausing {host} for {seconds:.0f}s after a rate-limit response")
+
+
+def is_retryable(result):
+    """True when a failed result looks transient (timeout, reset, 5xx, 429)."""
+    if result.get("status_code") in RETRYABLE_STATUSES:
+        return True
+    exception = result.get("exception")
+    if isinstance(exception, requests.HTTPError) and exception.response is not None:
+        return exception.response.status_code in RETRYABLE_STATUSES
+    if isinstance(exception, RETRYABLE_EXCEPTIONS):
+        return True
+    # aiohttp is imported lazily; if it isn't loaded, the error can't be one of its own
+    aiohttp = sys.modules.get("aiohttp")
+    return aiohttp is not None and isinstance(exception, (aiohttp.ClientConnectionError,
+                                                         aiohttp.ClientPayloadError))
+
+
+def retry_delay(attempt, policy):
+    """Delay before retry number ``attempt`` (1-based): jittered exponential backoff."""
+    ceiling = min(policy["retry_backoff_max"], policy["retry_backoff"] * 2 ** (attempt - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    ``threshold`` consecutive transient failures open a host's circuit:
+    nothing is sent to it for ``cooldown`` seconds. After that a single
+    probe request is let through; success closes the circuit, failure opens
+    it for another cooldown and marks the host as down (probe_failed), at
+    which point its URLs fail fast instead of waiting.
+    """
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._failures = {}    # host -> consecutive transient failures
+        self._open_until = {}  # host -> monotonic time the circuit may be probed
+        self._probing = set()  # hosts with a probe request in flight
+        self._failed_probes = {}  # host -> probes that failed since the circuit last closed
+        self.trips = 0
+
+    def allow(self, host):
+        """Return (allowed, seconds until the host may be tried again)."""
+        open_until = self._open_until.get(host)
+        if open_until is None:
+            return True, 0
+        remaining = open_until - time.monotonic()
+        if remaining > 0:
+            return False, remaining
+        if host in self._probing:
+            # Give the probe a full cooldown to report back
+            return False, self.cooldown
+        self._probing.add(host)
+        return True, 0
+
+    def probe_failed(self, host):
+        """True once a probe of ``host``'s open circuit has failed."""
+        return self._failed_probes.get(host, 0) > 0
+
+    def record(self, host, healthy):
+        """Record the outcome of a request that allow() let through."""
+        was_probe = host in self._probing
+        self._probing.discard(host)
+        if healthy:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+            self._failed_probes.pop(host, None)
+            return
+        if was_probe:
+            self._failed_probes[host] = self._failed_probes.get(host, 0) + 1
+        self._failures[host] = self._failures.get(host, 0) + 1
+        if host in self._open_until or self._failures[host] >= self.threshold:
+            if host not in self._open_until:
+                self.trips += 1
+                logging.warning(f"Circuit opened for {host} after {self._failures[host]} failures")
+            self._open_until[host] = time.monotonic() + self.cooldown
+
+
+class HostScheduler:
+    """Bounded frontier that hands out URLs as their host's rate limit allows.
+
+    URLs wait in one FIFO per host; a heap orders hosts by the time their
+    next request is allowed. A worker always gets the URL whose host is
+    ready soonest, so while one host is throttled or paused the workers
+    keep serving the others. ``put()`` blocks once ``maxsize`` URLs are
+    buffered.
+
+    Retries go through ``put_later()`` into a separate delay heap and only
+    rejoin their host's queue (at the back) when due, so they never hold up
+    fresh URLs. Workers call ``task_done()`` after each item; ``get()``
+    returns None after ``close()`` once nothing is queued, delayed or in
+    flight (an in-flight URL may still schedule a retry).
+    """
+
+    def __init__(self, limiter, maxsize=FRONTIER_MAX_BUFFERED):
+        self.limiter = limiter
+        self.maxsize = maxsize
+        self._pending = {}  # host -> deque of (index, url)
+        self._heap = []     # (ready_at, seq, host), one entry per host in _pending
+        self._seq = itertools.count()
+        self._size = 0
+        self._delayed = []  # (due, seq, item) retries waiting for their backoff
+        self._in_flight = 0
+        self._closed = False
+        self._changed = asyncio.Event()
+
+    def qsize(self):
+        return self._size
+
+    def delayed(self):
+        """Number of retries waiting for their backoff to expire."""
+        return len(self._delayed)
+
+    def idle(self):
+        """True when nothing is queued, waiting to retry or in flight."""
+        return not self._size and not self._delayed and not self._in_flight
+
+    async def wait(self):
+        """Wait until a URL is queued, handed out or finished."""
+        await self._wait()
+
+    def _notify(self):
+        # Swap in a fresh event so every current waiter wakes exactly once
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _wait(self, timeout=None):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _enqueue(self, item):
+        host = self.limiter.host(item[1])
+        if host not in self._pending:
+            self._pending[host] = deque()
+            heapq.heappush(self._heap, (self.limiter.ready_at(host), next(self._seq), host))
+        self._pending[host].append(item)
+        self._size += 1
+
+    async def put(self, item):
+        """Queue ``(index, url, attempt)``, waiting while the buffer is full."""
+        while self._size >= self.maxsize:
+            await self._wait()
+        self._enqueue(item)
+        self._notify()
+
+    def put_later(self, item, delay):
+        """Queue ``item`` again after ``delay`` seconds (a retry)."""
+        heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), item))
+        self._notify()
+
+    def task_done(self):
+        """Mark an item returned by get() as finished."""
+        self._in_flight -= 1
+        self._notify()
+
+    def close(self):
+        """No more URLs will be put; get() returns None once drained."""
+        self._closed = True
+        self._notify()
+
+    async def get(self):
+        """Return the next ``(index, url, attempt)`` whose host may be fetched now."""
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._enqueue(heapq.heappop(self._delayed)[2])
+            while self._heap and self._heap[0][0] <= now:
+                _, _, host = self._heap[0]
+                ready_at = self.limiter.ready_at(host, now)
+                if ready_at > now:
+                    # Paused by a Retry-After since it was queued
+                    heapq.heapreplace(self._heap, (ready_at, next(self._seq), host))
+                    continue
+                heapq.heappop(self._heap)
+                item = self._pending[host].popleft()
+                self.limiter.take(host, now)
+                if self._pending[host]:
+                    heapq.heappush(self._heap, (self.limiter.ready_at(host, now), next(self._seq), host))
+                else:
+                    del self._pending[host]
+                self._size -= 1
+                self._in_flight += 1
+                self._notify()
+                return item
+            if not self._heap and not self._delayed and not self._in_flight and self._closed:
+                return None
+            wake_times = [entry[0] for entry in self._heap[:1] + self._delayed[:1]]
+            await self._wait(min(wake_times) - now if wake_times else None)
+
+
+def _robots_pattern(path):
+    """Regex for one robots.txt path rule ("*" wildcard, "$" end anchor)."""
+    anchored = path.endswith("$")
+    pattern = re.escape(path[:-1] if anchored else path).replace(r"\*", ".*")
+    return pattern + (r"\Z" if anchored else "")
+
+
+class RobotsRules:
+    """The robots.txt rules that apply to us on one host, compiled once.
+
+    The most specific (longest) matching rule wins, Allow on ties (RFC
+    9309). Plain prefix rules live in a dict probed once per distinct rule
+    length, longest first. Rules with "*" or "$" are ordered by the same
+    precedence and joined into one alternation, so they cost a single
+    ``re.match``: the first alternative that matches is the winner.
+    """
+
+    def __init__(self, rules=(), crawl_delay=None, sitemaps=()):
+        self._prefixes = {}  # literal path prefix -> allowed
+        wildcard = []
+        for allow, path in rules:
+            if not path:
+                continue
+            if "*" in path or path.endswith("$"):
+                wildcard.append((allow, path))
+            else:
+                self._prefixes[path] = self._prefixes.get(path, False) or allow
+        self._lengths = sorted({len(path) for path in self._prefixes}, reverse=True)
+        wildcard.sort(key=lambda rule: (-len(rule[1]), not rule[0]))
+        self._wildcard = [(len(path), allow) for allow, path in wildcard]
+        self._matcher = re.compile("|".join(
+            f"(?P<r{i}>{_robots_pattern(path)})" for i, (_, path) in enumerate(wildcard))) if wildcard else None
+        self.crawl_delay = crawl_delay
+        self.sitemaps = list(sitemaps)
+
+    @classmethod
+    def disallow_all(cls):
+        return cls([(False, "/")])
+
+    @classmethod
+    def parse(cls, text, user_agent="*"):
+        """Parse robots.txt ``text`` for ``user_agent``'s group (or ``*``)."""
+        groups = []  # [agents, rules, crawl_delay]
+        sitemaps = []
+        group = None
+        in_agents = False
+        for line in text.splitlines():
+            key, _, value = line.split("#", 1)[0].partition(":")
+            key = key.strip().lower()
+            value = value.strip()
+            if key == "user-agent":
+                if not in_agents:
+                    group = [set(), [], None]
+                    groups.append(group)
+                group[0].add(value.lower())
+                in_agents = True
+                continue
+            in_agents = False
+            if key == "sitemap" and value:
+                sitemaps.append(value)
+            elif group is None:
+                continue
+            elif key in ("allow", "disallow"):
+                group[1].append((key == "allow", value))
+            elif key == "crawl-delay":
+                try:
+                    group[2] = float(value)
+                except ValueError:
+                    pass
+
+        token = user_agent.lower()
+        # The most specific agent name contained in our token wins; "*" otherwise
+        named = [(max(len(a) for a in g[0] if a != "*" and a in token), g) for g in groups
+                 if token != "*" and any(a != "*" and a in token for a in g[0])]
+        if named:
+            best = max(length for length, _ in named)
+            chosen = [g for length, g in named if length == best]
+        else:
+            chosen = [g for g in groups if "*" in g[0]]
+        rules = [rule for g in chosen for rule in g[1]]
+        delays = [g[2] for g in chosen if g[2] is not None]
+        return cls(rules, max(delays) if delays else None, sitemaps)
+
+    def allowed(self, url):
+        """True if robots.txt lets us fetch ``url``."""
+        # Path plus query; string slicing is several times cheaper than urlparse
+        start = url.find("/", url.find("//") + 2) if "//" in url else url.find("/")
+        path = url[start:].split("#", 1)[0] if start >= 0 else "/"
+        if path == "/robots.txt":
+            return True
+
+        best_length, allowed = -1, True
+        for length in self._lengths:
+            rule = self._prefixes.get(path[:length]) if length <= len(path) else None
+            if rule is not None:
+                best_length, allowed = length, rule
+                break
+        if self._matcher is not None:
+            match = self._matcher.match(path)
+            if match is not None:
+                length, allow = self._wildcard[int(match.lastgroup[1:])]
+                if length > best_length or (length == best_length and allow):
+                    allowed = allow
+        return allowed
+
+
+class RobotsCache:
+    """Fetches each host's robots.txt once per crawl and applies it.
+
+    Files are also kept on disk for ``robots_ttl`` seconds, so a crawl
+    started again the same day doesn't refetch them. A 4xx means no
+    restrictions; a 5xx or an unreachable host means "disallow everything"
+    for this crawl (RFC 9309) and is not written to disk. Crawl-delay
+    lowers the host's rate in the HostRateLimiter. Only http(s) URLs have
+    a robots.txt; ``raw:`` and ``file://`` inputs are always allowed.
+    """
+
+    def __init__(self, http_client, rate_limiter=None, http_config=None, timeout=30):
+        config = dict(DEFAULT_HTTP_CONFIG, **(http_config or {}))
+        self.http_client = http_client
+        self.rate_limiter = rate_limiter
+        self.user_agent = config["robots_user_agent"]
+        self.ttl = config["robots_ttl"]
+        self.cache_dir = os.path.expanduser(config["robots_cache_dir"]) if config["robots_cache_dir"] else ""
+        self.timeout = timeout
+        self._hosts = {}  # scheme://host -> Task resolving to RobotsRules
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def origin(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}"
+
+    def prefetch(self, url):
+        """Start loading ``url``'s robots.txt in the background."""
+        origin = self.origin(url)
+        if origin not in self._hosts:
+            if urlparse(origin).scheme in ("http", "https"):
+                self._hosts[origin] = asyncio.ensure_future(self._load(origin))
+            else:
+                self._hosts[origin] = asyncio.get_running_loop().create_future()
+                self._hosts[origin].set_result(RobotsRules())
+        return self._hosts[origin]
+
+    async def rules_for(self, url):
+        return await self.prefetch(url)
+
+    async def allowed(self, url):
+        """True if ``url``'s host lets us fetch it."""
+        return (await self.rules_for(url)).allowed(url)
+
+    async def sitemaps(self):
+        """Sitemap URLs listed by every robots.txt loaded so far."""
+        found = []
+        for rules in await asyncio.gather(*self._hosts.values()):
+            found.extend(sitemap for sitemap in rules.sitemaps if sitemap not in found)
+        return found
+
+    def _cache_path(self, origin):
+        return os.path.join(self.cache_dir, hashlib.sha1(origin.encode("utf-8")).hexdigest() + ".json")
+
+    async def _load(self, origin):
+        status, text = None, ""
+        cached = None
+        if self.cache_dir:
+            try:
+                with open(self._cache_path(origin), encoding="utf-8") as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                cached = None
+        if cached is not None and time.time() - cached["fetched_at"] < self.ttl:
+            status, text = cached["status"], cached["text"]
+        else:
+            try:
+                status, text = await self.http_client.fetch_text(origin + "/robots.txt", self.timeout)
+            except Exception as e:
+                logging.warning(f"Could not fetch {origin}/robots.txt: {e}")
+            if self.cache_dir and status is not None and status < 500:
+                try:
+                    with open(self._cache_path(origin), "w", encoding="utf-8") as f:
+                        json.dump({"origin": origin, "status": status, "text": text, "fetched_at": time.time()}, f)
+                except OSError as e:
+                    logging.warning(f"Could not cache robots.txt for {origin}: {e}")
+
+        if status is None or status >= 500:
+            rules = RobotsRules.disallow_all()
+        elif status >= 400:
+            rules = RobotsRules()
+        else:
+            rules = RobotsRules.parse(text, self.user_agent)
+        if rules.crawl_delay and self.rate_limiter is not None:
+            self.rate_limiter.limit_host(urlparse(origin).netloc, 1 / rules.crawl_delay)
+        return rules
+
+
+def canonicalize_url(url, keep_trailing_slash=False):
+    """Normalise a URL so that trivially different spellings compare equal.
+
+    Lower-cases scheme and host, drops default ports, the fragment and
+    tracking parameters (see TRACKING_PARAMS), sorts what is left of the
+    query and strips the trailing slash from non-root paths. Percent-escapes
+    are left alone. Returns None for anything that isn't http(s).
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.rpartition("@")[2].lower()
+    if scheme not in ("http", "https") or not netloc:
+        return None
+    if netloc.endswith(":80" if scheme == "http" else ":443"):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path or "/"
+    if not keep_trailing_slash and len(path) > 1:
+        path = path.rstrip("/") or "/"
+    query = ""
+    if parts.query:
+        params = [param for param in parts.query.split("&")
+                  if param and not _is_tracking_param(param.partition("=")[0].lower())]
+        query = "&".join(sorted(params))
+    return f"{scheme}://{netloc}{path}?{query}" if query else f"{scheme}://{netloc}{path}"
+
+
+def _is_tracking_param(name):
+    return name in TRACKING_PARAMS or name.startswith("utm_")
+
+
+def extract_links(html_content, base_url):
+    """Absolute URLs of a page's <a>/<area> links, honouring <base href>.
+
+    Links marked rel="nofollow" are left out.
+    """
+    try:
+        try:
+            doc = lxml.html.document_fromstring(html_content)
+        except ValueError:
+            # str input with an XML encoding declaration
+            doc = lxml.html.document_fromstring(html_content.encode("utf-8"))
+    except (ValueError, lxml.etree.LxmlError):
+        return []
+    base = doc.find(".//base[@href]")
+    if base is not None:
+        base_url = urljoin(base_url, base.get("href").strip())
+    links = []
+    for element in doc.iter("a", "area"):
+        href = element.get("href")
+        if not href or "nofollow" in (element.get("rel") or "").lower():
+            continue
+        try:
+            links.append(urljoin(base_url, href.strip()))
+        except ValueError:
+            continue  # e.g. a malformed IPv6 host
+    return links
+
+
+class SeenSet:
+    """Memory-bounded set of URLs for deduplicating discovered links.
+
+    A Bloom filter sized for ``capacity`` URLs at ``error_rate``: its memory
+    is allocated up front (about 1.8 bytes per URL at 0.1%) and never grows,
+    however many URLs are added. The price is the occasional unseen URL
+    reported as seen, whose link is then not followed; past ``capacity``
+    that chance climbs gradually instead of memory growing.
+    """
+
+    def __init__(self, capacity=DEFAULT_FOLLOW_CONFIG["seen_capacity"],
+                 error_rate=DEFAULT_FOLLOW_CONFIG["seen_error_rate"]):
+        self.bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    @property
+    def nbytes(self):
+        return len(self._array)
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, key):
+        # Double hashing: k bit positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        array = self._array
+        return all(array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        """Add ``key``; return False if it was (probably) there already."""
+        array = self._array
+        added = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not array[pos >> 3] & mask:
+                array[pos >> 3] |= mask
+                added = True
+        self.count += added
+        return added
+
+
+class SpillQueue:
+    """FIFO of ``(depth, url)`` that keeps at most ``max_in_memory`` entries in RAM.
+
+    Once the in-memory deque is full, later entries are appended to a
+    temporary file and read back in order whenever the deque runs dry, so a
+    crawl that discovers millions of URLs doesn't hold them all in memory.
+    """
+
+    def __init__(self, max_in_memory=DEFAULT_FOLLOW_CONFIG["queue_in_memory"]):
+        self.max_in_memory = max(1, max_in_memory)
+        self._head = deque()
+        self._file = None
+        self._read_pos = 0
+        self._spilled = 0
+
+    def __len__(self):
+        return len(self._head) + self._spilled
+
+    def append(self, depth, url):
+        if not self._spilled and len(self._head) < self.max_in_memory:
+            self._head.append((depth, url))
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(f"{depth}\t{url}\n".encode("utf-8"))
+        self._spilled += 1
+
+    def popleft(self):
+        if not self._head and self._spilled:
+            self._file.seek(self._read_pos)
+            for _ in range(min(self._spilled, self.max_in_memory)):
+                depth, _, url = self._file.readline().decode("utf-8").rstrip("\n").partition("\t")
+                self._head.append((int(depth), url))
+                self._spilled -= 1
+            self._read_pos = self._file.tell()
+            if not self._spilled:
+                self._file.seek(0)
+                self._file.truncate()
+                self._read_pos = 0
+        return self._head.popleft()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LinkFollower:
+    """Breadth-first link discovery for link-following crawls.
+
+    Iterating a LinkFollower (``async for``) yields the URLs to crawl,
+    start URLs first. Every finished page is handed to ``page_done()``,
+    which queues its in-scope links one level deeper. Links are
+    canonicalised (see canonicalize_url) and deduplicated with a SeenSet;
+    pending URLs wait in a SpillQueue, so memory stays flat however many
+    links are discovered. Iteration ends once nothing is pending and the
+    crawl's frontier has drained.
+
+    Scope: hosts in ``domains`` and their subdomains (default: the start
+    URLs' hosts without "www."), paths under ``path_prefix``, at most
+    ``max_depth`` links away from a start URL and ``max_pages`` URLs in
+    total (0 = no limit).
+    """
+
+    def __init__(self, start_urls, follow_config=None):
+        config = dict(DEFAULT_FOLLOW_CONFIG, **(follow_config or {}))
+        self.max_depth = config["max_depth"]
+        self.max_pages = config["max_pages"]
+        self.path_prefix = config["path_prefix"] or "/"
+        if not self.path_prefix.startswith("/"):
+            self.path_prefix = "/" + self.path_prefix
+        domains = config["domains"] or [urlsplit(url.strip()).hostname or "" for url in start_urls]
+        self.domains = tuple(domain.lower().removeprefix("www.") for domain in domains if domain)
+        self.seen = SeenSet(config["seen_capacity"], config["seen_error_rate"])
+        self.queue = SpillQueue(config["queue_in_memory"])
+        self.frontier = None   # HostScheduler or ShardPool of the crawl (set by prepare_crawl)
+        self.journal = None    # CrawlJournal of a resumable job (set by prepare_crawl)
+        self._depths = {}      # url -> depth, for URLs handed out but not finished
+        self.queued = 0        # Unique URLs accepted for crawling
+        self.links_found = 0   # Links seen on pages, duplicates and out-of-scope included
+        for url in start_urls:
+            self._add(url, 0, check_scope=False)
+
+    def in_scope(self, url):
+        """Whether a canonical URL is on an allowed host, under the path prefix and not a file download."""
+        _, _, host, path = (url.split("?", 1)[0] + "/").split("/", 3)
+        host = host.rsplit(":", 1)[0] if not host.endswith("]") else host
+        if not any(host == domain or host.endswith("." + domain) for domain in self.domains):
+            return False
+        path = "/" + path[:-1]
+        if not path.startswith(self.path_prefix) and path + "/" != self.path_prefix:
+            return False
+        return path.rpartition(".")[2].lower() not in SKIP_LINK_EXTENSIONS
+
+    def _add(self, url, depth, check_scope=True):
+        if self.max_pages and self.queued >= self.max_pages:
+            return False
+        fetch_url = canonicalize_url(url, keep_trailing_slash=True)
+        if fetch_url is None or (check_scope and not self.in_scope(fetch_url)):
+            return False
+        # "/docs" and "/docs/" count as one page; the first spelling found is fetched
+        if not self.seen.add(canonicalize_url(fetch_url)):
+            return False
+        self.queue.append(depth, fetch_url)
+        self.queued += 1
+        if self.journal is not None:
+            self.journal.queue(fetch_url, depth)
+        return True
+
+    def restore(self, journal):
+        """Pick up a resumed job: every journaled URL counts as seen, unfinished ones are queued again."""
+        for count, (url, depth, status) in enumerate(journal.all_urls()):
+            if not count:
+                # The job got past its start URLs; they are in the journal too
+                self.queue.close()
+                self.queue = SpillQueue(self.queue.max_in_memory)
+                self.queued = 0
+            self.seen.add(canonicalize_url(url))
+            self.queued += 1
+            if status == "queued":
+                self.queue.append(depth, url)
+
+    def wants_links(self, url):
+        """Whether the links on ``url``'s page would be followed (it isn't at max depth)."""
+        depth = self._depths.get(url)
+        return depth is not None and depth < self.max_depth
+
+    def page_done(self, url, html_content=None, base_url=None, links=None):
+        """Finish ``url``; queue the links of its HTML unless it is at max depth.
+
+        ``links`` can be passed instead of the HTML when they were extracted
+        elsewhere (a shard process). Returns the number of new URLs queued.
+        """
+        depth = self._depths.pop(url, None)
+        if depth is None or depth >= self.max_depth:
+            return 0
+        if links is None:
+            if not html_content:
+                return 0
+            links = extract_links(html_content, base_url or url)
+        self.links_found += len(links)
+        return sum(self._add(link, depth + 1) for link in links)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            while True:
+                if self.queue:
+                    depth, url = self.queue.popleft()
+                    self._depths[url] = depth
+                    yield url
+                elif self.frontier is None or self.frontier.idle():
+                    # Nothing pending and no page left that could add links
+                    return
+                else:
+                    await self.frontier.wait()
+        finally:
+            self.queue.close()
+
+
+def _local_name(tag):
+    """Strip the XML namespace from an element tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+async def _iter_response_bytes(response, chunk_size=65536):
+    """Yield the response body, transparently gunzipping .gz sitemaps."""
+    decompressor = None
+    async for chunk in response.content.iter_chunked(chunk_size):
+        if decompressor is None:
+            # aiohttp already undoes Content-Encoding: gzip; this catches
+            # sitemap.xml.gz files served as application/x-gzip
+            is_gzip = chunk[:2] == b'\x1f\x8b'
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if is_gzip else False
+        if not decompressor:
+            yield chunk
+            continue
+        # Sitemaps compress very well; inflate in bounded slices so one
+        # network chunk can't expand into megabytes of pending XML
+        data = decompressor.decompress(chunk, chunk_size)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, chunk_size)
+    if decompressor:
+        yield decompressor.flush()
+
+
+async def _parse_sitemap(session, url, timeout=30):
+    """Stream-parse one sitemap or sitemap index.
+
+    Yields ("url", entry) for page entries and ("sitemap", entry) for child
+    sitemaps. Parsed elements are dropped from the tree as soon as they are
+    read, so memory stays flat regardless of sitemap size.
+    """
+    import aiohttp
+
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+        async for data in _iter_response_bytes(response):
+            parser.feed(data)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    continue
+                kind = _local_name(elem.tag)
+                if kind not in ('url', 'sitemap'):
+                    continue
+                entry = {_local_name(child.tag): (child.text or '').strip() for child in elem}
+                root.clear()
+                if not entry.get('loc'):
+                    continue
+                try:
+                    priority = float(entry['priority']) if entry.get('priority') else None
+                except ValueError:
+                    priority = None
+                yield kind, {
+                    'loc': entry['loc'],
+                    'lastmod': entry.get('lastmod') or None,
+                    'priority': priority,
+                    'changefreq': entry.get('changefreq') or None
+                }
+        parser.close()
+
+
+async def stream_sitemap(sitemap_url, session=None, concurrency=4, max_buffered=1000, timeout=30):
+    """Stream page entries from a sitemap, following sitemap indexes.
+
+    Child sitemaps are fetched by ``concurrency`` workers at once. Entries
+    are dicts with ``loc``, ``lastmod``, ``priority`` and ``changefreq`` and
+    are yielded as soon as they are parsed; at most ``max_buffered`` wait
+    for the consumer, which keeps memory flat on huge sitemaps.
+    """
+    own_session = session is None
+    if own_session:
+        import aiohttp
+
+        session = aiohttp.ClientSession(trust_env=True)
+
+    done = object()
+    entries = asyncio.Queue(maxsize=max_buffered)
+    pending = asyncio.Queue()
+    seen_sitemaps = {sitemap_url}
+    pending.put_nowait(sitemap_url)
+    root_error = []
+
+    async def sitemap_worker():
+        while True:
+            url = await pending.get()
+            try:
+                async for kind, entry in _parse_sitemap(session, url, timeout):
+                    if kind == 'sitemap':
+                        if entry['loc'] not in seen_sitemaps:
+                            seen_sitemaps.add(entry['loc'])
+                            pending.put_nowait(entry['loc'])
+                    else:
+                        await entries.put(entry)
+            except Exception as e:
+                logging.error(f"Error reading sitemap {url}: {e}")
+                if url == sitemap_url:
+                    root_error.append(e)
+            finally:
+                pending.task_done()
+
+    async def close_when_drained():
+        await pending.join()
+        await entries.put(done)
+
+    workers = [asyncio.create_task(sitemap_worker()) for _ in range(max(1, concurrency))]
+    monitor = asyncio.create_task(close_when_drained())
+    try:
+        while True:
+            entry = await entries.get()
+            if entry is done:
+                break
+            yield entry
+        if root_error:
+            # Child sitemaps may fail quietly, but not the one we were asked for
+            raise root_error[0]
+    finally:
+        for task in workers + [monitor]:
+            task.cancel()
+        await asyncio.gather(*workers, monitor, return_exceptions=True)
+        if own_session:
+            await session.close()
+
+
+async def iter_sitemap_urls(sitemap_url, **kwargs):
+    """Yield just the page URLs of a sitemap as they are discovered."""
+    async for entry in stream_sitemap(sitemap_url, **kwargs):
+        yield entry['loc']
+
+
+class SitemapSource:
+    """The page URLs of a sitemap, with each page's sitemap fields kept until it is crawled.
+
+    Passed to prepare_crawl() like iter_sitemap_urls(), it yields the URLs
+    as they are discovered, and the ``lastmod``, ``priority`` and
+    ``changefreq`` of each URL go into its result (see write_result). A
+    URL's fields are dropped once it is finished or skipped, so ``entries``
+    grows with the frontier, not with the sitemap.
+    """
+
+    FIELDS = ("lastmod", "priority", "changefreq")
+
+    def __init__(self, sitemap_url, **kwargs):
+        self.sitemap_url = sitemap_url
+        self.kwargs = kwargs  # For stream_sitemap()
+        self.entries = {}     # url -> its sitemap fields that were given
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for entry in stream_sitemap(self.sitemap_url, **self.kwargs):
+            fields = {key: entry[key] for key in self.FIELDS if entry[key] is not None}
+            if fields:
+                self.entries[entry['loc']] = fields
+            yield entry['loc']
+
+
+async def fetch_sitemap(url):
+    """Fetch and parse sitemap XML to extract all URLs."""
+    return [loc async for loc in iter_sitemap_urls(url)]
+
+
+# Helper function to process a single URL
+async def process_single_url(url, index, total_urls, progress_data, semaphore, extraction_config, crawl_method="hybrid",
+                             attempt=0):
+    """Process a single URL with progress tracking and status updates.
+
+    ``semaphore`` may be None when the caller already bounds concurrency
+    (as the run_crawl worker pool does). Per-host pacing is the
+    caller's job too: run_crawl only dispatches URLs whose host
+    has a token (see HostScheduler).
+
+    Every crawl method goes through the same retry policy: a transient
+    failure (see is_retryable) is put back on the frontier's retry queue
+    with jittered backoff until ``max_retries`` is used up, and the host's
+    circuit breaker fast-fails URLs of a host that keeps failing. Without a
+    frontier in ``progress_data`` failures are final.
+    """
+    async with semaphore or nullcontext():
+        # Update status to "processing"
+        progress_data["current_urls"].append(url)
+        url_entry = {"index": index, "url": url, "status": "processing"}
+        progress_data["recent_urls"].append(url_entry)
+        publish_status(progress_data, url_entry)
+
+        host = HostRateLimiter.host(url)
+        breaker = progress_data.get("circuit_breaker")
+        allowed, wait_for_circuit = breaker.allow(host) if breaker is not None else (True, 0)
+        frontier = progress_data.get("frontier")
+        if not allowed and frontier is not None and not breaker.probe_failed(host):
+            # Park the URL until the circuit has been probed; this costs no attempt
+            progress_data["current_urls"].remove(url)
+            url_entry["status"] = "retrying"
+            frontier.put_later((index, url, attempt), wait_for_circuit)
+            publish_status(progress_data, url_entry)
+            return
+
+        metrics = progress_data.get("metrics")
+        trace = metrics.begin() if metrics is not None else None
+        try:
+            # Process the URL based on the selected crawl method
+            if not allowed:
+                result = {
+                    'success': False,
+                    'url': url,
+                    'error_message': f"Skipped: {host} keeps failing (circuit open)"
+                }
+            elif crawl_method == "hybrid":
+                # Use requests + Crawl4AI approach (best for bypassing auth)
+                result = await fetch_url(
+                    url,
+                    timeout=progress_data.get("timeout", 30),
+                    use_crawl4ai=True,
+                    use_requests=True,
+                    extraction_config=extraction_config,
+                    http_client=progress_data.get("http_client"),
+                    conversion_pool=progress_data.get("conversion_pool"),
+                    conversion_cache=progress_data.get("conversion_cache")
+                )
+            elif crawl_method == "requests_only":
+                # Use only requests (no Crawl4AI processing)
+                try:
+                    html_content, content_type = await fetch_with_requests_async(
+                        url, timeout=progress_data.get("timeout", 30),
+                        http_client=progress_data.get("http_client"))
+                    # Convert HTML to Markdown using Crawl4AI's processor
+                    markdown_content = await convert_content(
+                        html_content, content_type, url, extraction_config, progress_data.get("conversion_pool"),
+                        progress_data.get("conversion_cache"))
+
+                    result = {
+                        'success': True,
+                        'status_code': 200,  # Assume 200 as we don't get the actual status code
+                        'url': url,
+                        'html': html_content if content_kind(content_type) == "html" else "",
+                        'markdown': markdown_content,
+                        'error_message': ''
+                    }
+                except Exception as e:
+                    result = {
+                        'success': False,
+                        'url': url,
+                        'error_message': str(e),
+                        'exception': e
+                    }
+            elif crawl_method == "crawl4ai_http":
+                # Use Crawl4AI's HTTP strategy (similar to requests) with a
+                # crawler leased from the crawl-wide pool
+                with stage("fetch"):
+                    crawl_result = await progress_data["crawler_pool"].arun(url)
+                http_client = progress_data["http_client"]
+                headers = requests.structures.CaseInsensitiveDict(
+                    getattr(crawl_result, "response_headers", None) or {})
+                http_client.note_status(url, crawl_result.status_code, headers)
+
+                try:
+                    # Crawl4AI has already downloaded the body, but a PDF or an
+                    # oversized page is still skipped rather than converted
+                    kind = check_content(
+                        headers.get("Content-Type"),
+                        headers.get("Content-Length") or len((crawl_result.html or "").encode("utf-8")),
+                        http_client.max_bytes, http_client.accept_text) if crawl_result.success else "html"
+                except SkippedContent as e:
+                    result = {
+                        'success': False,
+                        'url': url,
+                        'error_message': str(e),
+                        'exception': e
+                    }
+                else:
+                    if kind == "text":
+                        # Plain text, JSON and the like: kept as text, like the other methods do
+                        markdown_content = text_to_markdown(crawl_result.html or "", headers.get("Content-Type"))
+                    else:
+                        markdown_content = crawl_result.markdown.fit_markdown if crawl_result.success and hasattr(crawl_result.markdown, 'fit_markdown') and crawl_result.markdown.fit_markdown else crawl_result.markdown.raw_markdown if crawl_result.success else ""
+                    result = {
+                        'success': crawl_result.success,
+                        'status_code': crawl_result.status_code,
+                        'url': crawl_result.url,
+                        'html': crawl_result.html if kind == "html" else "",
+                        'markdown': markdown_content,
+                        'error_message': crawl_result.error_message
+                    }
+            elif crawl_method == "crawl4ai_raw_html":
+                # Use Crawl4AI's raw HTML processing (fetch with requests, process with Crawl4AI)
+                try:
+                    html_content, content_type = await fetch_with_requests_async(
+                        url, timeout=progress_data.get("timeout", 30),
+                        http_client=progress_data.get("http_client"))
+                    # Process with the unmodified HTML directly via Crawl4AI
+                    markdown_content = await convert_content(
+                        html_content, content_type, url, extraction_config, progress_data.get("conversion_pool"),
+                        progress_data.get("conversion_cache"))
+
+                    result = {
+                        'success': True,
+                        'status_code': 200,  # We don't have the actual status code, so assume 200
+                        'url': url,
+                        'html': html_content if content_kind(content_type) == "html" else "",
+                        'markdown': markdown_content,
+                        'error_message': ''
+                    }
+                except Exception as e:
+                    result = {
+                        'success': False,
+                        'url': url,
+                        'error_message': str(e),
+                        'exception': e
+                    }
+            else:
+                # Default to hybrid approach
+                result = await fetch_url(
+                    url,
+                    timeout=progress_data.get("timeout", 30),
+                    extraction_config=extraction_config,
+                    http_client=progress_data.get("http_client"),
+                    conversion_pool=progress_data.get("conversion_pool"),
+                    conversion_cache=progress_data.get("conversion_cache")
+                )
+
+            if result["success"]:
+                with stage("process"):
+                    display_output, file_output = process_result(
+                        result, extraction_config, crawl_method)
+
+        except Exception as e:
+            result = {
+                'success': False,
+                'url': url,
+                'error_message': str(e),
+                'exception': e
+            }
+
+        if breaker is not None and allowed:
+            breaker.record(host, result["success"] or not is_retryable(result))
+
+        # Remove from current URLs being processed
+        if url in progress_data["current_urls"]:
+            progress_data["current_urls"].remove(url)
+
+        policy = progress_data["retry_policy"]
+        if not result["success"] and frontier is not None and attempt < policy["max_retries"] and is_retryable(result):
+            delay = retry_delay(attempt + 1, policy)
+            logging.info(f"Retrying {url} in {delay:.1f}s: {result.get('error_message')}")
+            progress_data["retries"] += 1
+            url_entry["status"] = "retrying"
+            frontier.put_later((index, url, attempt + 1), delay)
+            if trace is not None:
+                metrics.finish(trace, url, "retrying", attempt)
+            publish_status(progress_data, url_entry)
+            return
+
+        if result["success"]:
+            progress_data["successful_crawls"] += 1
+            with stage("write"):
+                write_result(progress_data, url, file_output, result_record(result, crawl_method))
+            progress_data["current_content"] = display_output
+            url_entry["status"] = "success"
+        elif isinstance(result.get("exception"), SkippedContent):
+            # Not a page (a PDF, an image, or too big): nothing to write
+            progress_data["content_skipped"] += 1
+            url_entry["status"] = "skipped"
+            url_entry["reason"] = "content"
+            logging.info(f"{url}: {result['error_message']}")
+        else:
+            progress_data["failed_crawls"] += 1
+            error_message = result.get("error_message", "Unknown error")
+            url_entry["status"] = "error"
+            with stage("write"):
+                write_result(progress_data, url, f"\n## Error processing {url}\n\n{error_message}\n",
+                             result_record(result, crawl_method))
+            progress_data["current_content"] = f"❌ Error processing {url}: {error_message}"
+
+        if progress_data.get("link_follower") is not None:
+            progress_data["link_follower"].page_done(
+                url, result.get("html") if result["success"] else None, result.get("url"))
+        record_finished(progress_data, url, url_entry["status"])
+        if trace is not None:
+            metrics.finish(trace, url, url_entry["status"], attempt)
+
+        advance_progress(progress_data, total_urls)
+        publish_status(progress_data, url_entry)
+
+
+def write_result(progress_data, url, file_output, record):
+    """Hand a finished page to the ResultSink, with the fields its sitemap entry gave it."""
+    sitemap = progress_data.get("sitemap")
+    fields = sitemap.entries.get(url) if sitemap is not None else None
+    if fields:
+        record = dict(record, sitemap=fields)
+        file_output = f"<!-- Sitemap: {', '.join(f'{key}={value}' for key, value in fields.items())} -->\n\n" \
+            + file_output
+    progress_data["result_sink"].write(file_output, record)
+
+
+def record_finished(progress_data, url, status):
+    """Journal the final ``status`` of ``url`` and acknowledge it to the work queue, if any."""
+    if progress_data.get("sitemap") is not None:
+        progress_data["sitemap"].entries.pop(url, None)
+    if progress_data.get("journal") is not None:
+        progress_data["journal"].finish(url, status, progress_data["result_sink"])
+    if progress_data.get("work_queue") is not None:
+        progress_data["work_queue"].ack(url, status)
+
+
+def advance_progress(progress_data, total_urls=0):
+    """Count one more URL as finished and update the progress fraction."""
+    # The total keeps growing while URLs are still being discovered
+    progress_data["processed_count"] += 1
+    progress = progress_data["processed_count"] / (progress_data.get("total_urls") or total_urls or 1)
+    progress_data["progress"] = progress if progress_data.get("discovery_done", True) else min(progress, 0.99)
+
+
+def prepare_crawl(urls, wait_time=None, extraction_config=None, concurrency_limit=5, crawl_method="hybrid", http_config=None, crawl4ai_profile="thorough", conversion_workers=DEFAULT_CONVERSION_WORKERS, output_config=None, conversion_cache_path="", job_id="", processes=1, result_sink=None, metrics=None, jobs_db=DEFAULT_JOBS_DB):
+    """Set up a crawl of ``urls`` and return its progress data for run_crawl().
+
+    ``urls`` can be a list, any iterator or an async iterable (e.g. a
+    streaming sitemap). A SitemapSource also puts each page's lastmod,
+    priority and changefreq in its result. It may also be a LinkFollower,
+    which keeps producing the links found on crawled pages until the
+    frontier drains, or a WorkQueue shared with other crawler instances.
+
+    ``wait_time`` overrides ``host_rps`` in ``http_config`` with one
+    request per ``wait_time`` seconds to each host on average; up to
+    ``host_burst`` requests may still go back to back. A ``job_id`` makes
+    the crawl resumable: its progress is journaled in ``jobs_db`` (see
+    CrawlJournal) and preparing the same job again continues with the URLs
+    that hadn't finished, without fetching finished ones again. A job that
+    has already finished raises ValueError; see finished_job_output().
+
+    With ``processes`` > 1 the crawl is sharded by host over that many
+    worker processes (see ShardPool), which share the concurrency limit and
+    convert markdown in-process. A crawl of a single host gains nothing from
+    this. ``result_sink`` replaces the ResultSink writing the output, and
+    ``metrics`` (a CrawlMetrics) times the stages of every URL.
+    """
+    # Set default extraction config if not provided
+    if extraction_config is None:
+        extraction_config = {
+            "prioritize_code_blocks": True,
+            "content_type": "Technical Documentation",
+            "extract_full_page": True,
+            "custom_selectors": []
+        }
+
+    if wait_time is not None:
+        http_config = dict(http_config or {}, host_rps=1 / wait_time if wait_time > 0 else 0)
+    if isinstance(urls, WorkQueue):
+        if job_id:
+            raise ValueError("A crawl of a work queue is tracked by the queue; it takes no job_id")
+        # Sitemaps from robots.txt belong in the queue, not in one instance's crawl
+        http_config = dict(http_config or {}, robots_sitemaps=False)
+    journal = None
+    if job_id:
+        journal = CrawlJournal(jobs_db, job_id)
+        if journal.output_path:
+            journal.close()
+            raise ValueError(f"Job {job_id} has already finished")
+        journal.start(crawl_method)
+    # Known up front for lists; counted as the producer goes for iterators
+    known_total = len(urls) if hasattr(urls, "__len__") else None
+    sharded = processes > 1
+
+    # A sharded crawl fetches and converts in its shard processes, not here
+    progress_data = create_progress_data(
+        concurrency_limit, crawl_method, http_config, crawl4ai_profile, 0 if sharded else conversion_workers,
+        output_config, known_total or 0, "" if sharded else conversion_cache_path, journal, result_sink, metrics)
+    progress_data["discovery_done"] = known_total is not None
+    progress_data["urls"] = urls
+    progress_data["extraction_config"] = extraction_config
+    progress_data["crawl_method"] = crawl_method
+
+    # Bounded frontier: the producer waits whenever workers fall behind
+    if sharded:
+        progress_data["frontier"] = ShardPool(processes, {
+            "extraction_config": extraction_config,
+            "concurrency_limit": math.ceil(concurrency_limit / processes),
+            "crawl_method": crawl_method,
+            # robots.txt sitemaps are read here, like every other URL source
+            "http_config": dict(http_config or {}, robots_sitemaps=False),
+            "crawl4ai_profile": crawl4ai_profile,
+            "conversion_cache_path": conversion_cache_path,
+            "follow_links": isinstance(urls, LinkFollower),
+            "collect_metrics": metrics is not None
+        })
+    else:
+        progress_data["frontier"] = HostScheduler(progress_data["rate_limiter"])
+    if isinstance(urls, LinkFollower):
+        urls.frontier = progress_data["frontier"]
+        urls.journal = journal
+        if journal is not None and journal.resumed:
+            urls.restore(journal)
+        progress_data["link_follower"] = urls
+        if sharded:
+            progress_data["frontier"].link_follower = urls
+    if isinstance(urls, WorkQueue):
+        urls.frontier = progress_data["frontier"]
+        urls.sink = progress_data["result_sink"]
+        progress_data["work_queue"] = urls
+    if isinstance(urls, SitemapSource):
+        progress_data["sitemap"] = urls
+    return progress_data
+
+
+def finished_job_output(job_id, jobs_db=DEFAULT_JOBS_DB):
+    """Output path of job ``job_id`` in ``jobs_db`` if it has already finished, else None."""
+    journal = CrawlJournal(jobs_db, job_id)
+    try:
+        return journal.output_path
+    finally:
+        journal.close()
+
+
+async def run_crawl(progress_data):
+    """Run a crawl set up by prepare_crawl() and return the path of its output.
+
+    A producer feeds a bounded frontier that ``concurrency`` long-lived
+    workers drain, so memory grows with the concurrency limit rather than
+    with the number of URLs, and crawling starts with the first URL
+    produced. Workers take URLs from a HostScheduler, which paces every host
+    with its own token bucket and skips hosts paused by a 429/503
+    Retry-After.
+
+    In a sharded crawl the ShardPool's processes do the fetching instead of
+    the workers, and their results are gathered here.
+
+    Status changes are published to ``progress_data["events"]`` when it is
+    set. Results are streamed to disk by a ResultSink. Afterwards
+    ``progress_data`` also holds "connection_stats", "finished_at" and, if
+    reading the URLs failed part way, "discovery_error".
+    """
+    urls = progress_data["urls"]
+    extraction_config = progress_data["extraction_config"]
+    crawl_method = progress_data["crawl_method"]
+    frontier = progress_data["frontier"]
+    journal = progress_data["journal"]
+    sharded = isinstance(frontier, ShardPool)
+    # A resumed job re-reads its source but only queues URLs it hasn't seen;
+    # a LinkFollower restores its own queue instead
+    skip_known = journal is not None and journal.resumed and progress_data["link_follower"] is None
+
+    robots = progress_data["robots"]
+    # Sitemaps named in robots.txt are crawled after the given URLs; the
+    # seen set keeps their URLs from being crawled twice
+    follow_robots_sitemaps = robots is not None and progress_data["http_client"].config["robots_sitemaps"]
+    if follow_robots_sitemaps:
+        progress_data["discovery_done"] = False
+    # Shard processes check robots.txt themselves; here it's only read for its sitemaps
+    prefetch_robots = robots is not None and (follow_robots_sitemaps or not sharded)
+
+    async def produce_urls():
+        index = progress_data["processed_count"]  # Resumed jobs continue the numbering
+        seen = set() if follow_robots_sitemaps else None
+
+        async def enqueue(url, journaled=False):
+            nonlocal index
+            if seen is not None:
+                if url in seen:
+                    return
+                seen.add(url)
+            if journal is not None and not journaled:
+                if skip_known and journal.known(url):
+                    if progress_data["sitemap"] is not None:
+                        progress_data["sitemap"].entries.pop(url, None)
+                    return
+                journal.queue(url)
+            if prefetch_robots:
+                robots.prefetch(url)  # Load robots.txt while the URL waits in the queue
+            await frontier.put((index, url, 0))
+            index += 1
+            progress_data["total_urls"] = max(progress_data["total_urls"], index)
+
+        try:
+            source = urls
+            if skip_known:
+                for url, _ in journal.pending():
+                    await enqueue(url, journaled=True)
+                if journal.discovery_done:
+                    source = ()
+            if hasattr(source, "__aiter__"):
+                async for url in source:
+                    await enqueue(url)
+            else:
+                for url in source:
+                    await enqueue(url)
+            if follow_robots_sitemaps and not (skip_known and journal.discovery_done):
+                for sitemap_url in await robots.sitemaps():
+                    async for url in iter_sitemap_urls(sitemap_url):
+                        await enqueue(url)
+            if journal is not None:
+                journal.discovery_done = True  # Saved with the next checkpoint
+        finally:
+            progress_data["discovery_done"] = True
+            progress_data["total_urls"] = index
+
+    async def crawl_worker():
+        while True:
+            item = await frontier.get()
+            if item is None:
+                return
+            index, url, attempt = item
+            try:
+                if robots is not None and attempt == 0:
+                    host_rules = robots.prefetch(url)
+                    if not host_rules.done():
+                        # Dispatched before its host's robots.txt arrived: send it
+                        # round again so a Crawl-delay applies to it too
+                        await host_rules
+                        frontier.put_later(item, 0)
+                        continue
+                    if not host_rules.result().allowed(url):
+                        # Disallowed: dropped without ever being fetched
+                        progress_data["robots_skipped"] += 1
+                        if progress_data["link_follower"] is not None:
+                            progress_data["link_follower"].page_done(url)
+                        record_finished(progress_data, url, "skipped")
+                        url_entry = {"index": index, "url": url, "status": "skipped"}
+                        progress_data["recent_urls"].append(url_entry)
+                        advance_progress(progress_data)
+                        publish_status(progress_data, url_entry)
+                        continue
+                await process_single_url(
+                    url, index, progress_data["total_urls"], progress_data, None, extraction_config, crawl_method,
+                    attempt)
+            finally:
+                frontier.task_done()
+
+    producer = asyncio.create_task(produce_urls())
+    if sharded:
+        workers = [asyncio.create_task(frontier.run(progress_data))]
+    else:
+        workers = [asyncio.create_task(crawl_worker()) for _ in range(progress_data["concurrency"])]
+
+    # Wait for the producer, then let the workers drain the frontier
+    try:
+        try:
+            await producer
+        except Exception as e:
+            logging.warning(f"URL discovery stopped early: {e}")
+            progress_data["discovery_error"] = str(e)
+        frontier.close()
+        await asyncio.gather(*workers)
+    finally:
+        if journal is not None:
+            journal.checkpoint(progress_data["result_sink"])
+        if progress_data["work_queue"] is not None:
+            await progress_data["work_queue"].checkpoint()
+            await progress_data["work_queue"].release()
+        if progress_data["metrics"] is not None:
+            progress_data["metrics"].close()
+        progress_data["connection_stats"] = await close_progress_data(progress_data)
+        if sharded:
+            progress_data["connection_stats"] = merge_connection_stats(
+                [progress_data["connection_stats"]] + frontier.connection_stats)
+    progress_data["progress"] = 1.0
+
+    # Add metadata at the top of the file
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    progress_data["finished_at"] = timestamp
+    metadata = f"""# Web Crawler Results
+Generated on: {timestamp}
+Crawl method: {crawl_method}
+
+Total URLs processed: {progress_data["total_urls"]}
+- ✅ Successful: {progress_data["successful_crawls"]}
+- ❌ Failed: {progress_data["failed_crawls"]}
+
+---
+
+"""
+    output_path = progress_data["result_sink"].close(header=metadata)
+    if journal is not None:
+        journal.complete(output_path)
+        journal.close()
+    return output_path
+
+
+def merge_connection_stats(parts):
+    """Add up connection stats (see CrawlHttpClient.stats) from several processes.
+
+    Counters are summed; the size of a shared HTTP cache is taken once.
+    """
+    merged = {}
+    for part in parts:
+        for key, value in part.items():
+            if isinstance(value, dict):
+                merged[key] = merge_connection_stats([merged[key], value]) if merged.get(key) else dict(value)
+            elif isinstance(value, (int, float)) and key in ("entries", "bytes"):
+                merged[key] = max(merged.get(key) or 0, value)
+            elif isinstance(value, (int, float)):
+                merged[key] = (merged.get(key) or 0) + value
+            else:
+                merged.setdefault(key, value)
+    if "reuse_ratio" in merged and merged["requests_sent"]:
+        merged["reuse_ratio"] = 1 - merged["connections_opened"] / merged["requests_sent"]
+    return merged
+
+
+class ShardPool:
+    """Frontier of a sharded crawl: routes URLs to worker processes by host.
+
+    Each of ``processes`` worker processes runs its own event loop and the
+    usual run_crawl pipeline (HostScheduler, robots.txt, retries, circuit
+    breaker, markdown conversion) for the hosts that hash to it, so per-host
+    politeness needs no coordination between processes. URLs go out in
+    batches on one queue per shard. Status changes, result pages, discovered
+    links and stage timings come back on a shared queue (see ShardRelay) and
+    are applied to the parent's progress data, which keeps the single
+    ResultSink, the journal, the LinkFollower and the CrawlMetrics.
+
+    Stands in for the HostScheduler in progress_data["frontier"]: put()
+    blocks once ``maxsize`` URLs are routed but unfinished, and close(),
+    qsize(), delayed(), idle() and wait() behave the same. Retries stay
+    inside the shards.
+    """
+
+    def __init__(self, processes, settings, maxsize=FRONTIER_MAX_BUFFERED):
+        self.processes = processes
+        self.settings = settings  # prepare_crawl() arguments for the shards
+        self.maxsize = maxsize
+        self.link_follower = None  # LinkFollower of the crawl (set by prepare_crawl)
+        self.connection_stats = []  # One entry per shard that has finished
+        # Spawned, not forked: the parent has threads and a running event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._inboxes = [self._context.Queue() for _ in range(processes)]
+        self._outbox = self._context.Queue()
+        self._workers = []
+        self._batches = [[] for _ in range(processes)]
+        # A shard numbers its URLs in the order they arrive; this maps its
+        # numbers back to the crawl's own indexes
+        self._indexes = [{} for _ in range(processes)]
+        self._routed = [0] * processes
+        self._entries = {}  # (shard, number) -> url_entry shown in the progress UI
+        self._retries = [0] * processes
+        self._outstanding = 0  # Routed but not finished
+        self._active = 0       # Being fetched right now
+        self._retrying = 0     # Waiting in a shard for their retry backoff
+        self._pages = {}       # url -> (file_output, record) received but not finished yet
+        self._error = None
+        self._changed = asyncio.Event()
+
+    def shard_for(self, url):
+        """Shard that crawls ``url``'s host."""
+        return zlib.crc32(HostRateLimiter.host(url).encode("utf-8")) % self.processes
+
+    def qsize(self):
+        return self._outstanding - self._active - self._retrying
+
+    def delayed(self):
+        """Number of retries waiting for their backoff to expire in the shards."""
+        return self._retrying
+
+    def idle(self):
+        """True when every routed URL has finished."""
+        return not self._outstanding
+
+    async def wait(self):
+        """Wait until a URL is routed or a shard reports progress."""
+        await self._changed.wait()
+
+    def _notify(self):
+        # Swap in a fresh event so every current waiter wakes exactly once
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def put(self, item):
+        """Route ``(index, url, attempt)`` to its shard, waiting while ``maxsize`` URLs are unfinished."""
+        while self._outstanding >= self.maxsize and self._error is None:
+            await self.wait()
+        if self._error is not None:
+            raise RuntimeError(f"Sharded crawl failed: {self._error}")
+        index, url, _ = item
+        shard = self.shard_for(url)
+        self._indexes[shard][self._routed[shard]] = index
+        self._routed[shard] += 1
+        want_links = self.link_follower is not None and self.link_follower.wants_links(url)
+        self._batches[shard].append((url, want_links))
+        if len(self._batches[shard]) >= SHARD_BATCH_SIZE:
+            self._flush(shard)
+        self._outstanding += 1
+        self._notify()
+
+    def _flush(self, shard):
+        if self._batches[shard]:
+            self._inboxes[shard].put(self._batches[shard])
+            self._batches[shard] = []
+
+    def close(self):
+        """No more URLs will be put; each shard finishes once it has crawled its share."""
+        for shard in range(self.processes):
+            self._flush(shard)
+            self._inboxes[shard].put(None)
+        self._notify()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(SHARD_FLUSH_SECONDS)
+            for shard in range(self.processes):
+                self._flush(shard)
+
+    def _receive(self):
+        try:
+            return self._outbox.get(timeout=0.5)
+        except queue.Empty:
+            return None
+
+    async def run(self, progress_data):
+        """Start the shard processes and apply their reports to ``progress_data`` until all have finished."""
+        settings = dict(self.settings, timeout=progress_data["timeout"])
+        for shard in range(self.processes):
+            worker = self._context.Process(target=_run_shard, name=f"crawl-shard-{shard}", daemon=True,
+                                           args=(shard, settings, self._inboxes[shard], self._outbox))
+            worker.start()
+            self._workers.append(worker)
+        loop = asyncio.get_running_loop()
+        flusher = asyncio.create_task(self._flush_periodically())
+        running = set(range(self.processes))
+        try:
+            while running:
+                received = await loop.run_in_executor(None, self._receive)
+                if received is None:
+                    for shard in running:
+                        if not self._workers[shard].is_alive():
+                            raise RuntimeError(
+                                f"Shard process {shard} exited with code {self._workers[shard].exitcode}")
+                    continue
+                shard, messages = received
+                for message in messages:
+                    if message[0] == "closed":
+                        running.discard(shard)
+                        self.connection_stats.append(message[1])
+                        progress_data["circuit_breaker"].trips += message[2]
+                    else:
+                        self._apply(progress_data, shard, message)
+                self._notify()
+        except BaseException as e:
+            self._error = e
+            self._notify()
+            raise
+        finally:
+            flusher.cancel()
+            for worker in self._workers:
+                worker.join(timeout=0 if self._error is not None else 5)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+            for channel in self._inboxes + [self._outbox]:
+                channel.close()
+                channel.cancel_join_thread()
+
+    def _apply(self, progress_data, shard, message):
+        kind = message[0]
+        if kind == "result":
+            # Written with the URL's final status, so that a journal or work
+            # queue checkpoint never covers a page whose URL isn't finished
+            _, file_output, record = message
+            self._pages[record["url"]] = (file_output, record)
+            progress_data["current_content"] = file_output
+            return
+        if kind == "links":
+            _, url, links = message
+            if self.link_follower is not None:
+                self.link_follower.page_done(url, links=links)
+            return
+        if kind == "timing":
+            progress_data["metrics"].observe(message[1])
+            return
+
+        _, number, url, status, retries, reason = message
+        progress_data["retries"] += retries - self._retries[shard]
+        self._retries[shard] = retries
+        key = (shard, number)
+        url_entry = self._entries.get(key)
+        if url_entry is None:
+            url_entry = {"index": self._indexes[shard][number], "url": url, "status": None}
+            self._entries[key] = url_entry
+            progress_data["recent_urls"].append(url_entry)
+        elif url_entry["status"] == "processing":
+            progress_data["current_urls"].remove(url)
+            self._active -= 1
+        elif url_entry["status"] == "retrying":
+            self._retrying -= 1
+        url_entry["status"] = status
+        if status == "processing":
+            progress_data["current_urls"].append(url)
+            self._active += 1
+        elif status == "retrying":
+            self._retrying += 1
+        else:
+            del self._entries[key]
+            del self._indexes[shard][number]
+            self._outstanding -= 1
+            counter = {"success": "successful_crawls", "error": "failed_crawls", "skipped": "robots_skipped",
+                       "content": "content_skipped"}[reason or status]
+            progress_data[counter] += 1
+            page = self._pages.pop(url, None)
+            if page is not None:
+                write_result(progress_data, url, *page)
+            record_finished(progress_data, url, status)
+            advance_progress(progress_data)
+        publish_status(progress_data, url_entry)
+
+
+class ShardRelay:
+    """A shard process's side of a ShardPool.
+
+    Stands in for what run_crawl would otherwise keep locally: it is the URL
+    source (URLs arrive from the parent in batches), the events queue, the
+    ResultSink and, in link-following crawls, the LinkFollower. What it is
+    handed goes back to the parent as batched messages.
+    """
+
+    def __init__(self, shard, inbox, outbox):
+        self.shard = shard
+        self.inbox = inbox
+        self.outbox = outbox
+        self.progress_data = None  # The shard's own progress data
+        self._messages = []
+        self._want_links = set()  # URLs whose links the parent will follow
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await loop.run_in_executor(None, self.inbox.get)
+            if batch is None:
+                return
+            for url, want_links in batch:
+                if want_links:
+                    self._want_links.add(url)
+                yield url
+
+    def send(self, *message):
+        self._messages.append(message)
+        if len(self._messages) >= SHARD_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._messages:
+            self.outbox.put((self.shard, self._messages))
+            self._messages = []
+
+    async def flush_periodically(self):
+        """Send what has been batched every SHARD_FLUSH_SECONDS; exit once the parent is gone."""
+        parent = multiprocessing.parent_process()
+        while True:
+            await asyncio.sleep(SHARD_FLUSH_SECONDS)
+            if parent is not None and not parent.is_alive():
+                # Killed parent: nothing can take the results any more, and
+                # exiting normally would wait forever for the queue to drain
+                os._exit(1)
+            self.flush()
+
+    def put_nowait(self, url_entry):
+        self.send("status", url_entry["index"], url_entry["url"], url_entry["status"],
+                  self.progress_data["retries"], url_entry.get("reason"))
+
+    def write(self, file_output, record):
+        self.send("result", file_output, record)
+
+    def close(self, header=""):
+        return None
+
+    def page_done(self, url, html_content=None, base_url=None):
+        # Links are extracted here, where the HTML is, and only when the parent wants them
+        links = None
+        if url in self._want_links:
+            self._want_links.discard(url)
+            links = extract_links(html_content, base_url or url) if html_content else None
+        self.send("links", url, links)
+
+
+def _run_shard(shard, settings, inbox, outbox):
+    """Entry point of a shard process."""
+    # Ctrl+C is the parent's to handle; it terminates the shards
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_crawl_shard(shard, settings, inbox, outbox))
+
+
+async def _crawl_shard(shard, settings, inbox, outbox):
+    settings = dict(settings)
+    timeout = settings.pop("timeout")
+    follow_links = settings.pop("follow_links")
+    relay = ShardRelay(shard, inbox, outbox)
+    # Timings go to the parent, which keeps the histograms and the trace
+    metrics = CrawlMetrics(forward=lambda record: relay.send("timing", record)) \
+        if settings.pop("collect_metrics") else None
+    progress_data = prepare_crawl(relay, conversion_workers=0, result_sink=relay, metrics=metrics, **settings)
+    progress_data["timeout"] = timeout
+    progress_data["events"] = relay
+    if follow_links:
+        progress_data["link_follower"] = relay
+    relay.progress_data = progress_data
+    flusher = asyncio.create_task(relay.flush_periodically())
+    try:
+        await run_crawl(progress_data)
+    finally:
+        flusher.cancel()
+    relay.send("closed", progress_data["connection_stats"], progress_data["circuit_breaker"].trips)
+    relay.flush()
+
+
+def fetch_with_requests(url, timeout=30, session=None, cache=None, max_bytes=0, head_probe=False, accept_text=True):
+    """Fetch URL using the requests library.
+
+    Pass a ``requests.Session`` to reuse its connection pool; without one a
+    bare ``requests.get`` is used. With an HttpCache, fresh entries are
+    served without a request and stale ones are revalidated with
+    If-None-Match/If-Modified-Since, reusing the cached body on a 304.
+
+    The body is streamed: a Content-Type check_content rejects ends the
+    request before the body is read, and a body growing past ``max_bytes``
+    (0 = no limit) is abandoned; both raise SkippedContent. With
+    ``head_probe`` a HEAD request screens the URL before the GET.
+    """
+    try:
+        cached = cache.lookup(url) if cache is not None else None
+        if cached is not None and cache.is_fresh(cached):
+            html_content = cache.read(cached)
+            if html_content is not None:
+                cache.record("hits")
+                return html_content.replace('\x00', ''), cached["content_type"]
+            cached = None
+
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+        }
+        if head_probe and cached is None:
+            probe = (session or requests).head(url, headers=headers, timeout=timeout, allow_redirects=True)
+            # Servers that don't support HEAD get a plain GET
+            if probe.ok:
+                check_content(probe.headers.get("Content-Type", ""), probe.headers.get("Content-Length"),
+                              max_bytes, accept_text)
+        if cached is not None:
+            headers.update(cache.conditional_headers(cached))
+        started = time.perf_counter()
+        response = (session or requests).get(
+            url, headers=headers, timeout=timeout, stream=True)
+        _record_ttfb(started)
+
+        if cached is not None and response.status_code == 304:
+            response.close()
+            html_content = cache.read(cached)
+            if html_content is not None:
+                cache.refresh(cached, response.headers)
+                cache.record("revalidated")
+                return html_content.replace('\x00', ''), cached["content_type"]
+            # Evicted meanwhile: fetch the full body again
+            for header in cache.conditional_headers(cached):
+                del headers[header]
+            started = time.perf_counter()
+            response = (session or requests).get(
+                url, headers=headers, timeout=timeout, stream=True)
+            _record_ttfb(started)
+        with closing(response):
+            response.raise_for_status()
+            check_content(response.headers.get("Content-Type", ""), response.headers.get("Content-Length"),
+                          max_bytes, accept_text)
+            with stage("download"):
+                _read_body(response, max_bytes)
+
+        # Decode once, from the bytes; the cache keeps the chosen codec
+        with stage("decode"):
+            html_content, response.encoding, _ = decode_body(
+                response.content, response.headers.get('Content-Type', ''))
+
+        if cache is not None:
+            cache.record("misses")
+            cache.store(url, response)
+
+        # Remove null bytes and other problematic characters
+        html_content = html_content.replace('\x00', '')
+
+        # Return cleaned HTML
+        return html_content, response.headers.get('Content-Type', '')
+    except requests.RequestException as e:
+        logging.error(f"Error fetching {url}: {e}")
+        raise
+
+
+def _read_body(response, max_bytes=0):
+    """Read a streamed requests response, giving up once it passes ``max_bytes`` (0 = no limit)."""
+    body = bytearray()
+    for chunk in response.iter_content(65536):
+        body += chunk
+        if max_bytes and len(body) > max_bytes:
+            raise SkippedContent(f"Skipped: body is over the {max_bytes / 1048576:g} MB limit")
+    # Where response.content, .text and .apparent_encoding look for it
+    response._content = bytes(body)
+
+
+# Longest first: the UTF-32 LE mark starts with the UTF-16 LE one
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),
+         (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([^"\';\s]+)', re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([-\w.:]+)'
+                              rb'|<\?xml[^>]+?encoding\s*=\s*["\']([-\w.:]+)', re.IGNORECASE)
+
+
+def _codec(name):
+    """Python's codec name for charset ``name``, or None if it isn't one."""
+    try:
+        return codecs.lookup(name).name if name else None
+    except LookupError:
+        return None
+
+
+def decode_body(body, content_type=""):
+    """Decode a response body once, choosing its charset in layers.
+
+    1. the charset in ``content_type``, unless it is ISO-8859-1, which many
+       servers send by default;
+    2. a byte order mark;
+    3. a <meta charset>, <meta http-equiv> or XML encoding declaration in
+       the first CHARSET_SNIFF_BYTES;
+    4. UTF-8, if the whole body is valid UTF-8;
+    5. the header's ISO-8859-1 after all;
+    6. statistical detection on the first CHARSET_DETECT_BYTES only;
+    7. windows-1252.
+
+    Like browsers, ISO-8859-1 is read as its superset windows-1252.
+
+    Returns (text, codec, source), ``source`` being the step that decided
+    (see CHARSET_SOURCES); the decision is also noted on the current URL's
+    StageTrace.
+    """
+    match = _HEADER_CHARSET_RE.search(content_type or "")
+    codec = declared = _codec(match.group(1)) if match else None
+    source = "header"
+    if codec is None or codec == "iso8859-1":
+        codec = next((name for bom, name in _BOMS if body.startswith(bom)), None)
+        source = "bom"
+    if codec is None:
+        match = _META_CHARSET_RE.search(body, 0, CHARSET_SNIFF_BYTES)
+        codec = _codec((match.group(1) or match.group(2)).decode("ascii")) if match else None
+        if codec is not None and codec.startswith("utf-16"):
+            # A declaration readable as ASCII can't be UTF-16
+            codec = "utf-8"
+        source = "meta"
+    text = None
+    if codec is None:
+        try:
+            text = body.decode("utf-8")
+            codec, source = "utf-8", "utf-8"
+        except UnicodeDecodeError:
+            if declared == "iso8859-1":
+                codec, source = "cp1252", "header"
+        if codec is None:
+            # requests' detector (chardet or charset_normalizer) is slow on big pages; a sample does
+            chardet = requests.compat.chardet
+            detected = chardet.detect(body[:CHARSET_DETECT_BYTES]).get("encoding") if chardet is not None else None
+            codec, source = _codec(detected), "detected"
+            if codec is None:
+                codec, source = "cp1252", "default"
+    if codec == "iso8859-1":
+        codec = "cp1252"
+    if text is None:
+        text = body.decode(codec, errors="replace")
+    trace = _stage_trace.get()
+    if trace is not None:
+        trace.charset = {"encoding": codec, "source": source}
+    return text, codec, source
+
+
+def _record_ttfb(started):
+    """Record the time from ``started`` to the response headers as the ttfb stage."""
+    trace = _stage_trace.get()
+    if trace is not None:
+        trace.add("ttfb", time.perf_counter() - started)
+
+
+def create_fetch_executor(max_workers=5):
+    """Create the thread pool that runs blocking requests fetches."""
+    return ThreadPoolExecutor(max_workers=max(1, max_workers),
+                              thread_name_prefix="fetch")
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that counts requests sent and TCP connections opened."""
+
+    def __init__(self, *args, **kwargs):
+        self.connections_opened = 0
+        self.requests_sent = 0
+        self._count_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _count(self, field):
+        with self._count_lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _install_counting_pools(self, manager):
+        # urllib3 reconnects dropped keep-alive connections without creating a
+        # new connection object, so count connect() calls rather than objects.
+        adapter = self
+        pool_classes = {}
+        for scheme, pool_cls in manager.pool_classes_by_scheme.items():
+            class CountingConnection(pool_cls.ConnectionCls):
+                def connect(self):
+                    adapter._count("connections_opened")
+                    with stage("connect"):
+                        return super().connect()
+
+            pool_classes[scheme] = type(pool_cls.__name__, (pool_cls,),
+                                        {"ConnectionCls": CountingConnection})
+        manager.pool_classes_by_scheme = pool_classes
+        return manager
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._install_counting_pools(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        is_new = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        return self._install_counting_pools(manager) if is_new else manager
+
+    def send(self, request, **kwargs):
+        self._count("requests_sent")
+        return super().send(request, **kwargs)
+
+
+class HttpCache:
+    """Size-bounded on-disk cache of HTTP responses, keyed by normalized URL.
+
+    Each entry is a ``<sha256>.body`` file with the raw response bytes and a
+    ``<sha256>.json`` file with the headers needed to decode and revalidate
+    it (content type, encoding, ETag, Last-Modified, Cache-Control). An
+    in-memory index ordered by last use drives LRU eviction once the
+    directory grows past ``max_bytes``; it is rebuilt from file mtimes when
+    the cache is opened, so recency survives across runs.
+
+    Several processes may share the directory (e.g. the shards of a
+    ``--processes`` crawl). Each keeps its own index, so it re-reads sizes
+    and mtimes from disk before evicting and after storing every
+    (1 - EVICT_TO) of ``max_bytes``: the bound covers what all processes
+    stored, overshooting by at most that much per process, and entries
+    another process evicted drop out. Eviction goes down to EVICT_TO of
+    ``max_bytes`` so these rescans stay rare.
+
+    Counters: ``hits`` were served without a request (still fresh per
+    Cache-Control max-age), ``revalidated`` were confirmed by a 304 and
+    ``misses`` needed a full download.
+    """
+
+    EVICT_TO = 0.9
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> bytes on disk, least recently used first
+        self.total_bytes = 0
+        self.counts = {"hits": 0, "revalidated": 0, "misses": 0, "evicted": 0}
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the index and total size from the files on disk, oldest use first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            try:
+                meta_stat = os.stat(self._path(key, ".json"))
+                body_stat = os.stat(self._path(key, ".body"))
+            except OSError:
+                continue
+            entries.append((meta_stat.st_mtime, key, meta_stat.st_size + body_stat.st_size))
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.total_bytes = sum(self._index.values())
+        self._stored_since_scan = 0
+
+    @staticmethod
+    def normalize_url(url):
+        """Lower-case scheme and host, drop default ports and the fragment."""
+        parsed = urlparse(url.strip())
+        scheme = parsed.scheme.lower()
+        netloc = parsed.netloc.lower()
+        if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+            netloc = netloc.rsplit(":", 1)[0]
+        return parsed._replace(scheme=scheme, netloc=netloc, path=parsed.path or "/", fragment="").geturl()
+
+    def _key(self, url):
+        return hashlib.sha256(self.normalize_url(url).encode("utf-8")).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def record(self, outcome):
+        """Count a fetch outcome: "hits", "revalidated" or "misses"."""
+        with self._lock:
+            self.counts[outcome] += 1
+
+    @staticmethod
+    def _cache_control(value):
+        directives = {}
+        for part in (value or "").lower().split(","):
+            name, _, arg = part.strip().partition("=")
+            if name:
+                directives[name] = arg.strip('"')
+        return directives
+
+    def lookup(self, url):
+        """Return the stored metadata for ``url``, or None."""
+        key = self._key(url)
+        if key not in self._index:
+            return None
+        try:
+            with open(self._path(key, ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        meta["key"] = key
+        return meta
+
+    def is_fresh(self, meta):
+        """True while the entry is within its Cache-Control max-age."""
+        directives = self._cache_control(meta.get("cache_control"))
+        if "no-cache" in directives or not directives.get("max-age", "").isdigit():
+            return False
+        return time.time() - meta["stored_at"] < int(directives["max-age"])
+
+    @staticmethod
+    def conditional_headers(meta):
+        """If-None-Match / If-Modified-Since headers for revalidating ``meta``."""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def read(self, meta):
+        """Decode the cached body of ``meta``; None if it has been evicted."""
+        try:
+            with open(self._path(meta["key"], ".body"), "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        self._touch(meta["key"])
+        return body.decode(meta.get("encoding") or "utf-8", errors="replace")
+
+    def _touch(self, key):
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        try:
+            os.utime(self._path(key, ".json"))
+        except OSError:
+            pass
+
+    def _write_meta(self, key, meta):
+        meta = {k: v for k, v in meta.items() if k != "key"}
+        tmp = self._path(key, f".json.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path(key, ".json"))
+
+    def refresh(self, meta, headers):
+        """Record a 304: restart the entry's freshness clock and update validators."""
+        for field, header in (("etag", "ETag"), ("last_modified", "Last-Modified"),
+                              ("cache_control", "Cache-Control")):
+            if headers.get(header):
+                meta[field] = headers[header]
+        meta["stored_at"] = time.time()
+        try:
+            self._write_meta(meta["key"], meta)
+        except OSError as e:
+            logging.warning(f"Could not update cache entry for {meta.get('url')}: {e}")
+
+    def store(self, url, response):
+        """Store a 200 ``requests`` response unless it says no-store."""
+        if response.status_code != 200 or "no-store" in self._cache_control(response.headers.get("Cache-Control")):
+            return
+        key = self._key(url)
+        meta = {
+            "url": url,
+            "content_type": response.headers.get("Content-Type", ""),
+            "encoding": response.encoding,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "cache_control": response.headers.get("Cache-Control"),
+            "stored_at": time.time()
+        }
+        body = response.content
+        try:
+            # Body first: an entry only counts once its .json exists
+            tmp = self._path(key, f".body.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, self._path(key, ".body"))
+            self._write_meta(key, meta)
+            size = os.path.getsize(self._path(key, ".json")) + len(body)
+        except OSError as e:
+            logging.warning(f"Could not cache {url}: {e}")
+            return
+
+        with self._lock:
+            self.total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._stored_since_scan += size
+            if (self.total_bytes <= self.max_bytes
+                    and self._stored_since_scan < self.max_bytes * (1 - self.EVICT_TO)):
+                return
+            # Other processes sharing the directory may have stored or evicted entries
+            self._scan()
+            if self.total_bytes <= self.max_bytes:
+                return
+            while self.total_bytes > self.max_bytes * self.EVICT_TO and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self.total_bytes -= old_size
+                self.counts["evicted"] += 1
+                for suffix in (".json", ".body"):
+                    try:
+                        os.remove(self._path(old_key, suffix))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        """Hit/revalidate/miss counters plus the cache's current size."""
+        with self._lock:
+            return dict(self.counts, entries=len(self._index), bytes=self.total_bytes)
+
+
+class CrawlHttpClient:
+    """Crawl-scoped HTTP client shared by every process_single_url task.
+
+    - requests side: one connection-pooling adapter shared by per-thread
+      sessions, with ``max_connections_per_host`` enforced by a blocking pool
+      and ``max_connections`` by the size of the fetch executor.
+    - aiohttp side: one ClientSession whose TCPConnector applies the same
+      caps plus a TTL'd DNS cache.
+    - ``cache_dir`` in the config enables an HttpCache for the requests
+      side (the aiohttp fallback always downloads).
+    - ``max_body_mb`` and ``non_html`` limit what either side downloads (see
+      check_content); ``head_probe`` screens requests fetches with a HEAD.
+
+    Both sides use keep-alive, so a sitemap crawl of one host pays the
+    TCP/TLS handshake a handful of times instead of once per page.
+    """
+
+    def __init__(self, http_config=None, max_workers=5, rate_limiter=None):
+        config = dict(DEFAULT_HTTP_CONFIG, **(http_config or {}))
+        self.config = config
+        self.rate_limiter = rate_limiter
+        self.executor = create_fetch_executor(
+            min(max_workers, config["max_connections"]))
+        self._adapter = _CountingHTTPAdapter(
+            pool_connections=config["max_hosts"],
+            pool_maxsize=config["max_connections_per_host"],
+            pool_block=True)
+        self.cache = HttpCache(config["cache_dir"], config["cache_max_mb"] * 1024 * 1024) \
+            if config["cache_dir"] else None
+        # Response bodies past this are abandoned (0 = no limit); see check_content
+        self.max_bytes = int(config["max_body_mb"] * 1024 * 1024)
+        self.accept_text = config["non_html"] == "text"
+        self._local = threading.local()
+        self._aiohttp_session = None
+        self._aiohttp_stats = {"new_connections": 0, "reused_connections": 0,
+                               "dns_cache_hits": 0, "dns_cache_misses": 0}
+
+    def _get_requests_session(self):
+        # Sessions hold cookies and aren't thread-safe; the adapter underneath
+        # is, so every thread gets its own session around the shared pool.
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def _fetch_in_thread(self, url, timeout):
+        try:
+            return fetch_with_requests(url, timeout, session=self._get_requests_session(), cache=self.cache,
+                                       max_bytes=self.max_bytes, head_probe=self.config["head_probe"],
+                                       accept_text=self.accept_text)
+        except requests.HTTPError as e:
+            if e.response is not None:
+                self.note_status(url, e.response.status_code, e.response.headers)
+            raise
+
+    def _fetch_text_in_thread(self, url, timeout):
+        response = self._get_requests_session().get(
+            url, headers={"User-Agent": random.choice(USER_AGENTS)}, timeout=timeout)
+        return response.status_code, response.text
+
+    async def fetch_text(self, url, timeout=30):
+        """GET ``url`` on the executor and return (status, text) without raising for status."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._fetch_text_in_thread, url, timeout)
+
+    def note_status(self, url, status_code, headers):
+        """Pause ``url``'s host if the response asked us to back off."""
+        if self.rate_limiter is not None and status_code in RETRY_AFTER_STATUSES:
+            self.rate_limiter.pause(url, parse_retry_after(
+                headers.get("Retry-After"), self.config["retry_after_default"], self.config["retry_after_max"]))
+
+    async def fetch_with_requests(self, url, timeout=30):
+        """Fetch ``url`` with requests on the client's executor."""
+        loop = asyncio.get_running_loop()
+        # In a copy of this task's context, so the fetch's stage timings reach its URL
+        return await loop.run_in_executor(
+            self.executor, contextvars.copy_context().run, self._fetch_in_thread, url, timeout)
+
+    def get_aiohttp_session(self):
+        """Return the shared aiohttp session, creating it on first use."""
+        if self._aiohttp_session is None or self._aiohttp_session.closed:
+            import aiohttp
+
+            stats = self._aiohttp_stats
+
+            async def on_create(session, ctx, params):
+                stats["new_connections"] += 1
+
+            async def on_reuse(session, ctx, params):
+                stats["reused_connections"] += 1
+
+            async def on_dns_hit(session, ctx, params):
+                stats["dns_cache_hits"] += 1
+
+            async def on_dns_miss(session, ctx, params):
+                stats["dns_cache_misses"] += 1
+
+            def stage_callbacks(name):
+                # One ctx per request; its DNS lookup happens inside connect
+                async def start(session, ctx, params):
+                    setattr(ctx, name, time.perf_counter())
+
+                async def end(session, ctx, params):
+                    trace = _stage_trace.get()
+                    if trace is not None and hasattr(ctx, name):
+                        trace.add(name, time.perf_counter() - getattr(ctx, name))
+                return start, end
+
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(on_create)
+            trace_config.on_connection_reuseconn.append(on_reuse)
+            trace_config.on_dns_cache_hit.append(on_dns_hit)
+            trace_config.on_dns_cache_miss.append(on_dns_miss)
+            dns_start, dns_end = stage_callbacks("dns")
+            connect_start, connect_end = stage_callbacks("connect")
+            trace_config.on_dns_resolvehost_start.append(dns_start)
+            trace_config.on_dns_resolvehost_end.append(dns_end)
+            trace_config.on_connection_create_start.append(connect_start)
+            trace_config.on_connection_create_end.append(connect_end)
+
+            connector = aiohttp.TCPConnector(
+                limit=self.config["max_connections"],
+                limit_per_host=self.config["max_connections_per_host"],
+                use_dns_cache=True,
+                ttl_dns_cache=self.config["dns_cache_ttl"],
+                keepalive_timeout=self.config["keepalive_timeout"])
+            # trust_env picks up HTTP(S)_PROXY like requests does
+            self._aiohttp_session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[trace_config], trust_env=True)
+        return self._aiohttp_session
+
+    def stats(self):
+        """Connection reuse statistics for both fetch engines."""
+        new_requests = self._adapter.connections_opened
+        sent_requests = self._adapter.requests_sent
+        new_aiohttp = self._aiohttp_stats["new_connections"]
+        reused_aiohttp = self._aiohttp_stats["reused_connections"]
+        total_requests = sent_requests + new_aiohttp + reused_aiohttp
+        total_new = new_requests + new_aiohttp
+        return {
+            "requests": {"connections_opened": new_requests, "requests_sent": sent_requests},
+            "aiohttp": dict(self._aiohttp_stats),
+            "connections_opened": total_new,
+            "requests_sent": total_requests,
+            "reuse_ratio": (1 - total_new / total_requests) if total_requests else 0.0,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "host_pauses": self.rate_limiter.pauses if self.rate_limiter is not None else 0,
+        }
+
+    async def close(self):
+        """Close the aiohttp session and release the fetch threads."""
+        if self._aiohttp_session is not None and not self._aiohttp_session.closed:
+            await self._aiohttp_session.close()
+        self.executor.shutdown(wait=False)
+        self._adapter.close()
+
+
+def build_crawl4ai_run_config(profile="thorough", use_cache=False):
+    """Build the CrawlerRunConfig used by the crawl4ai_http method.
+
+    "thorough" simulates a real visitor (user simulation, navigator
+    overrides, overlay removal and a random pause before grabbing the
+    HTML). "fast" skips all of that for sites that serve plain HTML.
+    ``use_cache`` switches on Crawl4AI's own result cache.
+    """
+    # Crawl4AI is slow to import; only crawl4ai_http runs need its crawler
+    from crawl4ai import CacheMode, CrawlerRunConfig
+
+    cache_mode = CacheMode.ENABLED if use_cache else CacheMode.BYPASS
+    if profile == "fast":
+        return CrawlerRunConfig(
+            cache_mode=cache_mode,
+            stream=False,
+            page_timeout=60000,
+            markdown_generator=create_markdown_generator()
+        )
+
+    # Create configuration that matches the successful Google Colab settings
+    return CrawlerRunConfig(
+        # Core settings
+        cache_mode=cache_mode,
+        # Performance optimizations
+        stream=False,
+        simulate_user=True,
+        override_navigator=True,
+        remove_overlay_elements=True,
+        magic=True,
+        # Timing (delay_before_return_html is randomised per URL)
+        wait_until="networkidle",
+        page_timeout=60000,
+        # Markdown generator with the same settings as Google Colab
+        markdown_generator=create_markdown_generator()
+    )
+
+
+class Crawl4AIPool:
+    """AsyncWebCrawler instances shared by all URLs of a crawl4ai_http run.
+
+    Crawlers are started lazily, up to ``size`` (the concurrency limit), and
+    leased to one URL at a time, so setup and teardown happen once per crawl
+    instead of once per URL.
+    """
+
+    def __init__(self, size=5, profile="thorough", use_cache=False):
+        self.size = max(1, size)
+        self.profile = profile
+        self.run_config = build_crawl4ai_run_config(profile, use_cache)
+        self._crawlers = []
+        self._idle = asyncio.Queue()
+
+    async def _acquire(self):
+        if self._idle.empty() and len(self._crawlers) < self.size:
+            from crawl4ai import AsyncWebCrawler
+            from crawl4ai.async_configs import HTTPCrawlerConfig
+            from crawl4ai.async_crawler_strategy import AsyncHTTPCrawlerStrategy
+
+            http_config = HTTPCrawlerConfig(
+                method="GET",
+                verify_ssl=True,
+                follow_redirects=True,
+                headers={
+                    "User-Agent": random.choice(USER_AGENTS)
+                }
+            )
+            crawler = AsyncWebCrawler(
+                crawler_strategy=AsyncHTTPCrawlerStrategy(browser_config=http_config))
+            # Reserve the slot before awaiting so concurrent leases don't overshoot
+            self._crawlers.append(crawler)
+            try:
+                await crawler.start()
+            except Exception:
+                self._crawlers.remove(crawler)
+                raise
+            return crawler
+        return await self._idle.get()
+
+    @asynccontextmanager
+    async def lease(self):
+        """Borrow a started crawler for the duration of the block."""
+        crawler = await self._acquire()
+        try:
+            yield crawler
+        finally:
+            self._idle.put_nowait(crawler)
+
+    async def arun(self, url):
+        """Crawl ``url`` on a leased crawler using the pool's run profile."""
+        config = self.run_config
+        if self.profile == "thorough":
+            config = config.clone(delay_before_return_html=random.uniform(1.0, 3.0))
+        async with self.lease() as crawler:
+            return await crawler.arun(url=url, config=config)
+
+    async def close(self):
+        """Shut down every crawler the pool started."""
+        crawlers, self._crawlers = self._crawlers, []
+        for crawler in crawlers:
+            try:
+                await crawler.close()
+            except Exception as e:
+                logging.warning(f"Error closing crawler: {e}")
+
+
+async def fetch_with_requests_async(url, timeout=30, http_client=None):
+    """Run fetch_with_requests in a worker thread so the event loop keeps going.
+
+    requests honours the system/corporate proxy configuration that aiohttp
+    often trips over, so we keep it as the fetch engine and just move it off
+    the loop. Without ``http_client`` the loop's default executor and a bare
+    ``requests.get`` are used.
+    """
+    with stage("fetch"):
+        if http_client is not None:
+            return await http_client.fetch_with_requests(url, timeout)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, fetch_with_requests, url, timeout)